@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""単語コーパスのオフラインコンパイラ
+
+単語リストをローマ字入力エンジンに通して入力できない単語を除外し、
+単語ごとの最小・標準打鍵数を計算して、打鍵数に基づく難易度バケットで
+コーパスインデックス（corpus.py）を書き出す。漢字の単語は読みで検証し、
+表示形との進行マップもここで作る。
+
+    python compile_corpus.py words/japanese.json5 -o words/japanese.tgci
+    python compile_corpus.py words/english.yaml --english
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from corpus import (
+    INDEX_SUFFIX, CorpusWord, Passage, WordCorpus, WordEntry, align_reading, compile_index, join_passage,
+    load_word_source, normalize_entry,
+)
+from romaji_input import TypingInputHandler
+
+# 標準打鍵数がこの値以下ならそのバケットに入る（最後のバケットは上限なし）
+JAPANESE_BUCKETS: List[Tuple[str, Optional[int]]] = [('easy', 6), ('medium', 10), ('hard', None)]
+ENGLISH_BUCKETS: List[Tuple[str, Optional[int]]] = [('easy', 5), ('medium', 8), ('hard', None)]
+
+# 最初の何打鍵までで単語同士の曖昧さを判定するか
+DEFAULT_LEAD_KEYS = 2
+
+# ワーカープロセスごとの文字単位の入力可能パターン（空なら入力不可）
+_char_patterns: Dict[str, List[str]] = {}
+
+
+def _probe_char(char: str) -> List[str]:
+    """1文字を実際に入力エンジンに打ち込み、入力できるパターンを求める
+
+    エンジンは完全一致した時点で文字を確定するため、'nn' のように
+    短いパターンが先に確定してしまうものは入力できないパターンとして扱う。
+    パターン表の先頭（ヘボン式）を標準の打ち方とみなす。
+    """
+    handler = TypingInputHandler()
+    typable = []
+    for pattern in handler.converter.get_possible_romaji_patterns(char):
+        handler.set_target_text(char)
+        for i, key in enumerate(pattern):
+            result = handler.process_input(key)
+            if not result['success'] or (result['char_completed'] and i < len(pattern) - 1):
+                break
+        else:
+            if result['word_completed']:
+                typable.append(pattern)
+    return typable
+
+
+def char_patterns(char: str) -> List[str]:
+    if char not in _char_patterns:
+        _char_patterns[char] = _probe_char(char)
+    return _char_patterns[char]
+
+
+def japanese_word_cost(word: str) -> Optional[Tuple[int, int]]:
+    """単語の (最小, 標準) 打鍵数。入力できない文字を含むなら None"""
+    min_keys = typical_keys = 0
+    for char in word:
+        patterns = char_patterns(char)
+        if not patterns:
+            return None
+        min_keys += min(len(pattern) for pattern in patterns)
+        typical_keys += len(patterns[0])
+    return min_keys, typical_keys
+
+
+def japanese_leads(word: str, lead_keys: int) -> Tuple[str, ...]:
+    """最初のlead_keys打鍵としてあり得る打鍵列（先頭は標準の打ち方）"""
+    canonical = ''
+    prefixes = {''}
+    for char in word:
+        patterns = char_patterns(char)
+        if len(canonical) < lead_keys:
+            canonical += patterns[0]
+        prefixes = {
+            prefix if len(prefix) >= lead_keys else (prefix + pattern)[:lead_keys]
+            for prefix in prefixes
+            for pattern in (patterns if len(prefix) < lead_keys else [''])
+        }
+        if all(len(prefix) >= lead_keys for prefix in prefixes):
+            break
+    canonical = canonical[:lead_keys]
+    prefixes.discard(canonical)
+    return (canonical,) + tuple(sorted(prefixes))
+
+
+def english_word_cost(word: str) -> Optional[Tuple[int, int]]:
+    """英語モードは1文字1打鍵（handle_english_input と同じくアルファベットのみ）"""
+    if not word or not all(char.isascii() and char.isalpha() for char in word):
+        return None
+    return len(word), len(word)
+
+
+def validate_entry(entry: Dict[str, object], japanese: bool,
+                   lead_keys: int = DEFAULT_LEAD_KEYS) -> Optional[Dict[str, object]]:
+    """打鍵数・先頭打鍵列・進行マップを付けたエントリを返す。入力できなければ None"""
+    reading = entry['reading']
+    cost = (japanese_word_cost if japanese else english_word_cost)(reading)
+    if cost is None:
+        return None
+    entry['min_keys'], entry['typical_keys'] = cost
+    entry['leads'] = japanese_leads(reading, lead_keys) if japanese else (reading[:lead_keys].lower(),)
+    if entry['text'] != entry['reading']:
+        try:
+            entry['progress'] = align_reading(entry['text'], entry['reading'], entry.get('ruby'))
+        except ValueError:
+            return None
+    return entry
+
+
+def compile_passage(segments: List[WordEntry], japanese: bool, lead_keys: int = DEFAULT_LEAD_KEYS) -> Passage:
+    """ボスの文章の区切りを検証して1つの文章にする。入力できない区切りがあれば ValueError
+
+    英語の区切りは文なので単語に分け、表示では空白で区切る（空白は打たない）。
+    日本語の区切りは1つのエントリで、区切りの間に全角の空白を挟む。
+    """
+    words = []
+    for segment in segments:
+        entries = segment.split() if isinstance(segment, str) and not japanese else [segment]
+        row = []
+        for entry in entries:
+            validated = validate_entry(normalize_entry(entry), japanese, lead_keys)
+            if validated is None:
+                raise ValueError(f"Untypable passage segment: {entry}")
+            row.append(CorpusWord(validated['reading'], validated['text'], tuple(validated.get('progress', ())),
+                                  tuple(validated['leads'])))
+        words.append(row)
+    if not words:
+        raise ValueError("Empty passage")
+    return join_passage(words, '\u3000' if japanese else ' ')
+
+
+def validate_chunk(args: Tuple[List[Dict[str, object]], bool, int]) -> List[Tuple[Dict[str, object], bool]]:
+    """ワーカー: 単語のチャンクを検証して (エントリ, 採用するか) を返す"""
+    entries, japanese, lead_keys = args
+    results = []
+    for entry in entries:
+        validated = validate_entry(entry, japanese, lead_keys)
+        results.append((validated or entry, validated is not None))
+    return results
+
+
+def collect_words(source: Dict[str, list]) -> List[Dict[str, object]]:
+    """手作業のバケット分けは無視して全単語を集める（重複は最初のものを採用）"""
+    words: Dict[str, Dict[str, object]] = {}
+    for entries in source.values():
+        for entry in entries:
+            entry = normalize_entry(entry)
+            words.setdefault(entry['text'], entry)
+    return list(words.values())
+
+
+def assign_bucket(typical_keys: int, buckets: List[Tuple[str, Optional[int]]]) -> str:
+    for name, limit in buckets:
+        if limit is None or typical_keys <= limit:
+            return name
+    return buckets[-1][0]
+
+
+def compile_words(source_path: Path, index_path: Path, japanese: bool = True,
+                  jobs: Optional[int] = None, chunk_size: int = 2000,
+                  buckets: Optional[List[Tuple[str, Optional[int]]]] = None,
+                  lead_keys: int = DEFAULT_LEAD_KEYS) -> Tuple[Path, List[str]]:
+    """単語ファイルを検証・コンパイルして (インデックスのパス, 除外した単語) を返す"""
+    if buckets is None:
+        buckets = JAPANESE_BUCKETS if japanese else ENGLISH_BUCKETS
+
+    words = collect_words(load_word_source(source_path))
+    chunks = [(words[i:i + chunk_size], japanese, lead_keys) for i in range(0, len(words), chunk_size)]
+
+    if jobs == 1 or len(chunks) <= 1:
+        results = [validate_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(validate_chunk, chunks))
+
+    bucketed: Dict[str, list] = {name: [] for name, _ in buckets}
+    rejected: List[str] = []
+    for chunk in results:
+        for entry, accepted in chunk:
+            if not accepted:
+                rejected.append(entry['text'])
+                continue
+            bucketed[assign_bucket(entry['typical_keys'], buckets)].append(entry)
+
+    for name, entries in bucketed.items():
+        if not entries:
+            raise ValueError(f"Bucket '{name}' has no typable words in {source_path}")
+
+    return compile_index(bucketed, index_path, lead_keys), rejected
+
+
+def ensure_compiled(source_path: Path, japanese: bool = True) -> WordCorpus:
+    """コンパイル済みインデックスを開く（ソースや入力エンジンより古ければ再コンパイル）"""
+    index_path = source_path.with_suffix(INDEX_SUFFIX)
+    dependencies = [source_path, Path(__file__).parent / 'romaji_input.py']
+    newest = max(path.stat().st_mtime for path in dependencies if path.exists())
+
+    if index_path.exists() and index_path.stat().st_mtime >= newest:
+        try:
+            return WordCorpus(index_path)
+        except ValueError as e:
+            print(f"Recompiling outdated corpus index: {e}")
+
+    print(f"Compiling word corpus: {source_path} -> {index_path}")
+    _, rejected = compile_words(source_path, index_path, japanese, jobs=1)
+    if rejected:
+        print(f"Skipped {len(rejected)} untypable words: {', '.join(rejected[:10])}")
+    return WordCorpus(index_path)
+
+
+def parse_buckets(spec: str) -> List[Tuple[str, Optional[int]]]:
+    """'easy:6,medium:10,hard' 形式のバケット指定を解析"""
+    buckets = []
+    for part in spec.split(','):
+        name, _, limit = part.partition(':')
+        buckets.append((name.strip(), int(limit) if limit else None))
+    return buckets
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Validate and compile a word list into a corpus index")
+    parser.add_argument('source', type=Path, help="JSON5 or YAML word file")
+    parser.add_argument('-o', '--output', type=Path, help="index path (default: source with .tgci suffix)")
+    parser.add_argument('--english', action='store_true', help="validate as English words instead of kana")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument('--chunk-size', type=int, default=2000, help="words per worker task")
+    parser.add_argument('--buckets', type=parse_buckets,
+                        help="difficulty buckets by typical keystrokes, e.g. easy:6,medium:10,hard")
+    parser.add_argument('--lead-keys', type=int, default=DEFAULT_LEAD_KEYS,
+                        help="keystrokes within which on-screen words should be unambiguous")
+    args = parser.parse_args(argv)
+
+    output = args.output or args.source.with_suffix(INDEX_SUFFIX)
+    started = time.perf_counter()
+    try:
+        index_path, rejected = compile_words(args.source, output, not args.english,
+                                             args.jobs, args.chunk_size, args.buckets, args.lead_keys)
+    except (OSError, ValueError) as e:
+        print(f"Failed to compile {args.source}: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - started
+
+    corpus = WordCorpus(index_path)
+    for name, (_, count) in corpus.buckets.items():
+        print(f"  {name}: {count} words")
+    for word in rejected:
+        print(f"  rejected (untypable or unaligned reading): {word}")
+    print(f"Compiled {len(corpus)} words to {index_path} in {elapsed:.2f}s "
+          f"({len(rejected)} rejected)")
+    corpus.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
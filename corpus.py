@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+"""単語コーパスの読み込みとバイナリインデックス
+
+JSON5/YAMLの単語ファイルを、メモリマップ可能なコンパクトなインデックスに
+コンパイルする。起動時に全単語をPythonの文字列として読み込まず、
+抽選された単語だけをその都度デコードする。
+
+インデックスのレイアウト（リトルエンディアン）:
+    ヘッダー       magic, version, バケット数, 単語数, 文字列ブロブ長, グループ数,
+                   文字表の行数, 転置リストの長さ
+    バケット表     名前(16バイト), 先頭の単語ID, 単語数
+    グループ表     バケット番号, 先頭キー(8バイト), 先頭の単語ID, 単語数, 重みの合計
+    単語表         ブロブ内オフセット, 読みのバイト長, 重み, 最小打鍵数, 標準打鍵数,
+                   表示形のバイト長, 進行マップの要素数, 先頭打鍵列のバイト長
+    エイリアス表   単語ごとの採択確率とエイリアス先（バケット内の相対ID）
+    グループ別エイリアス表  同上（グループ内の相対ID）
+    文字表         バケット番号, 文字コード, 転置リスト内の先頭, 単語数
+    転置リスト     文字ごとの、その文字を読みに含む単語IDの列
+    文字列ブロブ   単語ごとに 読み(UTF-8) + 表示形(UTF-8) + 進行マップ(uint16)
+                   + 先頭打鍵列(UTF-8、改行区切り)
+
+漢字の単語は「表示形（人工知能）」と「読み（じんこうちのう）」を持つ。
+入力は読みで行い、描画は表示形で行う。読みの何文字目まで打てば表示形の
+何文字目まで入力済みに見えるかの対応表（進行マップ）はコンパイル時に作る。
+
+各バケット内の単語は最初の1打鍵（先頭キー）ごとのグループに並べておく。
+画面上の敵と同じキーで始まる単語をグループ単位で避けて抽選できるので、
+ターゲットの取り合いになる単語を O(1) で避けられる。
+
+文字表と転置リストは「この文字を含む単語」を引くためのもので、苦手な文字を
+含む単語を多めに出すときに、抽選のたびに単語を走査せずに済む。文字は
+カタカナをひらがなに、英字を小文字に揃えてある（fold_char）。
+"""
+
+import json
+import json5
+import mmap
+import os
+import random
+import re
+import struct
+import yaml
+import numpy as np
+from collections import deque
+from bisect import bisect_right
+from itertools import accumulate, groupby
+from pathlib import Path
+from typing import Deque, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+MAGIC = b'TGCI'
+VERSION = 5
+INDEX_SUFFIX = '.tgci'
+BUCKET_NAME_SIZE = 16
+
+HEADER = struct.Struct('<4sHHIIIII')
+GROUP_KEY_SIZE = 8
+LEAD_SEPARATOR = '\n'
+BUCKET_DTYPE = np.dtype([('name', f'S{BUCKET_NAME_SIZE}'), ('start', '<u4'), ('count', '<u4')])
+ENTRY_DTYPE = np.dtype([('offset', '<u4'), ('length', '<u2'), ('weight', '<f4'),
+                        ('min_keys', '<u2'), ('typical_keys', '<u2'),
+                        ('display_length', '<u2'), ('map_length', '<u2'), ('leads_length', '<u2')])
+GROUP_DTYPE = np.dtype([('bucket', '<u2'), ('key', f'S{GROUP_KEY_SIZE}'), ('start', '<u4'),
+                        ('count', '<u4'), ('weight', '<f4')])
+MAP_DTYPE = np.dtype('<u2')
+ALIAS_DTYPE = np.dtype([('prob', '<f4'), ('alias', '<u4')])
+CHAR_DTYPE = np.dtype([('bucket', '<u2'), ('char', '<u4'), ('start', '<u4'), ('count', '<u4')])
+POSTING_DTYPE = np.dtype('<u4')
+
+# ソースファイル内の1エントリ: "ねこ" または {text: "ねこ", weight: 2}
+# 漢字の単語は {text: "人工知能", reading: "じんこうちのう"} のように読みを付ける。
+# 自動で区切れない場合は ruby: [["人工", "じんこう"], ["知能", "ちのう"]] で指定する。
+# コンパイラ（compile_corpus.py）は min_keys / typical_keys と、最初のN打鍵で
+# あり得る打鍵列 leads（先頭が標準の打ち方）も付けて渡す
+WordEntry = Union[str, Dict[str, object]]
+
+
+class CorpusWord(NamedTuple):
+    """抽選された単語。textは入力する読み、displayは画面に出す表示形"""
+    text: str
+    display: str
+    # progress[i] = 読みをi文字入力したときに入力済みとして表示する表示形の文字数
+    # （表示形と読みが同じなら空）
+    progress: Tuple[int, ...]
+    # 最初の数打鍵としてあり得る打鍵列（先頭が標準の打ち方）
+    leads: Tuple[str, ...] = ()
+
+
+class Passage(NamedTuple):
+    """ボスの長い文章。wordは全体を1つの単語として打つための読み・表示形・進行マップ"""
+    word: CorpusWord
+    # 区切り（ボスのHP 1つぶん）ごとの、読みでの終わりの位置
+    segments: Tuple[int, ...]
+    # 区切りごとの最初の数打鍵としてあり得る打鍵列（word.leads は最初の区切りのもの）
+    leads: Tuple[Tuple[str, ...], ...] = ()
+
+
+def join_passage(segments: Sequence[Sequence[CorpusWord]], separator: str = ' ') -> Passage:
+    """区切りごとの単語の列を1つの文章にする
+
+    表示形では単語の間に separator を挟む（読みには入れない）。区切り文字は直前の
+    単語を打ち終えた時点で入力済みとして表示する。
+    """
+    texts: List[str] = []
+    displays: List[str] = []
+    progress = [0]
+    ends = []
+    typed = shown = 0
+    for segment in segments:
+        for word in segment:
+            if displays:
+                displays.append(separator)
+                shown += len(separator)
+                progress[-1] = shown
+            display = word.display or word.text
+            steps = word.progress or range(len(word.text) + 1)
+            progress.extend(shown + step for step in steps[1:])
+            texts.append(word.text)
+            displays.append(display)
+            typed += len(word.text)
+            shown += len(display)
+        ends.append(typed)
+    leads = tuple(segment[0].leads for segment in segments)
+    return Passage(CorpusWord(''.join(texts), ''.join(displays), tuple(progress), leads[0]), tuple(ends), leads)
+
+
+def _is_kana(char: str) -> bool:
+    return '\u3040' <= char <= '\u30ff'
+
+
+def _to_hiragana(text: str) -> str:
+    """カタカナをひらがなに揃える（照合用、文字数は変わらない）"""
+    return ''.join(chr(ord(c) - 0x60) if 'ァ' <= c <= 'ヶ' else c for c in text)
+
+
+def fold_char(char: str) -> str:
+    """文字ごとの統計・転置リスト用に、同じ打ち方の文字を1つに揃える"""
+    return _to_hiragana(char).lower()
+
+
+def align_reading(display: str, reading: str,
+                  ruby: Optional[Sequence[Sequence[str]]] = None) -> Tuple[int, ...]:
+    """表示形と読みを対応付けて進行マップを作る
+
+    かなの部分は1文字ずつ対応させ、漢字の連続部分は読みの進み具合に
+    比例して入力済みにする。対応が取れない場合は ValueError。
+    """
+    if ruby:
+        segments = [(str(surface), str(part)) for surface, part in ruby]
+        if ''.join(s for s, _ in segments) != display or ''.join(r for _, r in segments) != reading:
+            raise ValueError(f"Ruby segments do not spell {display} / {reading}")
+    else:
+        runs = [(kana, ''.join(chars)) for kana, chars in groupby(display, _is_kana)]
+        pattern = ''.join(re.escape(_to_hiragana(run)) if kana else '(.+?)' for kana, run in runs)
+        match = re.fullmatch(pattern, _to_hiragana(reading))
+        if not match:
+            raise ValueError(f"Reading {reading} does not match {display}")
+
+        segments = []
+        position = 0
+        group = 1
+        for kana, run in runs:
+            if kana:
+                segments.extend((char, char) for char in run)
+                position += len(run)
+            else:
+                part = match.group(group)
+                segments.append((run, reading[position:position + len(part)]))
+                position += len(part)
+                group += 1
+
+    progress = [0]
+    shown = 0
+    for surface, part in segments:
+        for typed in range(1, len(part) + 1):
+            progress.append(shown + typed * len(surface) // len(part))
+        shown += len(surface)
+    return tuple(progress)
+
+
+def load_word_source(path: Union[str, Path]) -> Dict[str, List[WordEntry]]:
+    """JSON5またはYAMLの単語ファイルを {難易度: [エントリ]} として読み込む"""
+    path = Path(path)
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if path.suffix in ('.yaml', '.yml'):
+        # libyamlがあればCローダーを使う（大きなコーパスでは桁違いに速い）
+        data = yaml.load(text, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+    else:
+        # json5のパーサーは純Pythonで遅いので、素のJSONとして読めるならそちらを使う
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = json5.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError(f"Word file must map difficulty names to word lists: {path}")
+    return data
+
+
+def normalize_entry(entry: WordEntry) -> Dict[str, object]:
+    """エントリを {text, reading, weight, ...} の辞書に揃える"""
+    if isinstance(entry, str):
+        return {'text': entry, 'reading': entry, 'weight': 1.0}
+    normalized = dict(entry)
+    normalized['text'] = str(entry['text'])
+    normalized['reading'] = str(entry.get('reading') or entry['text'])
+    normalized['weight'] = float(entry.get('weight', 1.0))
+    return normalized
+
+
+def _entry_leads(entry: Dict[str, object], lead_keys: int) -> Tuple[str, ...]:
+    """コンパイラが付けた先頭打鍵列。無ければ読みの先頭を小文字にしたもの（英語向け）"""
+    leads = entry.get('leads')
+    if leads:
+        return tuple(leads)
+    return (entry['reading'][:lead_keys].lower(),)
+
+
+def build_alias_table(weights: np.ndarray) -> np.ndarray:
+    """Vose法でO(1)抽選用のエイリアス表を作成"""
+    count = len(weights)
+    table = np.zeros(count, dtype=ALIAS_DTYPE)
+    if count == 0:
+        return table
+
+    scaled = weights.astype(np.float64) * count / weights.sum()
+    table['alias'] = np.arange(count)
+    small = [i for i in range(count) if scaled[i] < 1.0]
+    large = [i for i in range(count) if scaled[i] >= 1.0]
+    while small and large:
+        s = small.pop()
+        l = large.pop()
+        table['prob'][s] = scaled[s]
+        table['alias'][s] = l
+        scaled[l] -= 1.0 - scaled[s]
+        if scaled[l] < 1.0:
+            small.append(l)
+        else:
+            large.append(l)
+    # 丸め誤差で残ったものは必ず自分自身を採択する
+    for i in small + large:
+        table['prob'][i] = 1.0
+    return table
+
+
+def compile_index(buckets: Dict[str, List[WordEntry]], index_path: Union[str, Path],
+                  lead_keys: int = 2) -> Path:
+    """{難易度: [エントリ]} をバイナリインデックスに書き出す"""
+    index_path = Path(index_path)
+    bucket_table = np.zeros(len(buckets), dtype=BUCKET_DTYPE)
+    groups: List[Tuple[int, bytes, int, int, float]] = []
+    chars: List[Tuple[int, int, int, int]] = []
+    postings: List[int] = []
+    entries: List[Tuple[int, int, float, int, int, int, int, int]] = []
+    aliases: List[np.ndarray] = []
+    group_aliases: List[np.ndarray] = []
+    blob = bytearray()
+
+    for i, (name, words) in enumerate(buckets.items()):
+        encoded_name = name.encode('utf-8')
+        if len(encoded_name) > BUCKET_NAME_SIZE:
+            raise ValueError(f"Bucket name too long: {name}")
+        bucket_table[i] = (encoded_name, len(entries), len(words))
+
+        # 先頭キーごとにまとめて並べる（グループは連続した単語IDになる）
+        normalized = [normalize_entry(entry) for entry in words]
+        leads = [_entry_leads(entry, lead_keys) for entry in normalized]
+        order = sorted(range(len(normalized)), key=lambda j: leads[j][0][:1])
+
+        weights = []
+        char_words: Dict[str, List[int]] = {}
+        for j in order:
+            entry = normalized[j]
+            display, reading = entry['text'], entry['reading']
+            encoded = reading.encode('utf-8')
+            offset = len(blob)
+            blob += encoded
+
+            display_length = map_length = 0
+            if display != reading:
+                progress = entry.get('progress') or align_reading(display, reading, entry.get('ruby'))
+                encoded_display = display.encode('utf-8')
+                blob += encoded_display
+                blob += np.array(progress, dtype=MAP_DTYPE).tobytes()
+                display_length = len(encoded_display)
+                map_length = len(progress)
+
+            encoded_leads = LEAD_SEPARATOR.join(leads[j]).encode('utf-8')
+            blob += encoded_leads
+
+            key = leads[j][0][:1]
+            if not groups or groups[-1][0] != i or groups[-1][1] != key:
+                groups.append((i, key, len(entries), 0, 0.0))
+            bucket_index, _, start, count, total = groups[-1]
+            groups[-1] = (bucket_index, key, start, count + 1, total + entry['weight'])
+
+            for char in set(map(fold_char, reading)):
+                char_words.setdefault(char, []).append(len(entries))
+            entries.append((offset, len(encoded), entry['weight'],
+                            int(entry.get('min_keys', 0)), int(entry.get('typical_keys', 0)),
+                            display_length, map_length, len(encoded_leads)))
+            weights.append(entry['weight'])
+        aliases.append(build_alias_table(np.array(weights, dtype=np.float64)))
+        for char in sorted(char_words):
+            chars.append((i, ord(char), len(postings), len(char_words[char])))
+            postings.extend(char_words[char])
+
+    group_table = np.zeros(len(groups), dtype=GROUP_DTYPE)
+    for g, (bucket_index, key, start, count, total) in enumerate(groups):
+        group_table[g] = (bucket_index, key.encode('utf-8'), start, count, total)
+        weights = np.array([entries[start + k][2] for k in range(count)], dtype=np.float64)
+        group_aliases.append(build_alias_table(weights))
+
+    entry_table = np.array(entries, dtype=ENTRY_DTYPE)
+    empty = np.zeros(0, dtype=ALIAS_DTYPE)
+    alias_table = np.concatenate(aliases) if aliases else empty
+    group_alias_table = np.concatenate(group_aliases) if group_aliases else empty
+    char_table = np.array(chars, dtype=CHAR_DTYPE)
+    posting_table = np.array(postings, dtype=POSTING_DTYPE)
+
+    # 別ファイルに書いてから置き換える（読み込み中のプロセスを壊さない）
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_suffix(index_path.suffix + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(buckets), len(entries), len(blob), len(groups),
+                            len(char_table), len(posting_table)))
+        f.write(bucket_table.tobytes())
+        f.write(group_table.tobytes())
+        f.write(entry_table.tobytes())
+        f.write(alias_table.tobytes())
+        f.write(group_alias_table.tobytes())
+        f.write(char_table.tobytes())
+        f.write(posting_table.tobytes())
+        f.write(bytes(blob))
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+class WordCorpus:
+    """メモリマップしたコーパスインデックス"""
+
+    def __init__(self, index_path: Union[str, Path]):
+        self.index_path = Path(index_path)
+        with open(self.index_path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = struct.unpack_from('<4sH', self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unsupported corpus index: {self.index_path}")
+        (_, _, bucket_count, word_count, blob_size, group_count,
+         char_count, posting_count) = HEADER.unpack_from(self.data, 0)
+
+        offset = HEADER.size
+        buckets = np.frombuffer(self.data, BUCKET_DTYPE, bucket_count, offset)
+        offset += buckets.nbytes
+        groups = np.frombuffer(self.data, GROUP_DTYPE, group_count, offset)
+        offset += groups.nbytes
+        self.entries = np.frombuffer(self.data, ENTRY_DTYPE, word_count, offset)
+        offset += self.entries.nbytes
+        self.aliases = np.frombuffer(self.data, ALIAS_DTYPE, word_count, offset)
+        offset += self.aliases.nbytes
+        self.group_aliases = np.frombuffer(self.data, ALIAS_DTYPE, word_count, offset)
+        offset += self.group_aliases.nbytes
+        chars = np.frombuffer(self.data, CHAR_DTYPE, char_count, offset)
+        offset += chars.nbytes
+        self.postings = np.frombuffer(self.data, POSTING_DTYPE, posting_count, offset)
+        offset += self.postings.nbytes
+        self.blob_offset = offset
+
+        # バケットとグループの表だけはPythonオブジェクトに展開する
+        # （グループ数はバケットあたり先頭キーの種類数までなので小さい）
+        names = [bucket['name'].decode('utf-8') for bucket in buckets]
+        self.buckets: Dict[str, Tuple[int, int]] = {
+            name: (int(bucket['start']), int(bucket['count'])) for name, bucket in zip(names, buckets)
+        }
+        # バケット名 → [(先頭キー, 先頭の単語ID, 単語数, 重みの合計)]
+        self.groups: Dict[str, List[Tuple[str, int, int, float]]] = {name: [] for name in names}
+        for group in groups:
+            self.groups[names[group['bucket']]].append(
+                (group['key'].decode('utf-8'), int(group['start']), int(group['count']), float(group['weight'])))
+        # バケット名 → {文字: (転置リスト内の先頭, 単語数)}（文字の種類数ぶんだけ）
+        self.char_postings: Dict[str, Dict[str, Tuple[int, int]]] = {name: {} for name in names}
+        for char in chars:
+            self.char_postings[names[char['bucket']]][chr(char['char'])] = (int(char['start']), int(char['count']))
+
+    @classmethod
+    def from_source(cls, source_path: Union[str, Path],
+                    index_path: Optional[Union[str, Path]] = None) -> 'WordCorpus':
+        """ソースファイルからインデックスを開く（古ければ再コンパイル）"""
+        source_path = Path(source_path)
+        index_path = Path(index_path) if index_path else source_path.with_suffix(INDEX_SUFFIX)
+        if not index_path.exists() or index_path.stat().st_mtime < source_path.stat().st_mtime:
+            print(f"Compiling word corpus: {source_path} -> {index_path}")
+            compile_index(load_word_source(source_path), index_path)
+        return cls(index_path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def charset(self) -> Set[str]:
+        """コーパスに出てくる文字（fold_charで揃えた形）"""
+        return set().union(*(chars.keys() for chars in self.char_postings.values()))
+
+    def bucket_size(self, bucket: str) -> int:
+        return self.buckets.get(bucket, (0, 0))[1]
+
+    def word(self, word_id: int) -> str:
+        """単語IDの読み（入力する文字列）をデコード"""
+        entry = self.entries[word_id]
+        start = self.blob_offset + int(entry['offset'])
+        return self.data[start:start + int(entry['length'])].decode('utf-8')
+
+    def entry(self, word_id: int) -> CorpusWord:
+        """読み・表示形・進行マップをまとめてデコード"""
+        entry = self.entries[word_id]
+        start = self.blob_offset + int(entry['offset'])
+        middle = start + int(entry['length'])
+        text = self.data[start:middle].decode('utf-8')
+        display = text
+        progress: Tuple[int, ...] = ()
+        end = middle
+        display_length = int(entry['display_length'])
+        if display_length:
+            end = middle + display_length
+            display = self.data[middle:end].decode('utf-8')
+            map_length = int(entry['map_length'])
+            progress = tuple(np.frombuffer(self.data, MAP_DTYPE, map_length, end).tolist())
+            end += map_length * MAP_DTYPE.itemsize
+        leads = self.data[end:end + int(entry['leads_length'])].decode('utf-8')
+        return CorpusWord(text, display, progress, tuple(leads.split(LEAD_SEPARATOR)))
+
+    def keystrokes(self, word_id: int) -> Tuple[int, int]:
+        """(最小打鍵数, 標準打鍵数)。未コンパイルのソースでは (0, 0)"""
+        entry = self.entries[word_id]
+        return int(entry['min_keys']), int(entry['typical_keys'])
+
+    def sample(self, bucket: str, rng: random.Random) -> int:
+        """重み付きで単語IDを1つ抽選（O(1)）"""
+        start, count = self.buckets[bucket]
+        index = rng.randrange(count)
+        prob, alias = self.aliases[start + index]
+        if rng.random() >= prob:
+            index = int(alias)
+        return start + index
+
+    def sample_avoiding(self, bucket: str, blocked_keys: Set[str], rng: random.Random) -> int:
+        """blocked_keysで始まらないグループから重み付きで抽選（全部ふさがっていれば通常の抽選）"""
+        candidates = [group for group in self.groups[bucket] if group[0] not in blocked_keys]
+        if not candidates:
+            return self.sample(bucket, rng)
+
+        point = rng.random() * sum(group[3] for group in candidates)
+        for _, start, count, weight in candidates:
+            point -= weight
+            if point < 0:
+                break
+        index = rng.randrange(count)
+        prob, alias = self.group_aliases[start + index]
+        if rng.random() >= prob:
+            index = int(alias)
+        return start + index
+
+    def sample_containing(self, bucket: str, char: str, rng: random.Random) -> Optional[int]:
+        """読みにcharを含む単語を転置リストから1つ抽選（無ければ None）"""
+        posting = self.char_postings[bucket].get(char)
+        if posting is None:
+            return None
+        start, count = posting
+        return int(self.postings[start + rng.randrange(count)])
+
+    def close(self):
+        # mmapを閉じる前にnumpyのビューを手放す
+        self.entries = self.aliases = self.group_aliases = self.postings = None
+        self.data.close()
+
+
+class WordSampler:
+    """直近に出た単語を避けて抽選するサンプラー
+
+    set_focus で文字ごとの重みを渡すと、抽選の focus_rate の割合を
+    その重みで選んだ文字を含む単語から行う（苦手な文字の練習用）。
+    """
+
+    def __init__(self, corpus: WordCorpus, window: int = 5, rng: Optional[random.Random] = None,
+                 max_attempts: int = 8, focus_rate: float = 0.5):
+        self.corpus = corpus
+        self.window = window
+        self.rng = rng or random.Random()
+        self.max_attempts = max_attempts
+        self.recent: Dict[str, Deque[int]] = {}
+        self.recent_set: Dict[str, Set[int]] = {}
+        self.focus_rate = focus_rate
+        self.focus_weights: Dict[str, float] = {}
+        # バケット名 → (このバケットにある重点文字, 重みの累積和)
+        self.focus_tables: Dict[str, Tuple[List[str], List[float]]] = {}
+
+    def set_focus(self, weights: Dict[str, float]):
+        """重点的に出す文字と重み（fold_charで揃えた文字）。空なら通常の抽選だけ"""
+        self.focus_weights = {char: weight for char, weight in weights.items() if weight > 0}
+        self.focus_tables.clear()
+
+    def draw_focused(self, bucket: str) -> Optional[int]:
+        """重点文字を重みで選び、その文字を含む単語を抽選"""
+        if bucket not in self.focus_tables:
+            postings = self.corpus.char_postings.get(bucket, {})
+            chars = [char for char in self.focus_weights if char in postings]
+            self.focus_tables[bucket] = (chars, list(accumulate(self.focus_weights[char] for char in chars)))
+        chars, cumulative = self.focus_tables[bucket]
+        if not chars:
+            return None
+        char = chars[bisect_right(cumulative, self.rng.random() * cumulative[-1], hi=len(chars) - 1)]
+        return self.corpus.sample_containing(bucket, char, self.rng)
+
+    def reset(self, rng: random.Random):
+        """新しいセッション用に乱数と直近ウィンドウをリセット"""
+        self.rng = rng
+        self.recent.clear()
+        self.recent_set.clear()
+
+    def next_word_id(self, bucket: str, blocked_keys: Optional[Set[str]] = None,
+                     blocked_leads: Optional[Set[str]] = None) -> int:
+        """直近の単語と、blocked_leadsの打鍵列で始まる単語をなるべく避けて抽選"""
+        recent = self.recent.setdefault(bucket, deque())
+        recent_set = self.recent_set.setdefault(bucket, set())
+        # 単語数がウィンドウ以下のバケットでも必ず候補が残るようにする
+        window = min(self.window, self.corpus.bucket_size(bucket) - 1)
+
+        def draw() -> Tuple[int, bool]:
+            if self.focus_weights and self.rng.random() < self.focus_rate:
+                word_id = self.draw_focused(bucket)
+                if word_id is not None:
+                    return word_id, True
+            if blocked_keys:
+                return self.corpus.sample_avoiding(bucket, blocked_keys, self.rng), False
+            return self.corpus.sample(bucket, self.rng), False
+
+        fallback = None
+        for _ in range(self.max_attempts):
+            word_id, focused = draw()
+            if word_id in recent_set:
+                continue
+            if not blocked_leads and not (focused and blocked_keys):
+                break
+            # 重点文字からの抽選は先頭キーのグループを避けていないのでここで確かめる
+            leads = self.corpus.entry(word_id).leads
+            if ((not blocked_leads or blocked_leads.isdisjoint(leads))
+                    and not (focused and blocked_keys and leads[0][:1] in blocked_keys)):
+                break
+            # 打鍵列がかぶる単語は、他に見つからなければ使う
+            if fallback is None:
+                fallback = word_id
+        else:
+            if fallback is not None:
+                word_id = fallback
+            else:
+                # 抽選で外れ続けたら隣の単語へずらす（最大でもウィンドウ分だけ）
+                start, count = self.corpus.buckets[bucket]
+                while word_id in recent_set:
+                    word_id = start + (word_id - start + 1) % count
+
+        if window > 0:
+            recent.append(word_id)
+            recent_set.add(word_id)
+            while len(recent) > window:
+                recent_set.discard(recent.popleft())
+        return word_id
+
+    def next_word(self, bucket: str) -> str:
+        return self.corpus.word(self.next_word_id(bucket))
+
+    def next_entry(self, bucket: str, blocked_keys: Optional[Set[str]] = None,
+                   blocked_leads: Optional[Set[str]] = None) -> CorpusWord:
+        return self.corpus.entry(self.next_word_id(bucket, blocked_keys, blocked_leads))
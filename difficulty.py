@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""プレイヤーの処理能力に合わせて難易度を調整するフィードバック制御
+
+画面上の未入力の文字数を、プレイヤーの直近の入力速度（CPM）で割ると
+「今から全部倒すのに何秒かかるか」になる。これを負荷とみなし、
+ミスや敵の突破が多ければ負荷を重く見積もる。負荷が目標より軽ければ
+強度を上げ、重ければ下げる。強度（0〜1、0.5がステージ本来の設定）から
+出現間隔・同時出現数・単語の難易度をステージごとの範囲内で決める。
+
+負荷は指数移動平均でならし、強度の変化は積分＋変化率の上限で抑える。
+整数の出力（同時出現数・難易度）にはヒステリシスを付けて、境目で
+行ったり来たりしないようにする。
+
+チューニングの確認用に、一定の速度・正確さで打つボットを
+ヘッドレスで走らせて推移を表示できる:
+
+    python difficulty.py --kpm 200 --accuracy 0.95 --seconds 180
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from stages import StageConfig
+
+TARGET_WORK = 3.0           # 目標とする「画面上の敵を全部倒すのにかかる秒数」
+TARGET_ACCURACY = 0.92      # これを下回ったぶんだけ負荷を重く見積もる
+ACCURACY_WEIGHT = 4.0
+BREACH_WEIGHT = 0.5         # 突破1回/分あたり負荷を何割増しにするか
+MIN_CPM = 30.0              # 入力速度の下限（出だしで負荷が無限大にならないように）
+SMOOTHING = 6.0             # 負荷の指数移動平均の時定数（秒）
+GAIN = 0.05                 # 負荷の誤差1あたりの強度の変化（/秒）
+MAX_RISE = 0.015            # 強度を上げる速さの上限（/秒）
+MAX_FALL = 0.06             # 下げる速さの上限（/秒）。突破が続くとすぐ崩れるので下げる方を速く
+STAGE_CARRYOVER = 0.5       # 次のステージに持ち越す強度の偏り（ステージ自体が難しくなるため）
+DEADBAND = 0.1              # この範囲の誤差は無視する
+WARMUP = 10.0               # 最初の数秒は入力速度が測れていないので調整しない
+HYSTERESIS = 0.1            # 整数の出力を切り替えるときの余裕
+
+
+@dataclass
+class DifficultySettings:
+    """いま適用する出現設定"""
+    enemy_spawn_delay: int
+    max_enemies: int
+    difficulty_level: str
+
+
+def _interpolate(low: float, base: float, high: float, intensity: float) -> float:
+    """強度0でlow、0.5でbase、1でhighになる折れ線"""
+    if intensity < 0.5:
+        return low + (base - low) * intensity * 2
+    return base + (high - base) * (intensity - 0.5) * 2
+
+
+class DifficultyController:
+    def __init__(self, ticks_per_second: int, intensity: float = 0.5):
+        self.ticks_per_second = ticks_per_second
+        self.initial_intensity = intensity
+        self.reset()
+
+    def reset(self, stage: Optional[StageConfig] = None):
+        self.intensity = self.initial_intensity
+        self.load = 1.0
+        self.elapsed = 0.0
+        self.stage_id: Optional[int] = None
+        self.enemies_value: Optional[int] = None
+        self.level_index: Optional[int] = None
+        self.settings: Optional[DifficultySettings] = None
+        if stage:
+            self.apply(stage)
+
+    def measure(self, queued_chars: int, cpm: float, accuracy: float, breach_rate: float) -> float:
+        """瞬間の負荷（1.0が目標）"""
+        work = queued_chars / (max(cpm, MIN_CPM) / 60)
+        load = work / TARGET_WORK
+        load *= 1 + ACCURACY_WEIGHT * max(0.0, TARGET_ACCURACY - accuracy)
+        load *= 1 + BREACH_WEIGHT * breach_rate
+        return load
+
+    def update(self, stage: StageConfig, dt: float, queued_chars: int, cpm: float,
+               accuracy: float, breach_rate: float, hold: bool = False) -> DifficultySettings:
+        """dt秒ぶん制御を進めて新しい設定を返す。holdなら負荷も強度も動かさず、設定だけ当てはめる"""
+        if hold:
+            return self.apply(stage)
+        self.elapsed += dt
+        load = self.measure(queued_chars, cpm, accuracy, breach_rate)
+        alpha = min(1.0, dt / SMOOTHING)
+        self.load += (load - self.load) * alpha
+
+        if self.elapsed >= WARMUP:
+            error = 1.0 - self.load  # 正なら余裕がある
+            if abs(error) > DEADBAND:
+                error -= DEADBAND if error > 0 else -DEADBAND
+                step = max(-MAX_FALL * dt, min(MAX_RISE * dt, GAIN * error * dt))
+                self.intensity = max(0.0, min(1.0, self.intensity + step))
+        return self.apply(stage)
+
+    def apply(self, stage: StageConfig) -> DifficultySettings:
+        """現在の強度をステージの範囲に当てはめる"""
+        if stage.stage_id != self.stage_id:
+            # ステージが変われば範囲も変わるので、ヒステリシスの基準を取り直す
+            if self.stage_id is not None:
+                self.intensity = 0.5 + (self.intensity - 0.5) * STAGE_CARRYOVER
+            self.stage_id = stage.stage_id
+            self.enemies_value = self.level_index = None
+        intensity = self.intensity
+        delay_low, delay_high = stage.spawn_delay_bounds
+        # 強度が高いほど出現間隔は短い
+        delay = _interpolate(delay_high, stage.enemy_spawn_delay, delay_low, intensity)
+
+        enemies_low, enemies_high = stage.max_enemies_bounds
+        enemies = _interpolate(enemies_low, stage.max_enemies, enemies_high, intensity)
+        if self.enemies_value is None or abs(enemies - self.enemies_value) > 0.5 + HYSTERESIS:
+            self.enemies_value = round(enemies)
+        self.enemies_value = max(enemies_low, min(enemies_high, self.enemies_value))
+
+        levels = stage.difficulty_levels
+        base = levels.index(stage.difficulty_level)
+        level = _interpolate(0, base, len(levels) - 1, intensity) if len(levels) > 1 else 0
+        if self.level_index is None or abs(level - self.level_index) > 0.5 + HYSTERESIS:
+            self.level_index = round(level)
+        self.level_index = max(0, min(len(levels) - 1, self.level_index))
+
+        self.settings = DifficultySettings(int(delay), self.enemies_value, levels[self.level_index])
+        return self.settings
+
+
+class BotTypist:
+    """一定の速度と正確さで打つヘッドレス用のプレイヤー"""
+
+    WRONG_KEYS = 'qxv'
+
+    def __init__(self, kpm: float, accuracy: float, ticks_per_second: int, seed: int = 0):
+        self.keys_per_tick = kpm / 60 / ticks_per_second
+        self.accuracy = accuracy
+        self.rng = random.Random(seed)
+        self.credit = 0.0
+
+    def keys(self, game) -> List[str]:
+        """このティックで打つキー"""
+        self.credit += self.keys_per_tick
+        keys = []
+        while self.credit >= 1.0 and game.enemies:
+            self.credit -= 1.0
+            if self.rng.random() >= self.accuracy:
+                keys.append(self.rng.choice(self.WRONG_KEYS))
+                continue
+            if game.current_target:
+                if game.japanese_mode:
+                    keys.append(game.typing_handler.get_progress_info()['expected_next'][0])
+                else:
+                    keys.append(game.current_target.get_next_char())
+                continue
+            # 一番下まで来ている敵から倒す
+            target = max(game.enemies, key=lambda enemy: enemy.y)
+            char = target.get_next_char()
+            if game.japanese_mode:
+                # 変換表は作り直さずにゲームの試し打ち用のハンドラーのものを使う
+                char = game.probe_handler.converter.get_possible_romaji_patterns(char)[0][0]
+            keys.append(char)
+        self.credit = min(self.credit, 1.0)
+        return keys
+
+
+def simulate(kpm: float, accuracy: float, seconds: float, seed: int = 0, japanese: bool = True,
+             adaptive: bool = True, report_every: float = 10.0) -> List[Tuple[float, float, DifficultySettings, float, int]]:
+    """ボットでゲームをヘッドレスに回し、(秒, 強度, 設定, 負荷, HP) の推移を返す"""
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    from main import FPS, GameState, TypingGame
+
+    rows = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        game = TypingGame(record_replays=False, seed=seed, save_sessions=False, adaptive_words=False,
+                          adaptive_difficulty=adaptive, download_font=False)
+        game.japanese_mode = japanese
+        game.state = GameState.GAME
+        game.reset_game()
+        bot = BotTypist(kpm, accuracy, FPS, seed)
+        report_ticks = int(report_every * FPS)
+        while game.tick < seconds * FPS and game.state == GameState.GAME:
+            for key in bot.keys(game):
+                game.handle_typing_input(key)
+            game.update()
+            if game.tick % report_ticks == 0:
+                controller = game.difficulty
+                rows.append((game.tick / FPS, controller.intensity, game.current_settings(),
+                             controller.load, game.player_hp))
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Simulate the difficulty controller with a bot typist")
+    parser.add_argument('--kpm', type=float, default=180, help="bot keystrokes per minute")
+    parser.add_argument('--accuracy', type=float, default=0.95, help="bot keystroke accuracy")
+    parser.add_argument('--seconds', type=float, default=180, help="simulated play time")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--english', action='store_true', help="play in English mode")
+    parser.add_argument('--fixed', action='store_true', help="disable the controller for comparison")
+    args = parser.parse_args(argv)
+
+    rows = simulate(args.kpm, args.accuracy, args.seconds, args.seed, not args.english, not args.fixed)
+    print(f"{'time':>6} {'intensity':>9} {'delay':>6} {'enemies':>7} {'level':>7} {'load':>6} {'hp':>4}")
+    for seconds, intensity, settings, load, hp in rows:
+        print(f"{seconds:6.0f} {intensity:9.2f} {settings.enemy_spawn_delay:6d} {settings.max_enemies:7d} "
+              f"{settings.difficulty_level:>7} {load:6.2f} {hp:4d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""GCを走らせるタイミングと、予算を超えたフレーム（ヒッチ）の記録
+
+起動時に作ったアセットやコーパスの索引、変換表は最後まで生きているので、
+初期化の終わりに gc.freeze で永続世代に移し、以後のGCで走査しないようにする。
+
+ゲーム中は第2世代のGC（追跡しているオブジェクトを全部たどる）を後回しにして、
+ステージの区切りやリザルト画面への切り替えのように、少し止まっても困らない
+ところで描画が終わってからまとめて走らせる。第0・第1世代はそのまま走らせる。
+
+HitchDetector は予算を超えたフレームごとに、そのフレームで走ったGCの世代と時間、
+確保の状況、区間ごとの時間を出す。
+"""
+
+import gc
+import sys
+from time import perf_counter
+from typing import List, Optional, Sequence
+
+GAMEPLAY_GEN2_THRESHOLD = 1000  # ゲーム中の第2世代の閾値（第1世代のGC 1000回ぶん。区切りが来なくても際限なく溜めない）
+TOP_PHASES = 4                  # ヒッチのログに出す時間のかかった区間の数
+
+
+class GcPolicy:
+    """初期化後の freeze と、ゲーム中の第2世代のGCの先送り"""
+
+    def __init__(self):
+        self.default_threshold = gc.get_threshold()
+        self.gameplay = False
+        self.pending = False       # 次の安全なところでまとめて回収する
+        self.frozen = 0
+        self.deferred_runs = 0     # 安全なところで走らせた回数
+        self.deferred_time = 0.0
+
+    def freeze(self):
+        """初期化で作ったものを回収してから永続世代に移す"""
+        gc.collect()
+        gc.freeze()
+        self.frozen = gc.get_freeze_count()
+
+    def set_gameplay(self, gameplay: bool):
+        if gameplay == self.gameplay:
+            return
+        self.gameplay = gameplay
+        threshold0, threshold1, _ = self.default_threshold
+        if gameplay:
+            gc.set_threshold(threshold0, threshold1, GAMEPLAY_GEN2_THRESHOLD)
+        else:
+            gc.set_threshold(*self.default_threshold)
+            self.pending = True  # ゲームから抜けたところで溜めたぶんを回収する
+
+    def restore(self):
+        """ゲーム中のまま終わっても閾値を元に戻す（run の終わりで呼ぶ）"""
+        self.gameplay = False
+        gc.set_threshold(*self.default_threshold)
+
+    def request_collection(self):
+        """ステージの区切りなど。描画が終わってから collect_pending で回収する"""
+        self.pending = True
+
+    def collect_pending(self) -> float:
+        """先送りしていた回収を走らせて、かかった秒数を返す（なければ0）"""
+        if not self.pending:
+            return 0.0
+        self.pending = False
+        start = perf_counter()
+        gc.collect()
+        elapsed = perf_counter() - start
+        self.deferred_runs += 1
+        self.deferred_time += elapsed
+        return elapsed
+
+    def report(self) -> List[str]:
+        return [f"[gc] {self.frozen} objects frozen at startup, {self.deferred_runs} deferred collections "
+                f"({self.deferred_time * 1000:.1f}ms total)"]
+
+
+class HitchDetector:
+    """予算を超えたフレームを、そのフレームのGCと区間ごとの時間つきで記録する"""
+
+    def __init__(self, log: bool = False, phase_names: Sequence[str] = ()):
+        self.log = log
+        self.phase_names = phase_names
+        # このフレームで走ったGCの世代ごとの (回数, 秒)
+        self.runs = [0, 0, 0]
+        self.times = [0.0, 0.0, 0.0]
+        self.gc_start = 0.0
+        self.frame_start = 0.0
+        self.start_blocks = 0
+        self.frames = 0
+        self.hitches = 0
+        self.gc_hitches = 0        # GCが走っていたヒッチ
+        self.worst = 0.0
+
+    def start(self):
+        """GCのコールバックを登録する（run の間だけ。close で外す）"""
+        if self.on_gc not in gc.callbacks:
+            gc.callbacks.append(self.on_gc)
+
+    def close(self):
+        if self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+
+    def on_gc(self, phase: str, info: dict):
+        if phase == 'start':
+            self.gc_start = perf_counter()
+        else:
+            generation = info['generation']
+            self.runs[generation] += 1
+            self.times[generation] += perf_counter() - self.gc_start
+
+    def begin_frame(self):
+        self.runs[0] = self.runs[1] = self.runs[2] = 0
+        self.times[0] = self.times[1] = self.times[2] = 0.0
+        self.start_blocks = sys.getallocatedblocks()
+        self.frame_start = perf_counter()
+
+    def end_frame(self, budget: float, phases: Optional[List[float]] = None) -> float:
+        """待ちに入る前に呼ぶ。budgetはこのフレームの予算（秒）。かかった秒数を返す"""
+        elapsed = perf_counter() - self.frame_start
+        self.frames += 1
+        if elapsed <= budget:
+            return elapsed
+        self.hitches += 1
+        self.worst = max(self.worst, elapsed)
+        collected = any(self.runs)
+        self.gc_hitches += collected
+        if self.log:
+            print(self.describe(elapsed, budget, phases), file=sys.stderr)
+        return elapsed
+
+    def describe(self, elapsed: float, budget: float, phases: Optional[List[float]]) -> str:
+        if any(self.runs):
+            collections = ', '.join(f"gen{generation} x{runs} {self.times[generation] * 1000:.2f}ms"
+                                    for generation, runs in enumerate(self.runs) if runs)
+        else:
+            collections = "none"
+        # 確保の状況: 世代ごとの未回収の数（第0世代は前回のGCからの確保-解放）と、このフレームで増えたブロック
+        count0, count1, count2 = gc.get_count()
+        line = (f"[hitch] frame {self.frames}: {elapsed * 1000:.2f}ms (budget {budget * 1000:.2f}ms)  "
+                f"gc {collections}  alloc count {count0}/{count1}/{count2}  "
+                f"blocks {sys.getallocatedblocks() - self.start_blocks:+d}")
+        if phases:
+            top = sorted(range(len(phases)), key=phases.__getitem__, reverse=True)[:TOP_PHASES]
+            line += "  " + ' '.join(f"{self.phase_names[i]} {phases[i] * 1000:.2f}ms" for i in top if phases[i] > 0)
+        return line
+
+    def report(self) -> List[str]:
+        return [f"[hitch] {self.hitches} of {self.frames} frames over budget "
+                f"({self.gc_hitches} with a GC run), worst {self.worst * 1000:.2f}ms"]
@@ -0,0 +1,152 @@
+"""1文字ずつラスタライズしたグリフのアトラス
+
+敵の単語は入力が進むたびに「入力済み・入力中・残り」の区切りが動くので、
+文字列ごとに font.render した結果をキャッシュしてもほとんど当たらない。
+そこで (フォント, 色) ごとにグリフを1枚のページに並べて焼いておき、単語は
+グリフの矩形を Surface.blits で並べて描く。色分けはどのアトラスを使うかの
+違いになり、打鍵のたびにラスタライズし直すことはない。
+
+コーパスに出てくるかなと英字は最初に焼いておき、それ以外（漢字など）は
+初めて出てきたときに足す。
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pygame
+
+PAGE_WIDTH = 512    # アトラスのページの幅（ピクセル）
+PAGE_ROWS = 4       # 1ページに並べる行数（小さめにして最後のページの空きを減らす）
+
+Color = Tuple[int, int, int]
+
+
+def display_variants(chars: Iterable[str]) -> Set[str]:
+    """fold_charで揃えた文字から、画面に出てくる形（カタカナ・大文字）も含めた集合を作る"""
+    variants = set()
+    for char in chars:
+        variants.add(char)
+        if 'ぁ' <= char <= 'ゖ':
+            variants.add(chr(ord(char) + 0x60))
+        elif char.isascii():
+            variants.add(char.upper())
+    return variants
+
+
+class GlyphAtlas:
+    """1つのフォントと色のグリフを並べたページの集まり"""
+
+    def __init__(self, font: pygame.font.Font, color: Color):
+        self.font = font
+        self.color = color
+        self.line_height = max(font.get_linesize(), font.get_height())
+        self.pages: List[pygame.Surface] = []
+        # 文字 → (ページ, ページ内の矩形, 送り幅)
+        self.glyphs: Dict[str, Tuple[pygame.Surface, pygame.Rect, int]] = {}
+        self.cursor_x = self.cursor_y = 0
+        self.blits: List[Tuple[pygame.Surface, Tuple[int, int], pygame.Rect]] = []  # drawで使い回す
+
+    def add(self, char: str) -> Tuple[pygame.Surface, pygame.Rect, int]:
+        image = self.font.render(char, True, self.color)
+        width, height = image.get_size()
+        if self.cursor_x + width > PAGE_WIDTH:
+            self.cursor_x = 0
+            self.cursor_y += self.line_height
+        if not self.pages or self.cursor_y + self.line_height > self.line_height * PAGE_ROWS:
+            page = pygame.Surface((PAGE_WIDTH, self.line_height * PAGE_ROWS), pygame.SRCALPHA)
+            self.pages.append(page)
+            self.cursor_x = self.cursor_y = 0
+        page = self.pages[-1]
+        rect = pygame.Rect(self.cursor_x, self.cursor_y, width, height)
+        # ページは透明で初期化してあり、グリフは重ならないのでMAXで合成すればそのまま写る
+        page.blit(image, rect, special_flags=pygame.BLEND_RGBA_MAX)
+        self.cursor_x += width
+        glyph = self.glyphs[char] = (page, rect, width)
+        return glyph
+
+    def prepare(self, chars: Iterable[str]):
+        for char in chars:
+            if char not in self.glyphs:
+                self.add(char)
+
+    def width(self, text: str) -> int:
+        glyphs = self.glyphs
+        width = 0
+        for char in text:
+            width += (glyphs.get(char) or self.add(char))[2]
+        return width
+
+    def draw(self, surface: pygame.Surface, text: str, x: int, y: int) -> int:
+        """textを(x, y)から描いて、描いた幅を返す"""
+        glyphs = self.glyphs
+        blits = self.blits
+        blits.clear()
+        start = x
+        for char in text:
+            page, rect, advance = glyphs.get(char) or self.add(char)
+            blits.append((page, (x, y), rect))
+            x += advance
+        surface.blits(blits, False)
+        return x - start
+
+    def nbytes(self) -> int:
+        return sum(page.get_pitch() * page.get_height() for page in self.pages)
+
+
+class GlyphCache:
+    """(フォント, 色) ごとのアトラス"""
+
+    def __init__(self):
+        self.atlases: Dict[Tuple[pygame.font.Font, Color], GlyphAtlas] = {}
+        self.charset: Set[str] = set()
+
+    def atlas(self, font: pygame.font.Font, color: Color, prepare: bool = True) -> GlyphAtlas:
+        """prepare=Falseなら使った文字だけを焼く（入力中の1文字の強調色など）"""
+        atlas = self.atlases.get((font, color))
+        if atlas is None:
+            atlas = self.atlases[(font, color)] = GlyphAtlas(font, color)
+            if prepare:
+                atlas.prepare(self.charset)
+        return atlas
+
+    def prepare(self, chars: Iterable[str], fonts_and_colors: Optional[Iterable[Tuple[pygame.font.Font, Color]]] = None):
+        """よく使う文字を先に焼いておく（以後に作るアトラスにも適用する）"""
+        self.charset |= set(chars)
+        for font, color in fonts_and_colors or ():
+            self.atlas(font, color).prepare(self.charset)
+
+    def clear(self):
+        """アトラスを捨てる（フォントが切り替わったとき。焼く文字の集合は残す）"""
+        self.atlases.clear()
+
+    def nbytes(self) -> int:
+        return sum(atlas.nbytes() for atlas in self.atlases.values())
+
+
+class Label:
+    """表示する値が変わったときだけ描き直す1行の文字列（HUDのスコアなど）
+
+    毎フレーム f-string を作って render するかわりに、表示の元になる値を key として
+    changed に渡し、Trueのときだけ render で描き直す。
+    """
+
+    def __init__(self, color: Color):
+        self.color = color
+        self.font: Optional[pygame.font.Font] = None
+        self.key: object = None
+        self.surface = pygame.Surface((0, 0))
+
+    def changed(self, font: pygame.font.Font, key: object) -> bool:
+        if font is self.font and key == self.key:
+            return False
+        self.font = font
+        self.key = key
+        return True
+
+    def clear(self):
+        """次のchangedで必ず描き直させる"""
+        self.font = None
+        self.key = None
+
+    def render(self, text: str) -> pygame.Surface:
+        self.surface = self.font.render(text, True, self.color)
+        return self.surface
@@ -1,24 +1,130 @@
 import pygame
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional
+from dataclasses import dataclass
 import io
+import json
 import os
+import threading
+import time
 from pathlib import Path
 import math
 import random
 
-class GraphicsManager:
+SCALED_CACHE = 32  # 拡縮した画像を持っておく数（テキストボックスは単語の長さで大きさが変わる）
+
+
+@dataclass(frozen=True)
+class Viewport:
+    """描画する内部解像度と、論理座標（レイアウトとゲーム内の座標）からの倍率
+
+    敵の位置などのシミュレーションは常に論理座標で行い、描画のときだけ
+    px / pos で内部解像度に直す（倍率を変えてもリプレイは同じになる）。
+    """
+    width: int
+    height: int
+    scale: float = 1.0
+    
+    @classmethod
+    def scaled(cls, width: int, height: int, scale: float) -> 'Viewport':
+        return cls(round(width * scale), round(height * scale), scale)
+    
+    @property
+    def size(self) -> Tuple[int, int]:
+        return (self.width, self.height)
+    
+    def px(self, value: float) -> int:
+        """論理座標の長さを内部解像度のピクセル数に"""
+        if self.scale == 1.0:
+            return round(value)  # 整数ならそのまま返る（描画のたびに整数を作らない）
+        return round(value * self.scale)
+    
+    def pos(self, x: float, y: float) -> Tuple[int, int]:
+        return (round(x * self.scale), round(y * self.scale))
+    
+    def thickness(self, value: float) -> int:
+        """線の太さ（0だと塗りつぶしになるので最低1）"""
+        return max(1, round(value * self.scale))
+
+
+class ScratchSurfaces:
+    """描画のたびに作っていた塗りつぶしやグラデーションのSurfaceを使い回す
+
+    半透明の塗りつぶしは色ごとに1枚だけ塗っておき、不透明度を set_alpha で変えて、
+    矩形は blit の area でその左上を切り出して描く。足りない大きさを求められたときだけ
+    大きく作り直すので、画面を一巡すれば作り直しは起きなくなる。
+    """
+    
     def __init__(self):
+        self.fills: Dict[Tuple[int, int, int], pygame.Surface] = {}
+        self.gradients: Dict[Tuple[int, int], pygame.Surface] = {}
+        self.area = pygame.Rect(0, 0, 0, 0)  # 切り出す範囲（毎回Rectを作らない）
+    
+    def blend_rect(self, target: pygame.Surface, color: Tuple[int, int, int], alpha: int,
+                   x: int, y: int, width: int, height: int):
+        """targetの矩形にcolorを不透明度alphaで重ねる"""
+        surface = self.fills.get(color)
+        if surface is None or surface.get_width() < width or surface.get_height() < height:
+            size = (width, height)
+            if surface is not None:
+                size = (max(width, surface.get_width()), max(height, surface.get_height()))
+            surface = self.fills[color] = pygame.Surface(size)
+            surface.fill(color)
+        surface.set_alpha(alpha)
+        area = self.area
+        area.width = width
+        area.height = height
+        target.blit(surface, (x, y), area)
+    
+    def gradient(self, width: int, height: int) -> pygame.Surface:
+        """左から緑→黄→赤の横グラデーション（進行度のバーは左から必要な幅だけ切り出す）"""
+        surface = self.gradients.get((width, height))
+        if surface is None:
+            surface = self.gradients[(width, height)] = pygame.Surface((width, height))
+            for x in range(width):
+                ratio = x / width
+                if ratio < 0.5:
+                    # Green to yellow
+                    color = (int(255 * ratio * 2), 255, 0)
+                else:
+                    # Yellow to red
+                    color = (255, int(255 * (1 - (ratio - 0.5) * 2)), 0)
+                pygame.draw.line(surface, color, (x, 0), (x, height))
+        return surface
+    
+    def nbytes(self) -> int:
+        surfaces = list(self.fills.values()) + list(self.gradients.values())
+        return sum(surface.get_pitch() * surface.get_height() for surface in surfaces)
+
+
+class GraphicsManager:
+    def __init__(self, seed: Optional[int] = None, scale: float = 1.0):
+        # 背景の星や窓明かりの配置用（seedを固定すれば毎回同じ背景になる）
+        self.rng = random.Random(seed)
+        self.scale = scale
         self.images: Dict[str, pygame.Surface] = {}
         self.animations: Dict[str, List[pygame.Surface]] = {}
+        self.scaled: Dict[Tuple[str, int, int], pygame.Surface] = {}  # get_scaled_image のキャッシュ
         self.create_graphics()
         self.create_animations()
+        if scale != 1.0:
+            self.fit_to_scale()
+    
+    def fit_to_scale(self):
+        """論理座標の大きさで作った画像を内部解像度に縮めて持っておく（描画のたびには拡縮しない）"""
+        def fit(surface: pygame.Surface) -> pygame.Surface:
+            width, height = surface.get_size()
+            return pygame.transform.smoothscale(surface, (max(1, round(width * self.scale)),
+                                                          max(1, round(height * self.scale))))
+        self.images = {name: fit(image) for name, image in self.images.items()}
+        self.animations = {name: [fit(frame) for frame in frames] for name, frames in self.animations.items()}
     
     def create_graphics(self):
         self.images['zombie'] = self.create_zombie_sprite()
         self.images['runner'] = self.create_runner_sprite()
         self.images['shooter'] = self.create_shooter_sprite()
+        self.images['boss'] = self.create_boss_sprite()
         self.images['background'] = self.create_background()
         self.images['button'] = self.create_button()
         self.images['textbox'] = self.create_textbox()
@@ -125,6 +231,56 @@ class GraphicsManager:
         
         return self.pil_to_pygame(img)
     
+    def create_boss_sprite(self) -> pygame.Surface:
+        """ボス（王冠をかぶった大きなゾンビ）"""
+        size = 140
+        img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+        
+        # 体（大きく、肩幅が広い）
+        body_color = (90, 30, 30)
+        draw.rectangle([30, 55, 110, 120], fill=body_color)
+        draw.rectangle([20, 55, 120, 75], fill=(110, 40, 40))  # 肩
+        # 傷
+        draw.rectangle([45, 80, 50, 100], fill=(60, 15, 15))
+        draw.rectangle([88, 70, 93, 95], fill=(60, 15, 15))
+        
+        # 腕
+        arm_color = (120, 130, 90)
+        draw.rectangle([5, 60, 22, 105], fill=arm_color)
+        draw.rectangle([118, 60, 135, 105], fill=arm_color)
+        # 爪
+        for x in (5, 11, 17):
+            draw.rectangle([x, 105, x + 3, 112], fill=(220, 220, 200))
+        for x in (120, 126, 132):
+            draw.rectangle([x, 105, x + 3, 112], fill=(220, 220, 200))
+        
+        # 頭
+        head_color = (130, 150, 100)
+        draw.rectangle([45, 20, 95, 58], fill=head_color)
+        # 目（赤く光る）
+        draw.rectangle([52, 32, 62, 40], fill=(255, 40, 40))
+        draw.rectangle([78, 32, 88, 40], fill=(255, 40, 40))
+        # 口と牙
+        draw.rectangle([58, 46, 82, 53], fill=(40, 10, 10))
+        for x in (60, 68, 76):
+            draw.rectangle([x, 46, x + 3, 51], fill=(230, 230, 210))
+        
+        # 王冠
+        crown = (230, 190, 40)
+        draw.rectangle([45, 12, 95, 20], fill=crown)
+        draw.polygon([(45, 12), (50, 0), (57, 12)], fill=crown)
+        draw.polygon([(63, 12), (70, 0), (77, 12)], fill=crown)
+        draw.polygon([(83, 12), (90, 0), (95, 12)], fill=crown)
+        draw.rectangle([67, 14, 73, 18], fill=(200, 30, 60))
+        
+        # 足
+        leg_color = (40, 40, 60)
+        draw.rectangle([38, 120, 62, 138], fill=leg_color)
+        draw.rectangle([78, 120, 102, 138], fill=leg_color)
+        
+        return self.pil_to_pygame(img)
+    
     def create_background(self) -> pygame.Surface:
         """ピクセルアート風の詳細な背景"""
         img = Image.new('RGB', (1200, 800), (15, 15, 30))  # より暗い夜空
@@ -169,8 +325,8 @@ class GraphicsManager:
                     draw.rectangle([x1, floor, x2, floor + 2], fill=(25, 25, 40))
                     # 窓の列
                     for wx in range(x1 + 15, x2 - 15, 25):
-                        if random.random() > 0.4:  # ランダムに点灯
-                            color = (255, 255, 200) if random.random() > 0.8 else (80, 80, 120)
+                        if self.rng.random() > 0.4:  # ランダムに点灯
+                            color = (255, 255, 200) if self.rng.random() > 0.8 else (80, 80, 120)
                             draw.rectangle([wx, floor + 5, wx + 12, floor + 18], fill=color)
                             # 窓枠
                             draw.rectangle([wx - 1, floor + 4, wx + 13, floor + 19], outline=(40, 40, 60), width=1)
@@ -179,16 +335,16 @@ class GraphicsManager:
                 # オフィスビル
                 for floor_y in range(y1 + 15, y2, 20):
                     for wx in range(x1 + 12, x2 - 12, 18):
-                        if random.random() > 0.3:
-                            color = (120, 140, 180) if random.random() > 0.7 else (60, 60, 90)
+                        if self.rng.random() > 0.3:
+                            color = (120, 140, 180) if self.rng.random() > 0.7 else (60, 60, 90)
                             draw.rectangle([wx, floor_y, wx + 10, floor_y + 12], fill=color)
             
             elif style == 'apartment':
                 # アパート
                 for floor_y in range(y1 + 12, y2, 15):
                     for wx in range(x1 + 8, x2 - 8, 15):
-                        if random.random() > 0.5:
-                            color = (180, 160, 120) if random.random() > 0.6 else (40, 35, 50)
+                        if self.rng.random() > 0.5:
+                            color = (180, 160, 120) if self.rng.random() > 0.6 else (40, 35, 50)
                             draw.rectangle([wx, floor_y, wx + 8, floor_y + 8], fill=color)
             
             # 屋上の詳細
@@ -210,11 +366,11 @@ class GraphicsManager:
         
         # 星とちらつき効果
         for _ in range(80):
-            x = random.randint(0, 1200)
-            y = random.randint(0, 400)
+            x = self.rng.randint(0, 1200)
+            y = self.rng.randint(0, 400)
             # さまざまなサイズの星
-            star_size = random.choice([1, 2, 3])
-            brightness = random.randint(180, 255)
+            star_size = self.rng.choice([1, 2, 3])
+            brightness = self.rng.randint(180, 255)
             color = (brightness, brightness, brightness)
             
             if star_size == 1:
@@ -232,13 +388,13 @@ class GraphicsManager:
         
         # 薄い雲
         for _ in range(5):
-            cloud_x = random.randint(100, 1000)
-            cloud_y = random.randint(50, 200)
+            cloud_x = self.rng.randint(100, 1000)
+            cloud_y = self.rng.randint(50, 200)
             cloud_color = (25, 25, 35)
             # 雲の形状を不規則に
             for i in range(8):
-                offset_x = random.randint(-20, 20)
-                offset_y = random.randint(-8, 8)
+                offset_x = self.rng.randint(-20, 20)
+                offset_y = self.rng.randint(-8, 8)
                 draw.ellipse([cloud_x + offset_x, cloud_y + offset_y, 
                             cloud_x + offset_x + 40, cloud_y + offset_y + 15], fill=cloud_color)
         
@@ -436,6 +592,17 @@ class GraphicsManager:
     def get_image(self, name: str) -> pygame.Surface:
         return self.images.get(name, pygame.Surface((1, 1)))
     
+    def get_scaled_image(self, name: str, width: int, height: int) -> pygame.Surface:
+        """画像をwidth×heightに拡縮したもの（最近使った SCALED_CACHE 個までは作り直さない）"""
+        key = (name, width, height)
+        surface = self.scaled.pop(key, None)
+        if surface is None:
+            if len(self.scaled) >= SCALED_CACHE:
+                del self.scaled[next(iter(self.scaled))]
+            surface = pygame.transform.scale(self.get_image(name), (width, height))
+        self.scaled[key] = surface  # 末尾に入れ直して、古いものから捨てる
+        return surface
+    
     def get_animation_frame(self, animation_name: str, frame: int) -> pygame.Surface:
         """アニメーションフレームを取得"""
         if animation_name in self.animations:
@@ -443,105 +610,185 @@ class GraphicsManager:
             return frames[frame % len(frames)]
         return self.get_image('zombie')  # フォールバック
 
+# 日本語フォントの候補（上から順に探す）
+JAPANESE_FONT_PATHS = [
+    str(Path(__file__).parent / "fonts" / "NotoSansJP-Regular.ttf"),  # Downloaded font
+    '/mnt/c/Windows/Fonts/NotoSansJP-VF.ttf',  # WSL Windows Noto Sans JP
+    '/mnt/c/Windows/Fonts/BIZ-UDGothicR.ttc',  # WSL Windows BIZ UD Gothic
+    '/mnt/c/Windows/Fonts/msgothic.ttc',  # WSL Windows MS Gothic
+    '/mnt/c/Windows/Fonts/meiryo.ttc',  # WSL Windows Meiryo
+    '/mnt/c/Windows/Fonts/msmincho.ttc',  # WSL Windows MS Mincho
+    'C:/Windows/Fonts/msgothic.ttc',  # Windows
+    'C:/Windows/Fonts/meiryo.ttc',  # Windows
+    '/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc',  # macOS
+    '/System/Library/Fonts/Hiragino Sans GB.ttc',  # macOS alternative
+    '/usr/share/fonts/truetype/takao-gothic/TakaoGothic.ttf',  # Linux
+    '/usr/share/fonts/truetype/noto-cjk/NotoSansCJK-Regular.ttc',  # Linux
+]
+# 候補が見つからないときにシステムのフォント一覧から探す名前（一覧の走査は遅い）
+SYSTEM_FONT_NAMES = ['msgothic', 'meiryo', 'ms gothic', 'takao gothic', 'noto sans cjk jp',
+                     'dejavu sans', 'liberation sans']
+
+FONT_CACHE_PATH = Path(__file__).parent / "data" / "font_cache.json"
+FONT_CACHE_VERSION = 1
+SYSTEM_FONT_RESCAN = 7 * 24 * 3600  # 見つからなかった結果を信じる期間（秒）
+
+# フォント名 → 論理座標での大きさ（開くのは最初に使われたとき）
+FONT_SIZES = {
+    'japanese_xlarge': 60,
+    'japanese_large': 40,
+    'japanese_medium': 32,
+    'japanese_small': 28,
+    'english_xlarge': 64,
+    'english_large': 56,
+    'english_medium': 44,
+    'english_small': 32,
+}
+
+
+def _file_signature(path: str) -> Optional[List[int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_font_cache(path: Path = FONT_CACHE_PATH) -> Optional[dict]:
+    """前回見つけたフォントの記録。ファイルが変わっていれば使わない"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('version') != FONT_CACHE_VERSION:
+        return None
+    if cache.get('candidates') != JAPANESE_FONT_PATHS + SYSTEM_FONT_NAMES:
+        return None
+    font_path = cache.get('path')
+    if font_path is None:
+        # 見つからなかった記録は一定期間だけ使う（その間にフォントを入れたら候補の方で見つかる）
+        return cache if time.time() - cache.get('scanned_at', 0) < SYSTEM_FONT_RESCAN else None
+    return cache if _file_signature(font_path) == cache.get('signature') else None
+
+
+def save_font_cache(font_path: Optional[str], path: Path = FONT_CACHE_PATH):
+    cache = {
+        'version': FONT_CACHE_VERSION,
+        'candidates': JAPANESE_FONT_PATHS + SYSTEM_FONT_NAMES,
+        'path': font_path,
+        'signature': _file_signature(font_path) if font_path else None,
+        'scanned_at': time.time(),
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Failed to save font cache: {e}")
+
+
+def forget_font_cache(font_path: str, path: Path = FONT_CACHE_PATH):
+    """開けなかったフォントの記録を消す（次の起動で探し直す）"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return
+    if not isinstance(cache, dict) or cache.get('path') != font_path:
+        return
+    try:
+        path.unlink()
+    except OSError as e:
+        print(f"Failed to remove font cache: {e}")
+
+
+def find_japanese_font() -> Optional[str]:
+    """日本語フォントのファイルを探す（キャッシュが有効ならシステムのフォント一覧は走査しない）"""
+    cache = load_font_cache()
+    cached_path = cache['path'] if cache is not None else None
+    # キャッシュより優先度の高い候補があとから入っていないかだけは見る（statは安い）。
+    # 候補以外（システムの一覧から見つけたもの）はどの候補よりも下に置く
+    rank = JAPANESE_FONT_PATHS.index(cached_path) if cached_path in JAPANESE_FONT_PATHS else len(JAPANESE_FONT_PATHS)
+    font_path = next((path for path in JAPANESE_FONT_PATHS[:rank] if os.path.exists(path)), None)
+    if font_path is None:
+        if cache is not None:
+            return cached_path  # Noneならシステムのフォント一覧は最近走査して見つからなかった
+        font_path = pygame.font.match_font(SYSTEM_FONT_NAMES)
+    save_font_cache(font_path)
+    return font_path
+
+
 class FontManager:
-    def __init__(self):
+    """フォントは名前ごとに最初に使われたときに開く
+
+    日本語フォントの場所は data/font_cache.json に覚えておき、見つからなければ
+    バックグラウンドでダウンロードして、届いたら次のフレームの頭で切り替える。
+    """
+    
+    def __init__(self, scale: float = 1.0, download: bool = True):
+        self.scale = scale  # 内部解像度の倍率（フォントの大きさもこれに合わせる）
         self.fonts: Dict[str, pygame.font.Font] = {}
-        self.setup_fonts()
-    
-    def setup_fonts(self):
-        # Check for downloaded font first
-        current_dir = Path(__file__).parent
-        downloaded_font = current_dir / "fonts" / "NotoSansJP-Regular.ttf"
-        
-        # Try to find Japanese fonts including WSL Windows fonts
-        japanese_fonts = [
-            str(downloaded_font),  # Downloaded font
-            '/mnt/c/Windows/Fonts/NotoSansJP-VF.ttf',  # WSL Windows Noto Sans JP
-            '/mnt/c/Windows/Fonts/BIZ-UDGothicR.ttc',  # WSL Windows BIZ UD Gothic
-            '/mnt/c/Windows/Fonts/msgothic.ttc',  # WSL Windows MS Gothic
-            '/mnt/c/Windows/Fonts/meiryo.ttc',  # WSL Windows Meiryo
-            '/mnt/c/Windows/Fonts/msmincho.ttc',  # WSL Windows MS Mincho
-            'C:/Windows/Fonts/msgothic.ttc',  # Windows
-            'C:/Windows/Fonts/meiryo.ttc',  # Windows
-            '/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc',  # macOS
-            '/System/Library/Fonts/Hiragino Sans GB.ttc',  # macOS alternative
-            '/usr/share/fonts/truetype/takao-gothic/TakaoGothic.ttf',  # Linux
-            '/usr/share/fonts/truetype/noto-cjk/NotoSansCJK-Regular.ttc',  # Linux
-        ]
-        
-        japanese_font = None
-        font_file_path = None
-        for font_path in japanese_fonts:
-            try:
-                if os.path.exists(font_path):
-                    japanese_font = pygame.font.Font(font_path, 40)
-                    font_file_path = font_path
-                    print(f"Japanese font loaded: {font_path}")
-                    break
-                else:
-                    print(f"Font not found: {font_path}")
-            except (FileNotFoundError, OSError) as e:
-                print(f"Failed to load font {font_path}: {e}")
-                continue
-        
-        if japanese_font is None:
-            # Try system fonts with specific names
-            system_font_names = [
-                'msgothic',
-                'meiryo', 
-                'ms gothic',
-                'takao gothic',
-                'noto sans cjk jp',
-                'dejavu sans',
-                'liberation sans'
-            ]
-            
-            for font_name in system_font_names:
-                try:
-                    japanese_font = pygame.font.SysFont(font_name, 32)
-                    if japanese_font:
-                        print(f"System Japanese font loaded: {font_name}")
-                        break
-                except:
-                    continue
-        
-        if japanese_font is None:
-            # Try to download font if not found
-            try:
-                from download_font import download_japanese_font
-                downloaded_path = download_japanese_font()
-                if downloaded_path:
-                    japanese_font = pygame.font.Font(downloaded_path, 32)
-                    print(f"Downloaded and loaded Japanese font: {downloaded_path}")
-            except Exception as e:
-                print(f"Failed to download font: {e}")
-        
-        if japanese_font is None:
-            japanese_font = pygame.font.Font(None, 40)
-            print("Warning: No Japanese font found, using default font")
-        
-        # Set up font sizes (larger fonts for better visibility)
-        self.fonts['japanese_large'] = japanese_font  # base font loaded above
-        
-        # Set up additional font sizes
-        if font_file_path:
-            self.fonts['japanese_medium'] = pygame.font.Font(font_file_path, 32)
-            self.fonts['japanese_small'] = pygame.font.Font(font_file_path, 28)
-            self.fonts['japanese_xlarge'] = pygame.font.Font(font_file_path, 60)
-            print(f"All Japanese font sizes created from: {font_file_path}")
+        self.lookup: Dict[Tuple[str, bool], pygame.font.Font] = {}  # (名前, 日本語) → フォント（キー文字列を毎回作らない）
+        self.font_file: Optional[str] = find_japanese_font()  # 日本語フォントのファイル
+        self.downloaded_font: Optional[str] = None  # ダウンロードのスレッドが書く
+        if self.font_file:
+            print(f"Japanese font: {self.font_file}")
         else:
-            self.fonts['japanese_medium'] = pygame.font.Font(None, 32)
-            self.fonts['japanese_small'] = pygame.font.Font(None, 28)
-            self.fonts['japanese_xlarge'] = pygame.font.Font(None, 60)
-        
-        # English fonts (also increased sizes)
-        self.fonts['english_xlarge'] = pygame.font.Font(None, 64)  # extra large
-        self.fonts['english_large'] = pygame.font.Font(None, 56)
-        self.fonts['english_medium'] = pygame.font.Font(None, 44)
-        self.fonts['english_small'] = pygame.font.Font(None, 32)
+            print("Warning: No Japanese font found, using default font")
+            if download:
+                threading.Thread(target=self.download_font, name="font-download", daemon=True).start()
+    
+    def download_font(self):
+        try:
+            from download_font import download_japanese_font
+            self.downloaded_font = download_japanese_font()
+        except Exception as e:
+            print(f"Failed to download font: {e}")
+    
+    def scaled(self, size: int) -> int:
+        return max(8, round(size * self.scale))
+    
+    def load_font(self, font_key: str) -> pygame.font.Font:
+        size = self.scaled(FONT_SIZES[font_key])
+        if font_key.startswith('japanese_') and self.font_file:
+            try:
+                font = pygame.font.Font(self.font_file, size)
+                font.size(' ')  # 壊れたファイルでも開けてしまうので、1文字測って確かめる
+                return font
+            except (OSError, pygame.error) as e:
+                print(f"Failed to load font {self.font_file}: {e}")
+                forget_font_cache(self.font_file)
+                self.font_file = None
+        return pygame.font.Font(None, size)
+    
+    def swap_downloaded_font(self) -> bool:
+        """ダウンロードが終わっていれば日本語フォントを切り替えてTrueを返す（フレームの頭で呼ぶ）
+
+        切り替えたら、古いフォントで焼いたグリフは呼び出し側で作り直す。
+        """
+        if not self.downloaded_font:
+            return False
+        # 開き直すのは日本語フォントだけ
+        self.font_file, self.downloaded_font = self.downloaded_font, None
+        save_font_cache(self.font_file)
+        for font_key in [key for key in self.fonts if key.startswith('japanese_')]:
+            del self.fonts[font_key]
+        self.lookup.clear()
+        return True
     
     def get_font(self, name: str, japanese: bool = False) -> pygame.font.Font:
+        font = self.lookup.get((name, japanese))
+        if font is not None:
+            return font
         prefix = 'japanese_' if japanese else 'english_'
         font_key = prefix + name
-        font = self.fonts.get(font_key, self.fonts.get('english_medium'))
-        return font
\ No newline at end of file
+        if font_key not in FONT_SIZES:
+            font_key = 'english_medium'
+        font = self.fonts.get(font_key)
+        if font is None:
+            font = self.fonts[font_key] = self.load_font(font_key)
+        self.lookup[(name, japanese)] = font
+        return font
@@ -0,0 +1,52 @@
+from array import array
+from typing import Iterator
+
+import pygame
+
+# メインループで受け取るイベント（マウス移動などはSDLのキューに積ませない）
+ALLOWED_EVENTS = [pygame.QUIT, pygame.KEYDOWN, pygame.TEXTINPUT]
+
+
+def restrict_events():
+    """イベントキューを使うものだけに絞り、TEXTINPUT（IMEの確定文字を含む）を有効にする"""
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(ALLOWED_EVENTS)
+    pygame.key.start_text_input()
+
+
+class KeyQueue:
+    """打鍵（文字, 受け取った時刻）の固定長リングバッファ
+
+    イベントを取り出した時点の perf_counter を時刻にして積み、シミュレーションは
+    ティックごとに、そのティックの終わりまでに打たれた文字を時刻順に取り出す。
+    1フレームで複数ティック進める場合も、打鍵は打たれた時刻のティックに入る。
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.chars = [''] * capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+        self.dropped = 0
+
+    def clear(self):
+        self.start = self.count = 0
+
+    def push(self, char: str, timestamp: float):
+        if self.count == self.capacity:
+            # 溢れるのはシミュレーションが止まっているときだけなので新しい方を捨てる
+            self.dropped += 1
+            return
+        end = (self.start + self.count) % self.capacity
+        self.chars[end] = char
+        self.times[end] = timestamp
+        self.count += 1
+
+    def pop_until(self, deadline: float) -> Iterator[str]:
+        """deadline以前に打たれた文字を古い順に取り出す"""
+        while self.count and self.times[self.start] <= deadline:
+            char = self.chars[self.start]
+            self.start = (self.start + 1) % self.capacity
+            self.count -= 1
+            yield char
@@ -2,21 +2,50 @@
 
 import pygame
 import sys
-import random
 from typing import List, Dict, Tuple, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
+import argparse
+import contextlib
+import io
 import json
+import os
+import random
+import secrets
+import tempfile
+import time
+import zlib
+from pathlib import Path
 from sounds import SoundManager
 from stages import StageManager, JAPANESE_WORDS
-from graphics import GraphicsManager, FontManager
+from graphics import GraphicsManager, FontManager, ScratchSurfaces, Viewport
 from romaji_input import TypingInputHandler
+from corpus import CorpusWord, Passage, WordCorpus, WordSampler, compile_index, join_passage, load_word_source
+from compile_corpus import compile_passage, ensure_compiled
+from replay import ReplayRecorder
+from rng import RngStreams
+from metrics import MetricsSnapshot, TypingMetrics
+from store import SessionRecord, SessionStore, StageResult
+from weakness import WeaknessModel
+from difficulty import BotTypist, DifficultyController, DifficultySettings
+from profiler import FrameProfiler, Phase
+from pacing import FramePacer, PacingMode
+from input_queue import KeyQueue, restrict_events
+from glyphs import GlyphCache, Label, display_variants
+from profiling import DEFAULT_PREFIX, ProfileCapture
+from gcpolicy import GcPolicy, HitchDetector
+from particles import BREACH, HIT, KILL, ParticleQuality, ParticleSystem
+from versus import VersusClient, parse_address, stage_schedule
+from memory import AllocationCounter, MemoryItem, MemoryTracker, font_items, graphics_items, sound_items, surface_bytes
 
 pygame.init()
 
+WORDS_DIR = Path(__file__).parent / "words"
+
 SCREEN_WIDTH = 1200
 SCREEN_HEIGHT = 800
 FPS = 60
+DIFFICULTY_INTERVAL = 15  # 難易度調整を何ティックごとに行うか
 
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -37,6 +66,19 @@ DARK_GRAY = (140, 140, 140)       # 未入力文字用
 ORANGE = (255, 165, 0)            # 強調用
 BRIGHT_RED = (255, 50, 50)        # エラー用
 
+# 値が変わったときだけ描き直す文字列とその色
+LABEL_COLORS = {
+    'score': WHITE, 'combo': YELLOW, 'combo_glow': WHITE, 'metrics': LIGHT_GRAY, 'hp': WHITE,
+    'input': YELLOW, 'input_next': WHITE, 'stage': WHITE, 'versus': LIGHT_BLUE,
+    'romaji': BRIGHT_YELLOW, 'romaji_next': LIGHT_BLUE, 'hint': LIGHT_BLUE,
+}
+GLOW_OFFSETS = ((-1, -1), (-1, 1), (1, -1), (1, 1))  # コンボの縁取りをずらして描く量
+METRICS_REFRESH = 15  # HUDのタイピング統計を描き直す間隔（ティック）
+BOSS_START_Y = 260         # ボスが現れる高さ（攻撃したらここまで戻る）
+BOSS_KNOCKBACK = 120       # 区切りを打ち終えたときにボスを押し戻す距離
+BOSS_WINDOW = 16           # 長い文章で描く、入力位置のまわりの表示形の文字数
+BOSS_FALLBACK_SEGMENTS = 6 # 文章が読めないときにコーパスから並べる単語の数
+
 class GameState(Enum):
     TITLE = "title"
     GAME = "game"
@@ -61,10 +103,59 @@ class Enemy:
     attack_power: int
     typed_chars: int = 0
     color: Tuple[int, int, int] = RED
+    display: str = ""  # 漢字の表示形（空なら text をそのまま表示）
+    display_progress: Tuple[int, ...] = ()  # 読みの入力文字数 → 表示形の入力済み文字数
+    leads: Tuple[str, ...] = ()  # 最初の数打鍵としてあり得る打鍵列
+    targeted_tick: int = -1  # ターゲットになったティック（撃破までの時間の計測用）
+    segments: Tuple[int, ...] = ()  # ボスの区切り（HP 1つぶん）ごとの読みの終わりの位置
+    segment_leads: Tuple[Tuple[str, ...], ...] = ()  # ボスの区切りごとの leads
+    # get_display_window の切り出し（入力位置が動いたときだけ切り直す）
+    window_start: int = field(default=-1, compare=False, repr=False)
+    window_text: str = field(default="", compare=False, repr=False)
     
     def is_defeated(self) -> bool:
         return self.typed_chars >= len(self.text)
     
+    def get_next_char(self) -> str:
+        """次に打つ読みの文字（打ち終えていれば空）。ボスの長い文章でも残りを切り出さない"""
+        return self.text[self.typed_chars:self.typed_chars + 1]
+    
+    def segment_start(self) -> int:
+        """いま打っている区切りの読みでの始まり（ボス以外は0）"""
+        if not self.segments or self.hp == self.max_hp:
+            return 0
+        return self.segments[self.max_hp - self.hp - 1]
+    
+    def segment_end(self) -> int:
+        """いま打っている区切りの読みでの終わり（ボス以外は読みの長さ）"""
+        if not self.segments or self.hp <= 0:
+            return len(self.text)
+        return self.segments[self.max_hp - self.hp]
+    
+    def get_display_window(self, size: int) -> Tuple[str, int]:
+        """表示形のうち入力位置のまわりのsize文字と、その中の入力済みの文字数
+
+        ボスの数百文字の文章でも描くのは窓の中だけなので、描画の手間は短い単語と変わらない。
+        """
+        display = self.get_display_text()
+        typed = self.get_display_typed_count()
+        if len(display) <= size:
+            return display, typed
+        start = min(max(0, typed - size // 4), len(display) - size)
+        if start != self.window_start:
+            self.window_start = start
+            self.window_text = display[start:start + size]
+        return self.window_text, typed - start
+    
+    def get_display_text(self) -> str:
+        return self.display or self.text
+    
+    def get_display_typed_count(self) -> int:
+        """表示形で入力済みとして描く文字数（コンパイル済みの進行マップを引くだけ）"""
+        if self.display_progress:
+            return self.display_progress[self.typed_chars]
+        return self.typed_chars
+    
     def get_remaining_text(self) -> str:
         return self.text[self.typed_chars:]
     
@@ -80,22 +171,38 @@ class EnemyProfile:
     color: Tuple[int, int, int]
 
 
+# 歩行アニメーションの名前（描画のたびに文字列を作らない）
+WALK_ANIMATIONS: Dict[EnemyType, str] = {enemy_type: f"{enemy_type.value}_walk" for enemy_type in EnemyType}
+
 ENEMY_PROFILES: Dict[EnemyType, EnemyProfile] = {
     EnemyType.ZOMBIE: EnemyProfile(1, 1.0, 10, (139, 69, 19)),
     EnemyType.RUNNER: EnemyProfile(1, 2.0, 5, (255, 165, 0)),
     EnemyType.SHOOTER: EnemyProfile(2, 0.5, 15, (128, 0, 128)),
+    EnemyType.BOSS: EnemyProfile(1, 0.2, 25, (180, 30, 30)),  # HPは文章の区切りの数にする
 }
 
 class TypingGame:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    def __init__(self, record_replays: bool = True, seed: Optional[int] = None, save_sessions: bool = True,
+                 adaptive_words: bool = True, adaptive_difficulty: bool = True,
+                 pacing: PacingMode = PacingMode.SLEEP, render_scale: float = 1.0,
+                 particle_quality: Optional[ParticleQuality] = None, download_font: bool = True):
+        # 描画は内部解像度で行い、倍率が1でなければ SCALED でウィンドウに拡大する
+        # （レイアウトとゲーム内の座標は SCREEN_WIDTH × SCREEN_HEIGHT の論理座標のまま）
+        self.view = Viewport.scaled(SCREEN_WIDTH, SCREEN_HEIGHT, render_scale)
+        self.pacer = FramePacer(pacing, FPS)
+        self.screen = self.pacer.set_mode(self.view.size, pygame.SCALED if render_scale != 1.0 else 0)
+        restrict_events()
         pygame.display.set_caption("タイピング・オブ・ザ・デッド風ゲーム")
         self.clock = pygame.time.Clock()
         
-        self.sound_manager = SoundManager()
+        # すべての乱数はこのシードから派生する（固定すればベンチマークが毎回同じになる）
+        self.seed = secrets.randbits(63) if seed is None else seed
+        self.seed_streams = RngStreams(self.seed)
+        
+        self.sound_manager = SoundManager(seed=self.seed_streams.derive('bgm'))
         self.stage_manager = StageManager()
-        self.graphics_manager = GraphicsManager()
-        self.font_manager = FontManager()
+        self.graphics_manager = GraphicsManager(seed=self.seed_streams.derive('background'), scale=render_scale)
+        self.font_manager = FontManager(scale=render_scale, download=download_font)
         
         # BGM設定
         if self.sound_manager.enabled:
@@ -114,25 +221,159 @@ class TypingGame:
         self.current_target: Optional[Enemy] = None
         self.current_input = ""
         self.typing_handler = TypingInputHandler()
+        self.probe_handler = TypingInputHandler()
+        # TEXTINPUTで受け取った文字（打った時刻のティックでシミュレーションに渡す）
+        self.key_queue = KeyQueue()
+        self.command_text: Optional[str] = None
         
         self.enemy_spawn_timer = 0
+        self.metrics = TypingMetrics(FPS)
+        
+        # 苦手な文字の統計（単語選択で多めに出す）。リプレイでは記録された重みを使う
+        self.weakness = WeaknessModel() if adaptive_words else None
+        self.char_started_tick = 0
+        
+        # 入力速度・正確さ・突破率から出現設定を調整する
+        # （Falseでも負荷の計測だけは行い、出現設定はステージの設定どおりにする）
+        self.difficulty = DifficultyController(FPS)
+        self.adaptive_difficulty = adaptive_difficulty
+        
+        # セッションの記録（ステージごとの結果は区切りのたびに確定する）
+        self.store = SessionStore() if save_sessions else None
+        self.session_active = False
+        self.session_started_at = 0.0
+        self.stage_results: List[StageResult] = []
+        self.stage_start = (0, 0, 0, 0, 0)  # (ティック, スコア, 打鍵, 正しい打鍵, 撃破)
         
+        # リプレイ用: セッションのシード、シミュレーションのティック、記録
+        self.record_replays = record_replays
+        self.recorder: Optional[ReplayRecorder] = None
+        self.session_seed = 0
+        self.tick = 0
+        self.streams = RngStreams(0)
+        self.corpus_crcs: Dict[str, int] = {}
+        
+        # 画面上の敵の先頭打鍵列とその先頭キー → 敵の数（出現・撃破時に増減）
+        self.onscreen_leads: Dict[str, int] = {}
+        self.onscreen_keys: Dict[str, int] = {}
+        
+        # ボスの文章（ステージのboss_text → モードごとの区切り）。検証したものをモードごとに持つ
+        try:
+            self.boss_source = load_word_source(WORDS_DIR / "bosses.json5")
+        except Exception as e:
+            print(f"Failed to load boss passages: {e}")
+            self.boss_source = {}
+        self.boss_passages: Dict[Tuple[str, str], Passage] = {}
+        
+        # コーパスが読めない場合の組み込み単語リスト
         self.word_lists = {
             "easy": ["cat", "dog", "run", "jump", "walk", "fire", "water", "sun", "moon", "star"],
             "medium": ["computer", "keyboard", "mouse", "typing", "game", "zombie", "attack", "defend", "weapon", "battle"],
             "hard": ["programming", "development", "algorithm", "interface", "architecture", "optimization", "debugging", "implementation"]
         }
+        self.word_samplers = {
+            "japanese": self.load_word_sampler(WORDS_DIR / "japanese.json5", JAPANESE_WORDS, True),
+            "english": self.load_word_sampler(WORDS_DIR / "english.yaml", self.word_lists, False),
+        }
+        
+        self.profiler = FrameProfiler()  # F3で区間ごとのフレーム時間を表示
+        # 打鍵・撃破・突破の粒。品質を指定しなければフレームの余裕に合わせて変える
+        self.particles = ParticleSystem(render_scale, self.seed_streams.derive('particles'),
+                                        particle_quality or ParticleQuality.HIGH, adaptive=particle_quality is None)
+        self.particles.prepare([(profile.color, KILL) for profile in ENEMY_PROFILES.values()] +
+                               [(BRIGHT_YELLOW, HIT), (BRIGHT_RED, BREACH)])
+        self.glyphs = GlyphCache()  # 敵の単語はグリフを並べて描く
+        # 毎フレーム作っていたSurfaceと文字列は使い回す（値が変わったときだけ描き直す）
+        self.scratch = ScratchSurfaces()
+        self.labels = {name: Label(color) for name, color in LABEL_COLORS.items()}
+        # F4でメモリのレポート。初回でtracemallocを始め、以後は状態が変わるたびと終了時にも出す
+        self.memory = MemoryTracker()
+        self.last_state = self.state
+        self.allocations: Optional[AllocationCounter] = None  # --alloc-debug でフレームごとの確保を数える
         
         self.japanese_mode = True  # Enable Japanese mode with romaji input
         self.running = True
+        # 対戦モード（--versus）。サーバーからシードが届くまではタイトルで待つ
+        self.versus: Optional[VersusClient] = None
         self.error_flash_timer = 0  # エラー時の視覚フィードバック用
         
+        # 第2世代のGCはゲーム中は先送りして区切りで回収する。予算を超えたフレームはGCと一緒に記録
+        self.gc_policy = GcPolicy()
+        self.hitches = HitchDetector(phase_names=[phase.name.lower() for phase in Phase])
+        self.gc_policy.freeze()  # ここまでに作ったアセットや索引は以後のGCで走査しない
+        
+    def load_word_sampler(self, source: Path, fallback: Dict[str, List[str]], japanese: bool) -> WordSampler:
+        """コンパイル済み単語コーパスを開く（失敗したら組み込みリストから一時インデックスを作る）"""
+        try:
+            corpus = ensure_compiled(source, japanese)
+        except Exception as e:
+            print(f"Failed to load word corpus {source}: {e}")
+            index_path = Path(tempfile.gettempdir()) / f"typinggame_{source.stem}.tgci"
+            corpus = WordCorpus(compile_index(fallback, index_path))
+        return WordSampler(corpus)
+    
+    def get_random_entry(self) -> CorpusWord:
+        """画面上の敵と打ち始めがかぶらない単語を優先して選ぶ
+
+        対戦では画面上の敵は倒し方で相手と違ってくるので避けない（同じシードなら同じ単語の列になる）。
+        """
+        sampler = self.word_samplers["japanese" if self.japanese_mode else "english"]
+        if self.versus:
+            return sampler.next_entry(self.current_settings().difficulty_level)
+        return sampler.next_entry(self.current_settings().difficulty_level,
+                                  self.onscreen_keys.keys(), self.onscreen_leads.keys())
+    
+    def track_enemy_leads(self, enemy: Enemy, delta: int):
+        """画面上の先頭打鍵列インデックスに敵を登録（delta=1）・削除（delta=-1）"""
+        for index, keys in ((self.onscreen_leads, enemy.leads),
+                            (self.onscreen_keys, {lead[:1] for lead in enemy.leads})):
+            for key in keys:
+                count = index.get(key, 0) + delta
+                if count > 0:
+                    index[key] = count
+                else:
+                    index.pop(key, None)
+    
+    def apply_focus(self, weights: Dict[str, int]):
+        """現在のモードの単語選択で重点的に出す文字を設定（リプレイにも残す）"""
+        self.word_samplers["japanese" if self.japanese_mode else "english"].set_focus(weights)
+        if self.recorder:
+            self.recorder.focus(self.tick, weights)
+    
+    def update_focus(self):
+        """苦手な文字の統計から重点文字を選び直す（セッション開始時とステージクリア時）"""
+        if self.weakness:
+            weights = self.weakness.focus_weights()
+            # リプレイに整数で残すので、使う重みも同じ値に丸めておく
+            self.apply_focus({char: max(1, round(weight * 100)) for char, weight in weights.items()})
+    
+    def current_settings(self) -> DifficultySettings:
+        """いま適用する出現設定（難易度調整が無効ならステージの設定そのもの）"""
+        if self.adaptive_difficulty and self.difficulty.settings:
+            return self.difficulty.settings
+        stage = self.stage_manager.get_current_stage()
+        return DifficultySettings(stage.enemy_spawn_delay, stage.max_enemies, stage.difficulty_level)
+    
+    def update_difficulty(self):
+        """難易度調整を1ステップ進める（DIFFICULTY_INTERVALティックごと）"""
+        stage = self.stage_manager.get_current_stage()
+        snapshot = self.metrics.rolling(self.tick)
+        # ボスは文章全体ではなく、いまの区切りの残りだけを溜まっている文字に数える。
+        # それでも区切りは単語より長いので、ボスがいる間は強度を動かさない
+        queued_chars = sum(enemy.segment_end() - enemy.typed_chars for enemy in self.enemies)
+        boss = any(enemy.segments for enemy in self.enemies)
+        self.difficulty.update(stage, DIFFICULTY_INTERVAL / FPS, queued_chars,
+                               snapshot.cpm, snapshot.accuracy, snapshot.breach_rate, hold=boss)
+    
     def get_random_word(self) -> str:
-        current_stage = self.stage_manager.get_current_stage()
-        if self.japanese_mode:
-            return random.choice(JAPANESE_WORDS[current_stage.difficulty_level])
-        else:
-            return random.choice(self.word_lists[current_stage.difficulty_level])
+        return self.get_random_entry().text
+    
+    def corpus_crc(self) -> int:
+        """現在のモードの単語コーパスのCRC32（リプレイの前提条件チェック用）"""
+        mode = "japanese" if self.japanese_mode else "english"
+        if mode not in self.corpus_crcs:
+            self.corpus_crcs[mode] = zlib.crc32(self.word_samplers[mode].corpus.data)
+        return self.corpus_crcs[mode]
     
     def spawn_enemy(self):
         current_stage = self.stage_manager.get_current_stage()
@@ -142,30 +383,105 @@ class TypingGame:
         enemy_type_names = list(weights.keys())
         enemy_weights = list(weights.values())
         
-        chosen_type_name = random.choices(enemy_type_names, weights=enemy_weights)[0]
+        chosen_type_name = self.streams.random('enemy_type').choices(enemy_type_names, weights=enemy_weights)[0]
         enemy_type = EnemyType(chosen_type_name)
         
-        x = random.randint(50, SCREEN_WIDTH - 150)
-        y = random.randint(50, SCREEN_HEIGHT // 2)
+        position_rng = self.streams.random('position')
+        x = position_rng.randint(50, SCREEN_WIDTH - 150)
+        y = position_rng.randint(50, SCREEN_HEIGHT // 2)
         
-        text = self.get_random_word()
+        word = self.get_random_entry()
+        if self.versus:
+            self.versus.record_spawn(word.text)
 
         profile = ENEMY_PROFILES.get(enemy_type)
         enemy = Enemy(
             x,
             y,
             enemy_type,
-            text,
+            word.text,
             profile.hp,
             profile.hp,
             profile.speed,
             profile.attack_power,
             color=profile.color,
+            display=word.display if word.display != word.text else "",
+            display_progress=word.progress,
+            leads=word.leads,
+        )
+        self.enemies.append(enemy)
+        self.track_enemy_leads(enemy, 1)
+    
+    def boss_passage(self, name: str) -> Passage:
+        """ボスの文章（モードごとに一度だけ検証してまとめる）。読めなければコーパスの難しい単語を並べる"""
+        mode = "japanese" if self.japanese_mode else "english"
+        key = (name, mode)
+        if key not in self.boss_passages:
+            try:
+                passage = compile_passage(self.boss_source[name][mode], self.japanese_mode)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Boss passage {name}/{mode} unavailable ({e}), using corpus words")
+                # セッションの乱数を使わないので、リプレイの展開は変わらない
+                corpus = self.word_samplers[mode].corpus
+                rng = random.Random(name)
+                passage = join_passage([[corpus.entry(corpus.sample('hard', rng))]
+                                        for _ in range(BOSS_FALLBACK_SEGMENTS)])
+            self.boss_passages[key] = passage
+        return self.boss_passages[key]
+    
+    def spawn_boss(self):
+        """ボスステージの始めに、ステージの文章を持ったボスを出す"""
+        passage = self.boss_passage(self.stage_manager.get_current_stage().boss_text)
+        word = passage.word
+        profile = ENEMY_PROFILES[EnemyType.BOSS]
+        enemy = Enemy(
+            SCREEN_WIDTH // 2,
+            BOSS_START_Y,
+            EnemyType.BOSS,
+            word.text,
+            len(passage.segments),
+            len(passage.segments),
+            profile.speed,
+            profile.attack_power,
+            color=profile.color,
+            display=word.display if word.display != word.text else "",
+            display_progress=word.progress,
+            leads=word.leads,
+            segments=passage.segments,
+            segment_leads=passage.leads,
         )
         self.enemies.append(enemy)
+        self.track_enemy_leads(enemy, 1)
+        self.stage_manager.boss_spawned = True
+    
+    def check_boss_segment(self, enemy: Enemy):
+        """ボスの区切りを打ち終えたらHPを1つ減らし、押し戻してターゲットを外す
+
+        次の区切りは打ち直して選び直す（その間にほかの敵を狙える）。入力は
+        enemy.typed_chars から再開するので、文章の頭から照合し直すことはない。
+        """
+        if not enemy.segments or enemy.is_defeated() or enemy.typed_chars != enemy.segment_end():
+            return
+        self.score += (enemy.typed_chars - enemy.segment_start()) * 10 * (self.combo + 1)
+        self.combo += 1
+        enemy.hp -= 1
+        # 次の区切りの打ち始めで、画面上の敵と打ち始めがかぶらない単語を選ばせる
+        if enemy.segment_leads:
+            self.track_enemy_leads(enemy, -1)
+            enemy.leads = enemy.segment_leads[enemy.max_hp - enemy.hp]
+            self.track_enemy_leads(enemy, 1)
+        enemy.y = max(BOSS_START_Y, enemy.y - BOSS_KNOCKBACK)
+        self.sound_manager.play_sound('hit')
+        self.particles.emit(enemy.x, enemy.y, KILL, enemy.color)
+        self.current_target = None
+        self.current_input = ""
+        self.typing_handler.set_target_text("")
     
     def handle_typing_input(self, char: str):
-        print(f"Handling input: '{char}'")
+        if self.recorder:
+            self.recorder.key(self.tick, char)
+        if self.versus:
+            self.versus.send_key(self.tick, char)
         
         if self.japanese_mode:
             self.handle_japanese_input(char)
@@ -177,40 +493,48 @@ class TypingGame:
         if not self.current_target:
             # 新しいターゲットを探す
             for enemy in self.enemies:
-                # 新しいハンドラーでテスト
-                test_handler = TypingInputHandler()
-                test_handler.set_target_text(enemy.text)
-                result = test_handler.process_input(char)
+                # 試し打ち用のハンドラーでテスト（変換表を作り直さないように使い回す）
+                # （途中まで打ったボスはその位置から）
+                self.probe_handler.set_target_text(enemy.text, enemy.typed_chars)
+                result = self.probe_handler.process_input(char)
                 if result['success']:
                     self.current_target = enemy
-                    self.typing_handler.set_target_text(enemy.text)
-                    self.typing_handler.process_input(char)  # 実際の入力を処理
-                    print(f"Target selected: {enemy.text}")
+                    enemy.targeted_tick = self.tick
+                    self.char_started_tick = self.tick
+                    self.typing_handler.set_target_text(enemy.text, enemy.typed_chars)
                     break
+            else:
+                self.metrics.record_key(self.tick, False)
+                return
         
-        elif self.current_target:  # ターゲットが既に選択されている場合
+        # 選んだ直後の1打鍵目もここで処理する（「え」のように1打鍵で終わる文字があるため）
+        if self.current_target:
+            target_char = self.typing_handler.get_current_target_char()
             result = self.typing_handler.process_input(char)
+            self.metrics.record_key(self.tick, result['success'])
             
             if result['success']:
                 self.sound_manager.play_sound('type')
+                self.particles.emit(self.current_target.x, self.current_target.y, HIT, BRIGHT_YELLOW)
                 self.current_input = self.typing_handler.get_current_input_display()
-                print(f"Good input! Next expected: {result.get('expected_next', 'None')}")
                 
                 if result['char_completed']:
                     self.current_target.typed_chars += 1
-                    print(f"Character completed! Progress: {self.current_target.typed_chars}/{len(self.current_target.text)}")
+                    self.metrics.record_char(self.tick)
+                    self.record_char_completed(target_char)
                     
                     if result['word_completed']:
-                        print(f"Word completed!")
                         self.defeat_enemy(self.current_target)
                         self.current_target = None
                         self.current_input = ""
                         # ハンドラーもリセット
-                        self.typing_handler = TypingInputHandler()
+                        self.typing_handler.set_target_text("")
+                    else:
+                        self.check_boss_segment(self.current_target)
             else:
-                expected_chars = result.get('expected_next', [])
-                expected_str = '/'.join(expected_chars) if expected_chars else '?'
-                print(f"Wrong input! Expected: {expected_str}")
+                expected_chars = result['expected_next']
+                if self.weakness and expected_chars:
+                    self.weakness.record_miss(target_char, expected_chars[0], char)
                 # ミスした場合は現在の文字の入力をリセット（単語は保持）
                 self.typing_handler.reset_current_char_input()
                 self.combo = 0
@@ -223,81 +547,114 @@ class TypingGame:
         """英語入力の処理"""
         if not self.current_target:
             for enemy in self.enemies:
-                remaining_text = enemy.get_remaining_text()
-                if remaining_text and remaining_text[0].lower() == char.lower():
+                next_char = enemy.get_next_char()
+                if next_char and next_char.lower() == char.lower():
                     self.current_target = enemy
-                    print(f"Target selected: {remaining_text}")
+                    enemy.targeted_tick = self.tick
+                    self.char_started_tick = self.tick
                     break
         
         if self.current_target:
-            remaining = self.current_target.get_remaining_text()
-            if remaining and remaining[0].lower() == char.lower():
+            next_char = self.current_target.get_next_char()
+            correct = bool(next_char) and next_char.lower() == char.lower()
+            self.metrics.record_key(self.tick, correct)
+            if correct:
                 self.current_target.typed_chars += 1
+                self.metrics.record_char(self.tick)
+                self.record_char_completed(next_char)
                 self.current_input += char
                 self.sound_manager.play_sound('type')
-                print(f"Correct! Progress: {self.current_target.typed_chars}/{len(self.current_target.text)}")
+                self.particles.emit(self.current_target.x, self.current_target.y, HIT, BRIGHT_YELLOW)
                 
                 if self.current_target.is_defeated():
-                    print(f"Enemy defeated!")
                     self.defeat_enemy(self.current_target)
                     self.current_target = None
                     self.current_input = ""
+                else:
+                    self.check_boss_segment(self.current_target)
             else:
-                print(f"Wrong character!")
+                if self.weakness and next_char:
+                    self.weakness.record_miss(next_char, next_char, char)
                 self.combo = 0
                 self.sound_manager.play_sound('error')
+        else:
+            self.metrics.record_key(self.tick, False)
+    
+    def record_char_completed(self, char: str):
+        """1文字の入力完了を苦手な文字の統計に入れる"""
+        if self.weakness:
+            self.weakness.record_char(char, self.tick - self.char_started_tick)
+        self.char_started_tick = self.tick
     
     def defeat_enemy(self, enemy: Enemy):
         if enemy in self.enemies:
-            points = len(enemy.text) * 10 * (self.combo + 1)
+            # ボスは打ち終えた区切りのぶんを check_boss_segment で加算済み
+            points = (len(enemy.text) - enemy.segment_start()) * 10 * (self.combo + 1)
             self.score += points
             self.combo += 1
+            self.metrics.record_kill(self.tick, self.tick - enemy.targeted_tick)
             self.enemies.remove(enemy)
+            self.track_enemy_leads(enemy, -1)
             self.sound_manager.play_sound('defeat')
+            self.particles.emit(enemy.x, enemy.y, KILL, enemy.color)
+            if enemy.segments:
+                self.stage_manager.defeat_boss()
     
     def update_enemies(self):
         remaining = []
         for enemy in self.enemies:
             enemy.y += enemy.speed
-            if enemy.y > SCREEN_HEIGHT - 100:
+            if enemy.y > SCREEN_HEIGHT - 100 and enemy.segments:
+                # ボスは倒すまで消えず、攻撃したら元の高さに戻る
+                self.player_hp -= enemy.attack_power
+                self.metrics.record_breach(self.tick)
+                self.combo = 0
+                self.sound_manager.play_sound('damage')
+                self.particles.emit(enemy.x, SCREEN_HEIGHT - 100, BREACH, BRIGHT_RED)
+                enemy.y = BOSS_START_Y
+                remaining.append(enemy)
+            elif enemy.y > SCREEN_HEIGHT - 100:
                 self.player_hp -= enemy.attack_power
+                self.metrics.record_breach(self.tick)
+                self.track_enemy_leads(enemy, -1)
                 if enemy == self.current_target:
                     self.current_target = None
                     self.current_input = ""
                 self.combo = 0
                 self.sound_manager.play_sound('damage')
+                self.particles.emit(enemy.x, SCREEN_HEIGHT - 100, BREACH, BRIGHT_RED)
             else:
                 remaining.append(enemy)
         self.enemies = remaining
     
     def draw_title_screen(self):
+        px = self.view.px
+        center_x = self.view.width // 2
+        
         # Draw background
         bg = self.graphics_manager.get_image('background')
         self.screen.blit(bg, (0, 0))
         
         # Dark overlay for better text readability
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(128)
-        overlay.fill(BLACK)
-        self.screen.blit(overlay, (0, 0))
+        self.scratch.blend_rect(self.screen, BLACK, 128, 0, 0, self.view.width, self.view.height)
         
         # Title
         title_font = self.font_manager.get_font('large', self.japanese_mode)
         title_text = title_font.render("タイピング・オブ・ザ・デッド", True, WHITE)
-        title_rect = title_text.get_rect(center=(SCREEN_WIDTH // 2, 200))
+        title_rect = title_text.get_rect(center=(center_x, px(200)))
         self.screen.blit(title_text, title_rect)
         
         # Subtitle
         subtitle_font = self.font_manager.get_font('medium', False)
         subtitle_text = subtitle_font.render("TYPING OF THE DEAD", True, GRAY)
-        subtitle_rect = subtitle_text.get_rect(center=(SCREEN_WIDTH // 2, 260))
+        subtitle_rect = subtitle_text.get_rect(center=(center_x, px(260)))
         self.screen.blit(subtitle_text, subtitle_rect)
         
         # Menu buttons with graphics
         button_img = self.graphics_manager.get_image('button')
         
         # Start button
-        start_button_rect = pygame.Rect(SCREEN_WIDTH // 2 - 100, 380, 200, 50)
+        start_button_rect = pygame.Rect(center_x - px(100), px(380), px(200), px(50))
         self.screen.blit(button_img, start_button_rect)
         start_font = self.font_manager.get_font('medium', False)
         start_text = start_font.render("SPACE: Start", True, WHITE)
@@ -305,30 +662,48 @@ class TypingGame:
         self.screen.blit(start_text, start_text_rect)
         
         # Settings button
-        settings_button_rect = pygame.Rect(SCREEN_WIDTH // 2 - 100, 450, 200, 50)
-        settings_button_img = pygame.transform.scale(button_img, (200, 40))
-        self.screen.blit(settings_button_img, (settings_button_rect.x, settings_button_rect.y + 5))
+        settings_button_rect = pygame.Rect(center_x - px(100), px(450), px(200), px(50))
+        settings_button_img = self.graphics_manager.get_scaled_image('button', px(200), px(40))
+        self.screen.blit(settings_button_img, (settings_button_rect.x, settings_button_rect.y + px(5)))
         settings_font = self.font_manager.get_font('small', False)
         settings_text = settings_font.render("S: Settings", True, LIGHT_GRAY)
-        settings_text_rect = settings_text.get_rect(center=(settings_button_rect.centerx, settings_button_rect.centery + 5))
+        settings_text_rect = settings_text.get_rect(center=(settings_button_rect.centerx, settings_button_rect.centery + px(5)))
         self.screen.blit(settings_text, settings_text_rect)
         
         # Quit instruction
         quit_font = self.font_manager.get_font('small', False)
         quit_text = quit_font.render("ESC: Quit", True, GRAY)
-        quit_rect = quit_text.get_rect(center=(SCREEN_WIDTH // 2, 520))
+        quit_rect = quit_text.get_rect(center=(center_x, px(520)))
         self.screen.blit(quit_text, quit_rect)
+        
+        # 対戦はサーバーが全員揃ったところで始める
+        if self.versus:
+            versus = self.versus
+            if versus.error:
+                waiting_str, color = versus.error, RED
+            elif versus.ended or not versus.connected:
+                waiting_str, color = ("対戦は終わりました" if self.japanese_mode else "The match is over"), GRAY
+            else:
+                waiting_str = "対戦相手を待っています…" if self.japanese_mode else "Waiting for opponents..."
+                color = LIGHT_BLUE
+            waiting_font = self.font_manager.get_font('medium', self.japanese_mode)
+            waiting_text = waiting_font.render(waiting_str, True, color)
+            self.screen.blit(waiting_text, waiting_text.get_rect(center=(center_x, px(320))))
+        
+        self.draw_score_tables(580)
     
     def draw_game_screen(self):
+        view = self.view
+        px = view.px
+        
         # Draw background
         bg = self.graphics_manager.get_image('background')
         self.screen.blit(bg, (0, 0))
         
         # Dark overlay for gameplay area
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(64)
-        overlay.fill(BLACK)
-        self.screen.blit(overlay, (0, 0))
+        self.scratch.blend_rect(self.screen, BLACK, 64, 0, 0, view.width, view.height)
+        profiler = self.profiler
+        profiler.mark(Phase.BACKGROUND)
         
         # Draw enemies (with animation)
         animation_frame = int(pygame.time.get_ticks() / 150) % 10  # アニメーション速度調整
@@ -341,58 +716,101 @@ class TypingGame:
             enemy.animation_frame = animation_frame
             
             # アニメーションまたは静的スプライトを取得
-            animation_name = f"{sprite_name}_walk"
+            animation_name = WALK_ANIMATIONS[enemy.enemy_type]
             if animation_name in self.graphics_manager.animations:
                 enemy_sprite = self.graphics_manager.get_animation_frame(animation_name, animation_frame)
             else:
                 enemy_sprite = self.graphics_manager.get_image(sprite_name)
             
+            # 敵の位置は論理座標なので内部解像度に直す
+            enemy_x, enemy_y = view.pos(enemy.x, enemy.y)
+            
             # Highlight current target
-            if enemy == self.current_target:
+            if enemy is self.current_target:
                 # Yellow glow effect
-                glow_surf = pygame.Surface((enemy_sprite.get_width() + 10, enemy_sprite.get_height() + 10))
-                glow_surf.set_alpha(128)
-                glow_surf.fill(YELLOW)
-                self.screen.blit(glow_surf, (enemy.x - enemy_sprite.get_width()//2 - 5, enemy.y - enemy_sprite.get_height()//2 - 5))
+                self.scratch.blend_rect(self.screen, YELLOW, 128,
+                                        enemy_x - enemy_sprite.get_width()//2 - px(5), enemy_y - enemy_sprite.get_height()//2 - px(5),
+                                        enemy_sprite.get_width() + px(10), enemy_sprite.get_height() + px(10))
             
             # Draw enemy sprite
-            sprite_rect = enemy_sprite.get_rect(center=(int(enemy.x), int(enemy.y)))
+            sprite_rect = enemy_sprite.get_rect(center=(enemy_x, enemy_y))
             self.screen.blit(enemy_sprite, sprite_rect)
+            profiler.mark(Phase.ENEMIES)
+            
+            if enemy.segments:
+                self.draw_boss_hp(enemy, sprite_rect)
             
             # Adaptive text box sizing based on content
-            if enemy == self.current_target:
+            display_text = enemy.get_display_window(BOSS_WINDOW)[0]
+            if enemy is self.current_target:
                 # Calculate required width based on text length
                 test_font = font_xlarge
-                text_width = test_font.size(enemy.text)[0] if enemy.text else 100
-                textbox_width = max(350, text_width + 100)  # 余裕を持たせる
-                textbox_height = 120  # より高く
+                text_width = test_font.size(display_text)[0] if display_text else px(100)
+                textbox_width = max(px(350), text_width + px(100))  # 余裕を持たせる
+                textbox_height = px(120)  # より高く
             else:
                 test_font = font_large
-                text_width = test_font.size(enemy.text)[0] if enemy.text else 100
-                textbox_width = max(250, text_width + 60)
-                textbox_height = 60
+                text_width = test_font.size(display_text)[0] if display_text else px(100)
+                textbox_width = max(px(250), text_width + px(60))
+                textbox_height = px(60)
             
             # 画面内に収まるように位置調整（改善版）
-            textbox_x = max(textbox_width//2 + 10, min(SCREEN_WIDTH - textbox_width//2 - 10, enemy.x))
-            textbox_y = max(textbox_height + 30, min(enemy.y - 30, SCREEN_HEIGHT // 2))
+            textbox_x = max(textbox_width//2 + px(10), min(view.width - textbox_width//2 - px(10), enemy_x))
+            # ボスは大きいので頭の上に出す
+            top = enemy_y - enemy_sprite.get_height() // 2 if enemy.segments else enemy_y - px(30)
+            textbox_y = max(textbox_height + px(30), min(top, view.height // 2))
             
             # テキストボックス描画
-            textbox_img = self.graphics_manager.get_image('textbox')
-            textbox_scaled = pygame.transform.scale(textbox_img, (textbox_width, textbox_height))
+            textbox_scaled = self.graphics_manager.get_scaled_image('textbox', textbox_width, textbox_height)
             textbox_rect = pygame.Rect(textbox_x - textbox_width//2, textbox_y - textbox_height, textbox_width, textbox_height)
             self.screen.blit(textbox_scaled, textbox_rect)
+            profiler.mark(Phase.TEXTBOXES)
             
             # 改善されたテキスト表示
             self.draw_enemy_text_with_progress(enemy, textbox_rect, textbox_width)
+            profiler.mark(Phase.TEXT)
+        
+        self.particles.draw(self.screen)
+        profiler.mark(Phase.PARTICLES)
         
         # Draw HUD
         self.draw_hud()
+        profiler.mark(Phase.HUD)
         
         # Draw stage info
         self.draw_stage_info()
+        profiler.mark(Phase.STAGE_INFO)
+    
+    def draw_boss_hp(self, enemy: Enemy, sprite_rect: pygame.Rect):
+        """ボスの下に残りの区切りの数をマスで描く"""
+        px = self.view.px
+        gap = px(3)
+        width = sprite_rect.width + px(40)
+        cell = max(1, (width - gap * (enemy.max_hp - 1)) // enemy.max_hp)
+        x = sprite_rect.centerx - (cell * enemy.max_hp + gap * (enemy.max_hp - 1)) // 2
+        y = sprite_rect.bottom + px(6)
+        for index in range(enemy.max_hp):
+            self.screen.fill(BRIGHT_RED if index < enemy.hp else DARK_RED, (x, y, cell, px(10)))
+            x += cell + gap
+    
+    def prepare_glyphs(self):
+        """現在のモードのコーパスに出てくる文字を、敵の単語に使うフォントと色で焼いておく"""
+        sampler = self.word_samplers["japanese" if self.japanese_mode else "english"]
+        font_large = self.font_manager.get_font('large', self.japanese_mode)
+        font_xlarge = self.font_manager.get_font('xlarge', self.japanese_mode)
+        chars = display_variants(sampler.corpus.charset())
+        for stage in self.stage_manager.stages:
+            if stage.boss_text:
+                chars.update(self.boss_passage(stage.boss_text).word.display)
+        self.glyphs.prepare(chars, [
+            (font_large, BRIGHT_GREEN), (font_large, BRIGHT_WHITE),
+            (font_xlarge, BRIGHT_GREEN), (font_xlarge, DARK_GRAY), (font_xlarge, BLACK),
+        ])
     
     def draw_enemy_text_with_progress(self, enemy: Enemy, textbox_rect: pygame.Rect, textbox_width: int):
         """敵のテキストを進行状況付きで描画"""
+        view = self.view
+        px = view.px
         # テキストボックスの実際の位置を使用
         textbox_x = textbox_rect.centerx
         textbox_y = textbox_rect.centery
@@ -402,158 +820,181 @@ class TypingGame:
         font_xlarge = self.font_manager.get_font('xlarge', self.japanese_mode)
         small_font = self.font_manager.get_font('medium', False)
         
-        if enemy != self.current_target:
+        # 描画は表示形（漢字）で行い、入力済みの位置は進行マップで求める
+        # （ボスの長い文章は入力位置のまわりの窓だけ）
+        display_text, display_typed = enemy.get_display_window(BOSS_WINDOW)
+        
+        if enemy is not self.current_target:
             # 非ターゲットの敵は通常表示（大きなフォント）
-            typed_text = enemy.get_typed_text()
-            remaining_text = enemy.get_remaining_text()
+            typed_text = display_text[:display_typed]
+            remaining_text = display_text[display_typed:]
             
             text_font = font_large  # より大きく
             
-            text_x = textbox_x - textbox_width//2 + 15
-            text_y = textbox_y - textbox_height//2 + 15
-            
-            if typed_text:
-                typed_surface = text_font.render(typed_text, True, BRIGHT_GREEN)
-                self.screen.blit(typed_surface, (text_x, text_y))
+            text_x = textbox_x - textbox_width//2 + px(15)
+            text_y = textbox_y - textbox_height//2 + px(15)
             
-            if remaining_text:
-                remaining_surface = text_font.render(remaining_text, True, BRIGHT_WHITE)
-                typed_width = text_font.size(typed_text)[0] if typed_text else 0
-                self.screen.blit(remaining_surface, (text_x + typed_width, text_y))
+            typed_width = self.glyphs.atlas(text_font, BRIGHT_GREEN).draw(self.screen, typed_text, text_x, text_y)
+            self.glyphs.atlas(text_font, BRIGHT_WHITE).draw(self.screen, remaining_text, text_x + typed_width, text_y)
         else:
             # ターゲットの敵は詳細表示（大幅改善）
             progress_info = self.typing_handler.get_progress_info()
-            typed_text = enemy.get_typed_text()
-            remaining_text = enemy.get_remaining_text()
+            typed_text = display_text[:display_typed]
+            remaining_text = display_text[display_typed:]
             current_romaji = progress_info['current_romaji']
             expected_next = progress_info['expected_next']
-            current_target_char = progress_info['current_target_char']
+            current_target_char = progress_info['current_target_char']  # 読みの文字
+            current_display_char = remaining_text[:1]  # 表示形で強調する文字
             
             # より大きなフォント
             text_font = font_xlarge
             
             # メインテキスト行
-            text_x = textbox_x - textbox_width//2 + 15
-            text_y = textbox_y - 65
+            text_x = textbox_x - textbox_width//2 + px(15)
+            text_y = textbox_y - px(65)
+            shadow = px(2)
             x_current = text_x
             
+            shadow_atlas = self.glyphs.atlas(text_font, BLACK)
+            
             # 完了した文字（明るい緑）
             if typed_text:
-                typed_surface = text_font.render(typed_text, True, BRIGHT_GREEN)
                 # 影効果追加
-                shadow_surface = text_font.render(typed_text, True, BLACK)
-                self.screen.blit(shadow_surface, (x_current + 2, text_y + 2))
-                self.screen.blit(typed_surface, (x_current, text_y))
-                x_current += text_font.size(typed_text)[0]
+                shadow_atlas.draw(self.screen, typed_text, x_current + shadow, text_y + shadow)
+                x_current += self.glyphs.atlas(text_font, BRIGHT_GREEN).draw(self.screen, typed_text, x_current, text_y)
             
             # 現在入力中の文字（強調表示）
-            if current_target_char:
+            if current_display_char:
                 if self.error_flash_timer > 0 and self.error_flash_timer % 6 < 3:
                     color = BRIGHT_RED  # エラー時の点滅効果
                 else:
                     color = BRIGHT_YELLOW if current_romaji else BRIGHT_WHITE
                 
-                char_surface = text_font.render(current_target_char, True, color)
-                char_rect = char_surface.get_rect()
-                char_rect.topleft = (x_current, text_y)
+                char_atlas = self.glyphs.atlas(text_font, color, prepare=False)
+                char_rect = pygame.Rect(x_current, text_y, char_atlas.width(current_display_char), text_font.get_height())
                 
                 # 強調背景
-                bg_rect = pygame.Rect(char_rect.x - 5, char_rect.y - 5, char_rect.width + 10, char_rect.height + 10)
-                pygame.draw.rect(self.screen, (50, 50, 100), bg_rect, border_radius=5)
-                pygame.draw.rect(self.screen, color, bg_rect, width=3, border_radius=5)
+                bg_rect = pygame.Rect(char_rect.x - px(5), char_rect.y - px(5), char_rect.width + px(10), char_rect.height + px(10))
+                pygame.draw.rect(self.screen, (50, 50, 100), bg_rect, border_radius=px(5))
+                pygame.draw.rect(self.screen, color, bg_rect, width=view.thickness(3), border_radius=px(5))
                 
                 # 影効果
-                shadow_surface = text_font.render(current_target_char, True, BLACK)
-                self.screen.blit(shadow_surface, (x_current + 2, text_y + 2))
-                self.screen.blit(char_surface, char_rect)
+                shadow_atlas.draw(self.screen, current_display_char, x_current + shadow, text_y + shadow)
+                char_atlas.draw(self.screen, current_display_char, x_current, text_y)
                 
                 # アンダーライン（太く）
                 pygame.draw.line(self.screen, color, 
-                               (char_rect.left, char_rect.bottom + 3), 
-                               (char_rect.right, char_rect.bottom + 3), 4)
+                               (char_rect.left, char_rect.bottom + px(3)), 
+                               (char_rect.right, char_rect.bottom + px(3)), view.thickness(4))
                 
                 # カーソル点滅効果
                 if not current_romaji and pygame.time.get_ticks() % 1000 < 500:
                     pygame.draw.line(self.screen, BRIGHT_WHITE, 
-                                   (char_rect.left - 3, char_rect.top), 
-                                   (char_rect.left - 3, char_rect.bottom), 4)
+                                   (char_rect.left - px(3), char_rect.top), 
+                                   (char_rect.left - px(3), char_rect.bottom), view.thickness(4))
                 
-                x_current += char_rect.width + 5
+                x_current += char_rect.width + px(5)
             
             # 残りの文字（見やすいグレー）
-            if len(remaining_text) > (1 if current_target_char else 0):
-                remaining_display = remaining_text[1:] if current_target_char else remaining_text
-                remaining_surface = text_font.render(remaining_display, True, DARK_GRAY)
+            if len(remaining_text) > 1:
+                remaining_display = remaining_text[1:]
                 # 薄い影効果
-                shadow_surface = text_font.render(remaining_display, True, BLACK)
-                self.screen.blit(shadow_surface, (x_current + 1, text_y + 1))
-                self.screen.blit(remaining_surface, (x_current, text_y))
+                shadow_atlas.draw(self.screen, remaining_display, x_current + shadow // 2, text_y + shadow // 2)
+                self.glyphs.atlas(text_font, DARK_GRAY).draw(self.screen, remaining_display, x_current, text_y)
             
             # 入力状況表示（下の行、改善）
-            sub_y = textbox_y - 25
+            sub_y = textbox_y - px(25)
             if current_romaji:
                 # 現在の入力（強調）
-                romaji_text = f"入力中: {current_romaji}"
-                romaji_surface = small_font.render(romaji_text, True, BRIGHT_YELLOW)
-                romaji_bg = pygame.Rect(text_x - 5, sub_y - 5, romaji_surface.get_width() + 10, romaji_surface.get_height() + 10)
-                pygame.draw.rect(self.screen, (40, 40, 0), romaji_bg, border_radius=3)
+                romaji = self.labels['romaji']
+                if romaji.changed(small_font, current_romaji):
+                    romaji.render(f"入力中: {current_romaji}")
+                romaji_surface = romaji.surface
+                romaji_bg = pygame.Rect(text_x - px(5), sub_y - px(5), romaji_surface.get_width() + px(10), romaji_surface.get_height() + px(10))
+                pygame.draw.rect(self.screen, (40, 40, 0), romaji_bg, border_radius=px(3))
                 self.screen.blit(romaji_surface, (text_x, sub_y))
                 
                 # 期待される次の文字
                 if expected_next:
-                    expected_text = f"次: {'/'.join(expected_next)}"
-                    expected_surface = small_font.render(expected_text, True, LIGHT_BLUE)
-                    expected_x = text_x + romaji_surface.get_width() + 15
+                    romaji_next = self.labels['romaji_next']
+                    if romaji_next.changed(small_font, expected_next):
+                        romaji_next.render(f"次: {'/'.join(expected_next)}")
+                    expected_surface = romaji_next.surface
+                    expected_x = text_x + romaji_surface.get_width() + px(15)
                     self.screen.blit(expected_surface, (expected_x, sub_y))
             elif current_target_char:
                 # 入力待ち状態（ヒント表示）
                 target_patterns = self.typing_handler.converter.get_possible_romaji_patterns(current_target_char)
                 if target_patterns:
-                    hint_text = f"入力可能: {'/'.join(target_patterns)}"
-                    hint_surface = small_font.render(hint_text, True, LIGHT_BLUE)
-                    hint_bg = pygame.Rect(text_x - 5, sub_y - 5, hint_surface.get_width() + 10, hint_surface.get_height() + 10)
-                    pygame.draw.rect(self.screen, (0, 20, 40), hint_bg, border_radius=3)
+                    hint = self.labels['hint']
+                    if hint.changed(small_font, (current_target_char, enemy.display)):
+                        hint_text = f"入力可能: {'/'.join(target_patterns)}"
+                        if enemy.display:
+                            # 漢字の単語は今打つ読みを添える
+                            hint_text = f"{current_target_char} → {hint_text}"
+                        hint.render(hint_text)
+                    hint_surface = hint.surface
+                    hint_bg = pygame.Rect(text_x - px(5), sub_y - px(5), hint_surface.get_width() + px(10), hint_surface.get_height() + px(10))
+                    pygame.draw.rect(self.screen, (0, 20, 40), hint_bg, border_radius=px(3))
                     self.screen.blit(hint_surface, (text_x, sub_y))
     
     def draw_hud(self):
+        view = self.view
+        px = view.px
+        labels = self.labels
+        
         # Score (LARGER)
         score_font = self.font_manager.get_font('large', self.japanese_mode)  # Changed to large and use japanese mode
-        score_label = "スコア: " if self.japanese_mode else "Score: "
-        score_text = score_font.render(f"{score_label}{self.score}", True, WHITE)
-        self.screen.blit(score_text, (10, 10))
+        score = labels['score']
+        if score.changed(score_font, self.score):
+            score_label = "スコア: " if self.japanese_mode else "Score: "
+            score.render(f"{score_label}{self.score}")
+        self.screen.blit(score.surface, view.pos(10, 10))
         
         # Combo with glow effect (LARGER)
         combo_font = self.font_manager.get_font('large', self.japanese_mode)  # Changed to large and use japanese mode
-        combo_label = "コンボ: " if self.japanese_mode else "Combo: "
-        combo_text = combo_font.render(f"{combo_label}{self.combo}", True, YELLOW)
+        combo, glow = labels['combo'], labels['combo_glow']
+        if combo.changed(combo_font, self.combo):
+            combo_label = "コンボ: " if self.japanese_mode else "Combo: "
+            combo.render(f"{combo_label}{self.combo}")
+            glow.changed(combo_font, self.combo)
+            glow.render(f"{combo_label}{self.combo}")
         
         # Add glow effect for high combos
         if self.combo > 5:
-            glow_text = combo_font.render(f"{combo_label}{self.combo}", True, WHITE)
-            for dx, dy in [(-1, -1), (-1, 1), (1, -1), (1, 1)]:
-                self.screen.blit(glow_text, (10 + dx, 70 + dy))  # Adjusted position
+            for dx, dy in GLOW_OFFSETS:
+                self.screen.blit(glow.surface, (px(10) + dx, px(70) + dy))  # Adjusted position
+        
+        self.screen.blit(combo.surface, view.pos(10, 70))  # Adjusted position
         
-        self.screen.blit(combo_text, (10, 70))  # Adjusted position
+        # 直近30秒のタイピング統計（表示は整数なので数ティックごとに描き直せば十分）
+        metrics_font = self.font_manager.get_font('small', self.japanese_mode)
+        metrics = labels['metrics']
+        if metrics.changed(metrics_font, self.tick // METRICS_REFRESH):
+            metrics.render(self.format_metrics(self.metrics.rolling(self.tick)))
+        self.screen.blit(metrics.surface, view.pos(10, 130))
         
         # Graphical HP Bar
         hp_bar_bg_img = self.graphics_manager.get_image('hp_bar_bg')
-        self.screen.blit(hp_bar_bg_img, (10, SCREEN_HEIGHT - 50))
+        self.screen.blit(hp_bar_bg_img, (px(10), view.height - px(50)))
         
-        # HP bar fill
-        hp_percentage = self.player_hp / self.max_hp
+        # HP bar fill（画像の左側だけを切り出して描く）
         hp_bar_img = self.graphics_manager.get_image('hp_bar')
-        hp_width = int(hp_bar_img.get_width() * hp_percentage)
+        hp_width = hp_bar_img.get_width() * self.player_hp // self.max_hp
         
         if hp_width > 0:
-            hp_bar_cropped = pygame.Surface((hp_width, hp_bar_img.get_height()))
-            hp_bar_cropped.blit(hp_bar_img, (0, 0))
-            self.screen.blit(hp_bar_cropped, (12, SCREEN_HEIGHT - 48))
+            area = self.scratch.area
+            area.width = hp_width
+            area.height = hp_bar_img.get_height()
+            self.screen.blit(hp_bar_img, (px(12), view.height - px(48)), area)
         
         # HP text (LARGER)
         hp_font = self.font_manager.get_font('medium', self.japanese_mode)  # Changed to medium and use japanese mode
-        hp_label = "HP: " if not self.japanese_mode else "HP: "  # HP is commonly used in Japanese games
-        hp_text = hp_font.render(f"{hp_label}{self.player_hp}/{self.max_hp}", True, WHITE)
-        self.screen.blit(hp_text, (10, SCREEN_HEIGHT - 90))  # Adjusted position
+        hp = labels['hp']
+        if hp.changed(hp_font, self.player_hp):
+            hp_label = "HP: " if not self.japanese_mode else "HP: "  # HP is commonly used in Japanese games
+            hp.render(f"{hp_label}{self.player_hp}/{self.max_hp}")
+        self.screen.blit(hp.surface, (px(10), view.height - px(90)))  # Adjusted position
         
         # Current input with background (LARGER) - 改善された表示
         if self.current_target and self.typing_handler:
@@ -566,95 +1007,107 @@ class TypingGame:
             
             # 現在の入力状況
             if current_romaji:
-                input_label = "入力中: " if self.japanese_mode else "Typing: "
-                input_text = input_font.render(f"{input_label}{current_romaji}", True, YELLOW)
+                input_text = labels['input']
+                if input_text.changed(input_font, current_romaji):
+                    input_label = "入力中: " if self.japanese_mode else "Typing: "
+                    input_text.render(f"{input_label}{current_romaji}")
+                input_surface = input_text.surface
                 
                 # 背景
-                bg_width = max(300, input_text.get_width() + 40)
-                input_bg = pygame.Surface((bg_width, input_text.get_height() + 30))
-                input_bg.set_alpha(200)
-                input_bg.fill(BLACK)
-                
-                input_rect = input_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 80))
-                bg_rect = input_bg.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 80))
-                
-                self.screen.blit(input_bg, bg_rect)
-                self.screen.blit(input_text, input_rect)
+                bg_width = max(px(300), input_surface.get_width() + px(40))
+                bg_height = input_surface.get_height() + px(30)
+                center_x = view.width // 2
+                center_y = view.height - px(80)
+                self.scratch.blend_rect(self.screen, BLACK, 200, center_x - bg_width // 2, center_y - bg_height // 2,
+                                        bg_width, bg_height)
+                self.screen.blit(input_surface, (center_x - input_surface.get_width() // 2,
+                                                 center_y - input_surface.get_height() // 2))
                 
                 # 期待される次の文字
                 if expected_next:
-                    expected_label = "次の文字: " if self.japanese_mode else "Next: "
-                    expected_text = small_font.render(f"{expected_label}{'/'.join(expected_next)}", True, WHITE)
-                    expected_rect = expected_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 50))
-                    self.screen.blit(expected_text, expected_rect)
+                    next_text = labels['input_next']
+                    if next_text.changed(small_font, expected_next):
+                        expected_label = "次の文字: " if self.japanese_mode else "Next: "
+                        next_text.render(f"{expected_label}{'/'.join(expected_next)}")
+                    next_surface = next_text.surface
+                    self.screen.blit(next_surface, (center_x - next_surface.get_width() // 2,
+                                                    view.height - px(50) - next_surface.get_height() // 2))
+    
+    def format_metrics(self, snapshot: MetricsSnapshot) -> str:
+        accuracy_label = "正確率" if self.japanese_mode else "Acc"
+        ttk_label = "撃破" if self.japanese_mode else "TTK"
+        return (f"KPM {snapshot.kpm:.0f}  WPM {snapshot.wpm:.0f}  "
+                f"{accuracy_label} {snapshot.accuracy:.0%}  "
+                f"{ttk_label} {snapshot.ttk:.1f}s  Burst {snapshot.burst:.0f}")
     
     def draw_stage_info(self):
+        view = self.view
+        px = view.px
         current_stage = self.stage_manager.get_current_stage()
         
         # Stage name with Japanese font if needed (LARGER)
         stage_font = self.font_manager.get_font('large', self.japanese_mode)  # Changed to large
-        stage_label = f"ステージ {current_stage.stage_id}: " if self.japanese_mode else f"Stage {current_stage.stage_id}: "
-        stage_text = stage_font.render(f"{stage_label}{current_stage.name}", True, WHITE)
+        stage = self.labels['stage']
+        if stage.changed(stage_font, current_stage.stage_id):
+            stage_label = f"ステージ {current_stage.stage_id}: " if self.japanese_mode else f"Stage {current_stage.stage_id}: "
+            stage.render(f"{stage_label}{current_stage.name}")
+        stage_text = stage.surface
         
         # Background for stage info
-        stage_bg = pygame.Surface((stage_text.get_width() + 20, stage_text.get_height() + 10))
-        stage_bg.set_alpha(180)
-        stage_bg.fill(BLACK)
-        
-        stage_bg_rect = pygame.Rect(SCREEN_WIDTH - stage_text.get_width() - 30, 5, stage_text.get_width() + 20, stage_text.get_height() + 10)
-        self.screen.blit(stage_bg, stage_bg_rect)
-        self.screen.blit(stage_text, (SCREEN_WIDTH - stage_text.get_width() - 20, 10))
+        self.scratch.blend_rect(self.screen, BLACK, 180, view.width - stage_text.get_width() - px(30), px(5),
+                                stage_text.get_width() + px(20), stage_text.get_height() + px(10))
+        self.screen.blit(stage_text, (view.width - stage_text.get_width() - px(20), px(10)))
         
         # Stage progress bar (for timed stages)
         if current_stage.duration > 0:
             progress = self.stage_manager.get_stage_progress()
             
             # Progress bar background
-            progress_bg = pygame.Surface((180, 15))
-            progress_bg.fill(GRAY)
-            progress_bg_rect = pygame.Rect(SCREEN_WIDTH - 200, 50, 180, 15)
-            self.screen.blit(progress_bg, progress_bg_rect)
+            bar_x, bar_y = view.width - px(200), px(50)
+            bar_width, bar_height = px(180), px(15)
+            self.screen.fill(GRAY, (bar_x, bar_y, bar_width, bar_height))
             
-            # Progress bar fill with gradient
+            # Progress bar fill with gradient（緑→黄→赤のバーを一度だけ作り、進んだ幅だけ切り出す）
             if progress > 0:
-                progress_width = int(180 * progress)
-                progress_surface = pygame.Surface((progress_width, 15))
-                
-                # Create gradient from green to yellow to red
-                for x in range(progress_width):
-                    ratio = x / 180
-                    if ratio < 0.5:
-                        # Green to yellow
-                        color = (int(255 * ratio * 2), 255, 0)
-                    else:
-                        # Yellow to red
-                        color = (255, int(255 * (1 - (ratio - 0.5) * 2)), 0)
-                    
-                    pygame.draw.line(progress_surface, color, (x, 0), (x, 15))
-                
-                self.screen.blit(progress_surface, (SCREEN_WIDTH - 200, 50))
+                area = self.scratch.area
+                area.width = int(bar_width * progress)
+                area.height = bar_height
+                self.screen.blit(self.scratch.gradient(bar_width, bar_height), (bar_x, bar_y), area)
+        
+        # 対戦相手の成績（サーバーから差分が届いたときだけ描き直す）
+        if self.versus and self.versus.started:
+            opponents = self.versus.opponents()
+            versus_font = self.font_manager.get_font('small', False)
+            versus_label = self.labels['versus']
+            key = tuple((name, fields.get('score', 0), fields.get('hp', 0), fields.get('kills', 0),
+                         fields.get('done', False)) for name, fields in opponents)
+            if versus_label.changed(versus_font, key):
+                versus_label.render('   '.join(f"{name}: {score} HP {hp} K {kills}{' (done)' if done else ''}"
+                                               for name, score, hp, kills, done in key))
+            versus_text = versus_label.surface
+            self.screen.blit(versus_text, (view.width - versus_text.get_width() - px(20), px(75)))
     
     def draw_settings_screen(self):
+        px = self.view.px
+        center_x = self.view.width // 2
+        
         # Draw background
         bg = self.graphics_manager.get_image('background')
         self.screen.blit(bg, (0, 0))
         
         # Dark overlay
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(180)
-        overlay.fill(BLACK)
-        self.screen.blit(overlay, (0, 0))
+        self.scratch.blend_rect(self.screen, BLACK, 180, 0, 0, self.view.width, self.view.height)
         
         # Title
         title_font = self.font_manager.get_font('large', False)
         title_text = title_font.render("Settings", True, WHITE)
-        title_rect = title_text.get_rect(center=(SCREEN_WIDTH // 2, 150))
+        title_rect = title_text.get_rect(center=(center_x, px(150)))
         self.screen.blit(title_text, title_rect)
         
         # Language setting with button graphics
         button_img = self.graphics_manager.get_image('button')
-        lang_button_rect = pygame.Rect(SCREEN_WIDTH // 2 - 150, 230, 300, 50)
-        lang_button_scaled = pygame.transform.scale(button_img, (300, 50))
+        lang_button_rect = pygame.Rect(center_x - px(150), px(230), px(300), px(50))
+        lang_button_scaled = pygame.transform.scale(button_img, lang_button_rect.size)
         self.screen.blit(lang_button_scaled, lang_button_rect)
         
         lang_text = "日本語モード: ON" if self.japanese_mode else "Japanese Mode: OFF"
@@ -670,8 +1123,8 @@ class TypingGame:
         ]
         
         for i, (en_text, jp_text) in enumerate(instructions):
-            instruction_button_rect = pygame.Rect(SCREEN_WIDTH // 2 - 100, 350 + i * 60, 200, 40)
-            instruction_button_scaled = pygame.transform.scale(button_img, (200, 40))
+            instruction_button_rect = pygame.Rect(center_x - px(100), px(350 + i * 60), px(200), px(40))
+            instruction_button_scaled = pygame.transform.scale(button_img, instruction_button_rect.size)
             self.screen.blit(instruction_button_scaled, instruction_button_rect)
             
             text = jp_text if self.japanese_mode else en_text
@@ -681,15 +1134,15 @@ class TypingGame:
             self.screen.blit(instruction_surface, instruction_rect)
     
     def draw_result_screen(self):
+        px = self.view.px
+        center_x = self.view.width // 2
+        
         # Draw background
         bg = self.graphics_manager.get_image('background')
         self.screen.blit(bg, (0, 0))
         
         # Dark overlay
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(200)
-        overlay.fill(BLACK)
-        self.screen.blit(overlay, (0, 0))
+        self.scratch.blend_rect(self.screen, BLACK, 200, 0, 0, self.view.width, self.view.height)
         
         # Result text
         result_font = self.font_manager.get_font('large', self.japanese_mode)
@@ -700,28 +1153,48 @@ class TypingGame:
             result_text_str = "ステージクリア" if self.japanese_mode else "STAGE CLEAR"
             result_text = result_font.render(result_text_str, True, GREEN)
         
-        result_rect = result_text.get_rect(center=(SCREEN_WIDTH // 2, 200))
+        result_rect = result_text.get_rect(center=(center_x, px(200)))
         self.screen.blit(result_text, result_rect)
         
+        # 対戦の勝敗（相手が終わるまでは待つ）
+        if self.versus and self.versus.started:
+            versus = self.versus
+            if not versus.ended:
+                versus_str, color = ("相手の終了を待っています…" if self.japanese_mode else "Waiting for opponents..."), LIGHT_BLUE
+            elif versus.winner is None:
+                versus_str, color = ("引き分け" if self.japanese_mode else "DRAW"), YELLOW
+            elif versus.winner == versus.player:
+                versus_str, color = ("勝利！" if self.japanese_mode else "YOU WIN"), GREEN
+            else:
+                winner = versus.names[versus.winner]
+                versus_str, color = (f"{winner} の勝ち" if self.japanese_mode else f"{winner} WINS"), RED
+            versus_font = self.font_manager.get_font('medium', self.japanese_mode)
+            versus_text = versus_font.render(versus_str, True, color)
+            self.screen.blit(versus_text, versus_text.get_rect(center=(center_x, px(250))))
+        
         # Score with background
         score_font = self.font_manager.get_font('medium', self.japanese_mode)
         score_text_str = f"最終スコア: {self.score}" if self.japanese_mode else f"Final Score: {self.score}"
         score_text = score_font.render(score_text_str, True, WHITE)
         
-        score_bg = pygame.Surface((score_text.get_width() + 40, score_text.get_height() + 20))
-        score_bg.set_alpha(150)
-        score_bg.fill(BLACK)
-        score_bg_rect = score_bg.get_rect(center=(SCREEN_WIDTH // 2, 300))
-        self.screen.blit(score_bg, score_bg_rect)
+        score_bg_rect = pygame.Rect(0, 0, score_text.get_width() + px(40), score_text.get_height() + px(20))
+        score_bg_rect.center = (center_x, px(300))
+        self.scratch.blend_rect(self.screen, BLACK, 150, *score_bg_rect)
         
-        score_rect = score_text.get_rect(center=(SCREEN_WIDTH // 2, 300))
+        score_rect = score_text.get_rect(center=(center_x, px(300)))
         self.screen.blit(score_text, score_rect)
         
+        # セッション全体のタイピング統計
+        metrics_font = self.font_manager.get_font('small', self.japanese_mode)
+        metrics_text = metrics_font.render(self.format_metrics(self.metrics.summary(self.tick)), True, LIGHT_GRAY)
+        metrics_rect = metrics_text.get_rect(center=(center_x, px(345)))
+        self.screen.blit(metrics_text, metrics_rect)
+        
         # Control buttons
         button_img = self.graphics_manager.get_image('button')
         
         # Restart button
-        restart_button_rect = pygame.Rect(SCREEN_WIDTH // 2 - 100, 380, 200, 50)
+        restart_button_rect = pygame.Rect(center_x - px(100), px(380), px(200), px(50))
         self.screen.blit(button_img, restart_button_rect)
         restart_font = self.font_manager.get_font('medium', self.japanese_mode)
         restart_text_str = "R: リスタート" if self.japanese_mode else "R: Restart"
@@ -730,25 +1203,152 @@ class TypingGame:
         self.screen.blit(restart_text, restart_rect)
         
         # Title button
-        title_button_rect = pygame.Rect(SCREEN_WIDTH // 2 - 100, 450, 200, 50)
-        title_button_scaled = pygame.transform.scale(button_img, (200, 40))
-        self.screen.blit(title_button_scaled, (title_button_rect.x, title_button_rect.y + 5))
+        title_button_rect = pygame.Rect(center_x - px(100), px(450), px(200), px(50))
+        title_button_scaled = pygame.transform.scale(button_img, (px(200), px(40)))
+        self.screen.blit(title_button_scaled, (title_button_rect.x, title_button_rect.y + px(5)))
         title_font = self.font_manager.get_font('small', self.japanese_mode)
         title_text_str = "T: タイトルへ" if self.japanese_mode else "T: Title"
         title_text = title_font.render(title_text_str, True, LIGHT_GRAY)
-        title_rect = title_text.get_rect(center=(title_button_rect.centerx, title_button_rect.centery + 5))
+        title_rect = title_text.get_rect(center=(title_button_rect.centerx, title_button_rect.centery + px(5)))
         self.screen.blit(title_text, title_rect)
+        
+        # 苦手な文字とよくある打ち間違い
+        if self.weakness:
+            weak_chars = ' '.join(self.weakness.focus_weights())
+            confused = ' '.join(f"{expected}→{typed}" for expected, typed in self.weakness.confused_keys(3).items())
+            if weak_chars or confused:
+                practice_font = self.font_manager.get_font('small', self.japanese_mode)
+                practice_text = (f"苦手: {weak_chars or '-'}  ミス: {confused or '-'}" if self.japanese_mode
+                                 else f"Weak: {weak_chars or '-'}  Misses: {confused or '-'}")
+                practice_surface = practice_font.render(practice_text, True, LIGHT_BLUE)
+                self.screen.blit(practice_surface, practice_surface.get_rect(center=(center_x, px(515))))
+        
+        self.draw_score_tables(555, highlight_session=True)
+    
+    def draw_score_tables(self, top: int, highlight_session: bool = False):
+        """ハイスコア表と履歴（ストアのスナップショットを描くだけ。topは論理座標）"""
+        if not self.store:
+            return
+        view = self.view
+        px = view.px
+        snapshot = self.store.snapshot(self.japanese_mode)
+        font = self.font_manager.get_font('small', self.japanese_mode)
+        
+        high_title = "ハイスコア" if self.japanese_mode else "High Scores"
+        if highlight_session and snapshot.last_started_at == self.session_started_at and snapshot.last_rank:
+            high_title += f" ({snapshot.last_rank}位)" if self.japanese_mode else f" (#{snapshot.last_rank})"
+        history_title = "履歴" if self.japanese_mode else "History"
+        
+        columns = [
+            (view.width // 4, high_title,
+             [f"{i}. {row.score}  ST{row.stage}  {row.accuracy:.0%}" for i, row in enumerate(snapshot.high_scores, 1)]),
+            (view.width * 3 // 4, history_title,
+             [f"{time.strftime('%m/%d %H:%M', time.localtime(row.ended_at))}  {row.score}  ST{row.stage}"
+              for row in snapshot.history]),
+        ]
+        for center_x, title, lines in columns:
+            title_surface = font.render(title, True, YELLOW)
+            self.screen.blit(title_surface, title_surface.get_rect(center=(center_x, px(top))))
+            for i, line in enumerate(lines):
+                line_surface = font.render(line, True, LIGHT_GRAY)
+                self.screen.blit(line_surface, line_surface.get_rect(center=(center_x, px(top + 32 + i * 28))))
+        
+        if snapshot.sessions:
+            totals = (f"累計 {snapshot.sessions} セッション / {snapshot.keys} 打鍵 / 正確率 {snapshot.accuracy:.0%}"
+                      if self.japanese_mode else
+                      f"Total: {snapshot.sessions} sessions / {snapshot.keys} keys / {snapshot.accuracy:.0%} accuracy")
+            totals_surface = font.render(totals, True, GRAY)
+            self.screen.blit(totals_surface, totals_surface.get_rect(center=(view.width // 2, view.height - px(25))))
+    
+    def stage_counters(self) -> Tuple[int, int, int, int, int]:
+        return (self.tick, self.score, self.metrics.total_keys, self.metrics.correct_keys,
+                self.metrics.total_kills)
     
-    def reset_game(self):
+    def close_stage(self, cleared: bool):
+        """現在のステージの結果を確定して次のステージの計測を始める"""
+        counters = self.stage_counters()
+        ticks, score, keys, correct_keys, kills = (now - start for now, start in zip(counters, self.stage_start))
+        self.stage_results.append(StageResult(self.stage_manager.get_current_stage().stage_id, cleared,
+                                              score, ticks, keys, correct_keys, kills))
+        self.stage_start = counters
+    
+    def finish_session(self):
+        """セッションを閉じてリプレイを保存し、結果をストアに送る"""
+        self.finish_replay()
+        if not self.session_active:
+            return
+        self.session_active = False
+        self.close_stage(False)
+        if self.weakness:
+            self.weakness.save()
+        if self.store:
+            metrics = self.metrics
+            self.store.save(SessionRecord(
+                started_at=self.session_started_at,
+                ended_at=time.time(),
+                japanese=self.japanese_mode,
+                seed=self.session_seed,
+                score=self.score,
+                hp=self.player_hp,
+                stage=self.stage_manager.get_current_stage().stage_id,
+                ticks=self.tick,
+                keys=metrics.total_keys,
+                correct_keys=metrics.correct_keys,
+                chars=metrics.total_chars,
+                kills=metrics.total_kills,
+                kill_ticks=metrics.total_kill_ticks,
+                best_burst=metrics.best_burst,
+                stages=self.stage_results,
+            ))
+    
+    def finish_replay(self):
+        """セッションの記録を閉じて保存"""
+        if self.recorder:
+            self.recorder.finish(self.tick, self.score, self.player_hp)
+            path = self.recorder.save()
+            if path:
+                print(f"Replay saved: {path}")
+            self.recorder = None
+    
+    def reset_game(self, seed: Optional[int] = None):
+        self.finish_session()
+        
+        # セッションのシードから乱数を作り直す（リプレイで同じ展開を再現できる）
+        if seed is None:
+            seed = self.seed_streams.random('sessions').getrandbits(63)
+        self.session_seed = seed
+        self.streams = RngStreams(seed)
+        for mode, sampler in self.word_samplers.items():
+            sampler.reset(self.streams.random(f'words.{mode}'))
+        self.tick = 0
+        if self.record_replays:
+            self.recorder = ReplayRecorder(self.session_seed, self.japanese_mode, self.corpus_crc())
+        for sampler in self.word_samplers.values():
+            sampler.set_focus({})
+        self.update_focus()
+        
         self.score = 0
         self.combo = 0
         self.player_hp = self.max_hp
         self.enemies = []
+        self.onscreen_leads.clear()
+        self.onscreen_keys.clear()
         self.current_target = None
         self.current_input = ""
+        self.key_queue.clear()
+        self.particles.clear()
+        self.prepare_glyphs()
         self.enemy_spawn_timer = 0
+        self.metrics.reset(self.tick)
         self.stage_manager = StageManager()
-        self.typing_handler = TypingInputHandler()
+        self.difficulty.reset(self.stage_manager.get_current_stage())
+        self.session_active = True
+        self.session_started_at = time.time()
+        self.stage_results = []
+        self.stage_start = self.stage_counters()
+        self.typing_handler.set_target_text("")
+        for label in self.labels.values():
+            label.clear()  # 言語の切り替えで見出しが変わる
         
         # BGMをリセット
         if self.sound_manager.enabled:
@@ -756,13 +1356,35 @@ class TypingGame:
         self.bgm_playing = False
     
     def handle_events(self):
+        """イベントを取り込む。画面の切り替えなどはすぐ処理し、打鍵は時刻付きでキューに積む"""
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
             
+            elif event.type == pygame.TEXTINPUT:
+                # メニュー操作のキー（リザルト画面のRなど）の文字は打鍵にしない
+                command_text, self.command_text = self.command_text, None
+                if self.state == GameState.GAME and event.text != command_text:
+                    timestamp = time.perf_counter()
+                    # IMEで確定した文字列は複数文字で届く
+                    for char in event.text:
+                        # Accept both alphabetic characters and Japanese characters
+                        if char.isalpha() or ord(char) > 127:  # Include Japanese characters
+                            self.key_queue.push(char, timestamp)
+            
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.profiler.toggle()
+            
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                if not self.memory.tracing:
+                    self.memory.start()
+                self.print_memory_report()
+            
             elif event.type == pygame.KEYDOWN:
+                # 直後に同じキーのTEXTINPUTが届く
+                self.command_text = event.unicode if self.state != GameState.GAME else None
                 if self.state == GameState.TITLE:
-                    if event.key == pygame.K_SPACE:
+                    if event.key == pygame.K_SPACE and not self.versus:
                         self.state = GameState.GAME
                         self.reset_game()
                     elif event.key == pygame.K_s:
@@ -778,26 +1400,22 @@ class TypingGame:
                 
                 elif self.state == GameState.GAME:
                     if event.key == pygame.K_ESCAPE:
+                        self.finish_session()
                         self.state = GameState.TITLE
                         # ゲーム終了時にBGMを停止
                         if self.sound_manager.enabled:
                             self.sound_manager.stop_sound('bgm')
                             self.bgm_playing = False
-                    elif event.unicode and len(event.unicode) == 1:
-                        # Accept both alphabetic characters and Japanese characters
-                        char = event.unicode
-                        if char.isalpha() or ord(char) > 127:  # Include Japanese characters
-                            print(f"Input detected: '{char}' (ord: {ord(char)})")  # Debug
-                            self.handle_typing_input(char)
                 
                 elif self.state == GameState.RESULT:
-                    if event.key == pygame.K_r:
+                    if event.key == pygame.K_r and not self.versus:
                         self.state = GameState.GAME
                         self.reset_game()
                     elif event.key == pygame.K_t:
                         self.state = GameState.TITLE
     
     def update(self):
+        profiler = self.profiler
         if self.state == GameState.GAME:
             # BGMを開始（1回だけ）
             if self.sound_manager.enabled and not self.bgm_playing:
@@ -810,26 +1428,46 @@ class TypingGame:
             
             # Update stage manager
             self.stage_manager.update(1.0 / FPS)
-            current_stage = self.stage_manager.get_current_stage()
+            if self.tick % DIFFICULTY_INTERVAL == 0:
+                self.update_difficulty()
+            settings = self.current_settings()
+            profiler.mark(Phase.UPDATE)
             
             # Spawn enemies
+            if self.stage_manager.needs_boss():
+                self.spawn_boss()
             self.enemy_spawn_timer += 1
-            if self.enemy_spawn_timer >= current_stage.enemy_spawn_delay:
-                if len(self.enemies) < current_stage.max_enemies:
+            if self.enemy_spawn_timer >= settings.enemy_spawn_delay:
+                # 対戦では画面上の敵の数によらず一定の間隔で出す（相手と同じ敵の列にするため）
+                if self.versus or len(self.enemies) < settings.max_enemies:
                     self.spawn_enemy()
                 self.enemy_spawn_timer = 0
+            profiler.mark(Phase.SPAWN)
             
             # Update enemies
             self.update_enemies()
+            profiler.mark(Phase.ENEMY_UPDATE)
+            self.particles.update()
+            profiler.mark(Phase.PARTICLES)
             
             # Check stage completion
-            if self.stage_manager.is_stage_complete(len(self.enemies)):
+            if self.stage_manager.is_stage_complete():
+                self.close_stage(True)
                 self.stage_manager.next_stage()
+                self.gc_policy.request_collection()
                 self.player_hp = min(self.max_hp, self.player_hp + 20)  # Bonus HP
+                if self.recorder:
+                    self.recorder.stage(self.tick, self.stage_manager.current_stage)
+                self.update_focus()
+            
+            self.tick += 1
             
             # Check game over
             if self.player_hp <= 0:
+                self.finish_session()
                 self.state = GameState.RESULT
+            profiler.mark(Phase.STAGE)
+        profiler.mark(Phase.UPDATE)
     
     def draw(self):
         if self.state == GameState.TITLE:
@@ -840,19 +1478,270 @@ class TypingGame:
             self.draw_result_screen()
         elif self.state == GameState.SETTINGS:
             self.draw_settings_screen()
+        self.profiler.mark(Phase.DRAW)
+        
+        self.profiler.draw(self.screen)
+        self.profiler.mark(Phase.OVERLAY)
         
         pygame.display.flip()
+        self.profiler.mark(Phase.FLIP)
+    
+    def memory_items(self) -> List[MemoryItem]:
+        """メモリレポートに載せるアセットとキャッシュ"""
+        items = graphics_items(self.graphics_manager) + font_items(self.font_manager)
+        items += sound_items(self.sound_manager)
+        items.append(MemoryItem('surfaces', 'screen', surface_bytes(self.screen)))
+        if self.profiler.panel is not None:
+            items.append(MemoryItem('caches', 'profiler panel', surface_bytes(self.profiler.panel)))
+        items.append(MemoryItem('caches', 'profiler history', self.profiler.history.nbytes))
+        items.append(MemoryItem('caches', 'glyph atlases', self.glyphs.nbytes(), len(self.glyphs.atlases)))
+        items.append(MemoryItem('caches', 'scratch surfaces', self.scratch.nbytes(),
+                                len(self.scratch.fills) + len(self.scratch.gradients)))
+        items.append(MemoryItem('caches', 'particle sprites', self.particles.sprite_bytes(), len(self.particles.sprites)))
+        items.append(MemoryItem('caches', 'particle arrays', self.particles.nbytes()))
+        scaled = self.graphics_manager.scaled.values()
+        items.append(MemoryItem('caches', 'scaled images', sum(map(surface_bytes, scaled)), len(scaled)))
+        for mode, sampler in self.word_samplers.items():
+            # mmapなのでページは必要なぶんだけ読まれ、メモリが足りなければ捨てられる
+            items.append(MemoryItem('corpus (mapped)', mode, len(sampler.corpus.data)))
+        return items
     
-    def run(self):
+    def print_memory_report(self):
+        print('\n'.join(self.memory.report(self.memory_items())), file=sys.stderr)
+    
+    def log_hitches(self, enabled: bool):
+        """予算を超えたフレームを標準エラーに出す（区間ごとの時間も測る）"""
+        self.hitches.log = enabled
+        self.profiler.recording = enabled
+    
+    def check_state_transition(self):
+        """状態が変わっていればメモリの差分を出す（トレース中のみ）"""
+        if self.state != self.last_state:
+            lines = self.memory.transition(self.last_state.name, self.state.name)
+            if lines:
+                print('\n'.join(lines), file=sys.stderr)
+            self.last_state = self.state
+            self.gc_policy.set_gameplay(self.state == GameState.GAME)
+    
+    def feed_keys(self, deadline: float):
+        """deadlineまでに打たれた文字を打った順にシミュレーションに渡す"""
+        for char in self.key_queue.pop_until(deadline):
+            if self.state != GameState.GAME:
+                break
+            self.handle_typing_input(char)
+    
+    def feed_bot(self, bot: BotTypist):
+        """ヘッドレス実行でボットの打鍵を入力する（ゲームオーバーになったらやり直す）"""
+        if self.state == GameState.GAME:
+            for key in bot.keys(self):
+                self.handle_typing_input(key)
+        elif self.state == GameState.RESULT and not self.versus:
+            self.state = GameState.GAME
+            self.reset_game()
+    
+    def poll_versus(self):
+        """対戦のメッセージを取り出して反映し、自分の成績を送る（どちらもネットワークを待たない）"""
+        versus = self.versus
+        for message in versus.poll():
+            kind = message['type']
+            if kind == 'start':
+                # 同じシードとステージの予定なら敵と単語の出方は相手と同じになる
+                if message['stages'] != stage_schedule(StageManager()):
+                    versus.error = "the server's stage schedule differs from this version"
+                    versus.started = False
+                    continue
+                self.japanese_mode = message['japanese']
+                self.state = GameState.GAME
+                self.reset_game(message['seed'])
+            elif kind == 'error':
+                print(f"[versus] {message['message']}", file=sys.stderr)
+        if versus.started:
+            versus.report(self.score, self.player_hp, self.metrics.total_kills,
+                          self.stage_manager.get_current_stage().stage_id, self.state != GameState.GAME)
+    
+    def versus_waiting(self) -> bool:
+        """対戦の開始か相手の終了を待っているところ（ヘッドレスではこの間はティックを進めない）"""
+        versus = self.versus
+        return bool(versus) and self.state != GameState.GAME and not versus.ended and versus.connected
+    
+    def run(self, capture: Optional[ProfileCapture] = None, bot: Optional[BotTypist] = None,
+            max_ticks: Optional[int] = None):
+        """メインループ。botがあればフレームを待たずに1フレーム1ティックで回す"""
+        ticks = 0
+        self.pacer.start()
+        self.hitches.start()
         while self.running:
+            self.profiler.begin_frame()
+            self.hitches.begin_frame()
+            if capture:
+                capture.begin_frame(self.state == GameState.GAME)
+            allocations = self.allocations if self.state == GameState.GAME else None
+            if allocations:
+                allocations.begin_frame()
             self.handle_events()
-            self.update()
+            if self.font_manager.swap_downloaded_font():
+                # 古いフォントのアトラスを捨て、描画の途中で焼かないようにここで焼き直す
+                self.glyphs.clear()
+                self.prepare_glyphs()
+            if self.versus:
+                self.poll_versus()
+            # 実時間に合わせて固定刻みでシミュレーションを進める（フレームレートが60でなくても速さは同じ）
+            steps = 1 if bot else self.pacer.step_count()
+            for step in range(steps):
+                if bot:
+                    self.feed_bot(bot)
+                else:
+                    self.feed_keys(self.pacer.tick_deadline(step, steps))
+                # イベントの取り込みと打鍵の処理はここまで（update の前に区切る）
+                self.profiler.mark(Phase.EVENTS)
+                self.update()
+            ticks += steps
+            self.check_state_transition()
             self.draw()
-            self.clock.tick(FPS)
+            if allocations:
+                allocations.end_frame()
+            # 区切りで頼まれた回収は、描画が終わってから待ちの前に走らせる
+            self.gc_policy.collect_pending()
+            work = self.hitches.end_frame(1 / self.pacer.target, self.profiler.frame if self.profiler.enabled else None)
+            if self.state == GameState.GAME:
+                self.particles.observe(work, 1 / self.pacer.target)
+            if self.versus:
+                # 対戦は全員が同じティック数で終わる。時間切れなら結果を待ち、決着したら（ボットは）抜ける
+                if max_ticks is not None and self.state == GameState.GAME and self.tick >= max_ticks:
+                    self.finish_session()
+                    self.state = GameState.RESULT
+                if bot and not self.versus_waiting() and self.state != GameState.GAME:
+                    self.running = False
+            elif max_ticks is not None and ticks >= max_ticks:
+                self.running = False
+            if capture:
+                capture.end_frame()
+                if capture.done:
+                    self.running = False
+            if not bot:
+                self.pacer.wait(self.clock, self.handle_events)
+            elif self.versus_waiting():
+                self.clock.tick(FPS)  # 待っている間はボットでも空回りしない
+            self.profiler.mark(Phase.IDLE)
+            self.profiler.end_frame()
         
+        self.hitches.close()
+        self.gc_policy.restore()
+        if self.allocations:
+            self.allocations.close()
+        self.finish_session()
+        if self.store:
+            self.store.close()
+        if self.versus:
+            self.versus.close()
+            print('\n'.join(self.versus.summary()), file=sys.stderr)
+        if capture:
+            capture.finish()
+        if not bot:
+            self.pacer.print_report()
+            self.particles.print_report()
+        if self.allocations:
+            print('\n'.join(self.allocations.report()), file=sys.stderr)
+        if self.hitches.log:
+            print('\n'.join(self.hitches.report() + self.gc_policy.report()), file=sys.stderr)
+        if self.memory.tracing:
+            self.print_memory_report()
         pygame.quit()
-        sys.exit()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Typing of the Dead style game")
+    parser.add_argument('--seed', type=int, help="fix the random seed")
+    parser.add_argument('--render-scale', type=float, default=1.0, metavar='FACTOR',
+                        help="draw at FACTOR times the 1200x800 layout (0.5 = 600x400, 0.75 = 900x600) "
+                             "and let SDL scale it up to the window")
+    parser.add_argument('--pacing', choices=[mode.value for mode in PacingMode], default=PacingMode.SLEEP.value,
+                        help="how to wait for the next frame; the frame time variance is printed on exit "
+                             "(default: %(default)s)")
+    parser.add_argument('--particles', choices=['auto'] + [quality.value for quality in ParticleQuality],
+                        default='auto',
+                        help="particle effect quality; auto lowers it while frames run over budget "
+                             "(default: %(default)s)")
+    parser.add_argument('--profile', type=float, metavar='SECONDS',
+                        help="profile this many seconds of frames, then quit")
+    parser.add_argument('--profile-out', type=Path, default=DEFAULT_PREFIX, metavar='PREFIX',
+                        help="write PREFIX.prof and PREFIX.folded (default: %(default)s)")
+    parser.add_argument('--gameplay-only', action='store_true',
+                        help="only count frames on the game screen (skip title and result screens)")
+    parser.add_argument('--headless', action='store_true',
+                        help="run without a window, played by a bot typist as fast as possible")
+    parser.add_argument('--bot-kpm', type=float, default=250, help="bot keystrokes per minute (--headless)")
+    parser.add_argument('--bot-accuracy', type=float, default=0.95, help="bot keystroke accuracy (--headless)")
+    parser.add_argument('--english', action='store_true', help="start in English mode (--headless)")
+    parser.add_argument('--seconds', type=float, help="quit after this many seconds of simulated time")
+    parser.add_argument('--memory-report', action='store_true',
+                        help="trace allocations from startup, print diffs at every screen change "
+                             "and a memory report on exit (F4 starts the same tracing in game)")
+    parser.add_argument('--alloc-debug', action='store_true',
+                        help="count surfaces created and memory blocks kept by every gameplay frame and warn "
+                             "when steady-state frames start allocating (exit status 1 on regression)")
+    parser.add_argument('--log-hitches', action='store_true',
+                        help="log every frame over budget with the GC generations collected in it, "
+                             "the allocation counts and the slowest phases")
+    parser.add_argument('--versus', metavar='HOST:PORT',
+                        help="join a versus match (start the server with: python versus.py serve)")
+    parser.add_argument('--name', default=os.environ.get('USER', 'player'), help="your name in a versus match")
+    args = parser.parse_args(argv)
+    if args.headless and not (args.profile or args.seconds):
+        parser.error("--headless needs --profile or --seconds (the bot would play forever)")
+    if args.alloc_debug and args.profile:
+        parser.error("--alloc-debug and --profile both install a profile hook; use one at a time")
+    
+    memory = MemoryTracker()
+    if args.memory_report:
+        memory.start()
+    allocations = AllocationCounter() if args.alloc_debug else None
+    if allocations:
+        allocations.start()
+    capture = ProfileCapture(args.profile, args.profile_out, args.gameplay_only) if args.profile else None
+    max_ticks = int(args.seconds * FPS) if args.seconds else None
+    particle_quality = None if args.particles == 'auto' else ParticleQuality(args.particles)
+    versus = VersusClient(*parse_address(args.versus), args.name) if args.versus else None
+    # 対戦では全員が同じ敵の列を打つので、プレイヤーごとの調整（苦手な文字・出現の強度）は切る
+    adaptive = versus is None
+    if not args.headless:
+        game = TypingGame(seed=args.seed, pacing=PacingMode(args.pacing), render_scale=args.render_scale,
+                          particle_quality=particle_quality, adaptive_words=adaptive, adaptive_difficulty=adaptive)
+        game.memory = memory
+        game.allocations = allocations
+        game.log_hitches(args.log_hitches)
+        if versus:
+            game.versus = versus
+            versus.start()
+        game.run(capture, max_ticks=max_ticks)
+        return 1 if allocations and allocations.regressed else 0
+    
+    # pygame.init() はインポート時に済んでいるので、ダミーのドライバで表示だけ初期化し直す
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    pygame.display.quit()
+    pygame.display.init()
+    seed = 0 if args.seed is None else args.seed
+    with contextlib.redirect_stdout(io.StringIO()):
+        # 記録を残すとプレイヤーの成績や苦手な文字が汚れるので保存しない（フォントのダウンロードもしない）
+        game = TypingGame(record_replays=False, seed=seed, save_sessions=False, adaptive_words=False,
+                          adaptive_difficulty=adaptive, render_scale=args.render_scale,
+                          particle_quality=particle_quality, download_font=False)
+        game.memory = memory
+        game.allocations = allocations
+        game.log_hitches(args.log_hitches)
+        game.japanese_mode = not args.english
+        if versus:
+            game.versus = versus
+            versus.start()
+        else:
+            game.state = GameState.GAME
+            game.reset_game()
+        game.run(capture, BotTypist(args.bot_kpm, args.bot_accuracy, FPS, seed), max_ticks)
+    if versus and not versus.ended:
+        return 1  # 対戦が決着しなかった（つながらない、途中で切れた）
+    return 1 if allocations and allocations.regressed else 0
+
 
 if __name__ == "__main__":
-    game = TypingGame()
-    game.run()
+    sys.exit(main())
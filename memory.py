@@ -0,0 +1,289 @@
+"""メモリ使用量のレポート（アセット・キャッシュの見積もりとtracemallocの差分）
+
+SurfaceのピクセルやSoundのPCMはSDLがCで確保するのでtracemallocには映らない。
+そこでアセットとキャッシュは大きさから計算した見積もりを MemoryItem で並べ、
+Python側の確保（NumPy配列を含む）はtracemallocのスナップショットで追う。
+
+スナップショットは GameState が変わるたびに取り、直前の状態からの差分と、
+前回同じ状態に入ったときからの差分を出す。後者はゲームを繰り返しても
+増え続けるもの（reset_game をまたぐリーク）を見つけるためのもの。
+
+AllocationCounter（--alloc-debug）はゲームプレイ中のフレームごとに作られた
+Surfaceと残ったブロック、GCの回数を数え、定常状態のフレームが確保する
+ようになったら（退行したら）警告する。
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+import weakref
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pygame
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_FRAMES = 4     # 確保元として記録するスタックの深さ
+TOP_SITES = 8        # 差分で表示する確保元の数
+ALLOC_WARMUP = 120   # 確保を数えない最初のゲームプレイフレーム（グリフや文字列のキャッシュが埋まるまで）
+ALLOC_WINDOW = 300   # 定常状態の確保を判定する間隔（フレーム）
+# 新しいSurfaceを返すpygameの関数とメソッド
+SURFACE_FACTORIES = frozenset({'render', 'scale', 'smoothscale', 'scale2x', 'rotate', 'rotozoom', 'flip',
+                               'copy', 'convert', 'convert_alpha', 'subsurface'})
+
+
+@dataclass
+class MemoryItem:
+    """レポートの1行（category ごとに合計する）"""
+    category: str
+    name: str
+    size: int       # バイト数
+    count: int = 1  # Surfaceの枚数など
+
+
+def surface_bytes(surface: pygame.Surface) -> int:
+    return surface.get_pitch() * surface.get_height()
+
+
+def sound_bytes(sound: pygame.mixer.Sound) -> int:
+    """ミキサーの形式に変換済みのPCMのバイト数"""
+    mixer = pygame.mixer.get_init()
+    if not mixer:
+        return 0
+    frequency, size, channels = mixer
+    return round(sound.get_length() * frequency) * channels * abs(size) // 8
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def surface_items(category: str, surfaces: Dict[str, pygame.Surface]) -> List[MemoryItem]:
+    return [MemoryItem(category, name, surface_bytes(surface)) for name, surface in surfaces.items()]
+
+
+def graphics_items(graphics_manager) -> List[MemoryItem]:
+    items = surface_items('surfaces', graphics_manager.images)
+    for name, frames in graphics_manager.animations.items():
+        items.append(MemoryItem('surfaces', f"animation:{name}", sum(map(surface_bytes, frames)), len(frames)))
+    return items
+
+
+def font_items(font_manager) -> List[MemoryItem]:
+    """フォントはSDL_ttfの内部なので大きさは測れない。元のファイルの大きさを上限の目安にする"""
+    default_font = os.path.join(os.path.dirname(pygame.__file__), pygame.font.get_default_font())
+    japanese = [key for key in font_manager.fonts if key.startswith('japanese_')]
+    sources = {default_font: len(font_manager.fonts)}
+    if font_manager.font_file:
+        sources = {font_manager.font_file: len(japanese), default_font: len(font_manager.fonts) - len(japanese)}
+    return [MemoryItem('fonts', os.path.basename(path), os.path.getsize(path), count)
+            for path, count in sources.items() if os.path.exists(path)]
+
+
+def sound_items(sound_manager) -> List[MemoryItem]:
+    items = []
+    for name, variants in sound_manager.variants.items():
+        # 音量違いのバリエーションもPCMのコピーを持っている
+        items.append(MemoryItem('audio', name, sum(map(sound_bytes, variants)), len(variants)))
+    return items
+
+
+def process_peak_rss() -> Optional[int]:
+    """プロセスの最大常駐メモリ（取得できなければNone）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemoryTracker:
+    """tracemallocのスナップショットを状態遷移ごとに取って差分を出す"""
+
+    def __init__(self, frames: int = TRACE_FRAMES, top: int = TOP_SITES):
+        self.frames = frames
+        self.top = top
+        self.last: Optional[tracemalloc.Snapshot] = None
+        self.by_state: Dict[str, tracemalloc.Snapshot] = {}
+        self.entries: Dict[str, int] = defaultdict(int)
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not self.tracing:
+            tracemalloc.start(self.frames)
+        self.last = self.take()
+
+    def take(self) -> tracemalloc.Snapshot:
+        # tracemalloc自身やこのモジュールの確保は差分に混ぜない
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+
+    def diff_lines(self, snapshot: tracemalloc.Snapshot, base: tracemalloc.Snapshot) -> List[str]:
+        stats = snapshot.compare_to(base, 'traceback')
+        total = sum(stat.size_diff for stat in stats)
+        lines = [f"  {format_bytes(total):>10} total"]
+        for stat in stats[:self.top]:
+            if not stat.size_diff:
+                break
+            frame = stat.traceback[-1]  # 確保した箇所（一番内側のフレーム）
+            lines.append(f"  {format_bytes(stat.size_diff):>10} {stat.count_diff:+6d} blocks  "
+                         f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        return lines
+
+    def transition(self, old: str, new: str) -> List[str]:
+        """状態がoldからnewに変わった。差分のレポートを返す（トレースしていなければ空）"""
+        if not self.tracing:
+            return []
+        snapshot = self.take()
+        self.entries[new] += 1
+        lines = [f"[memory] {old} -> {new} (#{self.entries[new]})"]
+        if self.last is not None:
+            lines.append(f" since {old}:")
+            lines += self.diff_lines(snapshot, self.last)
+        previous = self.by_state.get(new)
+        if previous is not None:
+            # 同じ状態どうしの差分が増え続けるならリーク
+            lines.append(f" since last {new}:")
+            lines += self.diff_lines(snapshot, previous)
+        self.last = self.by_state[new] = snapshot
+        return lines
+
+    def report(self, items: Iterable[MemoryItem]) -> List[str]:
+        """アセット・キャッシュの見積もりとPython側の確保量"""
+        totals: Dict[str, int] = defaultdict(int)
+        grouped: Dict[str, List[MemoryItem]] = defaultdict(list)
+        for item in items:
+            totals[item.category] += item.size
+            grouped[item.category].append(item)
+
+        lines = ["[memory] report"]
+        for category in sorted(grouped, key=totals.get, reverse=True):
+            lines.append(f" {category:<28} {format_bytes(totals[category]):>10}")
+            for item in sorted(grouped[category], key=lambda item: item.size, reverse=True):
+                count = f" x{item.count}" if item.count != 1 else ""
+                lines.append(f"   {item.name + count:<26} {format_bytes(item.size):>10}")
+        lines.append(f" {'estimated assets':<28} {format_bytes(sum(totals.values())):>10}")
+
+        if self.tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f" {'python heap (traced)':<28} {format_bytes(current):>10}  peak {format_bytes(peak)}")
+        else:
+            lines.append(" python heap: not traced")
+        rss = process_peak_rss()
+        if rss is not None:
+            lines.append(f" {'process peak RSS':<28} {format_bytes(rss):>10}")
+        return lines
+
+
+
+class AllocationCounter:
+    """ゲームプレイ中のフレームごとの確保を数える（--alloc-debug）
+
+    Surfaceのピクセルはtracemallocに映らず、すぐ捨てた一時オブジェクトは前後の差にも
+    出ないので、フレームの間だけ sys.setprofile でCの呼び出しを見て数える。
+      surfaces     SURFACE_FACTORIES の呼び出しと、初めて見るSurfaceのメソッド呼び出し
+                   （pygame.Surface(...) で作って fill や set_alpha をしたもの）の数。
+                   renderで作ったSurfaceのメソッドを呼ぶと2回数えるので目安
+      blocks       フレームの前後のメモリブロック数の差（残った確保）
+      collections  フレーム中に走ったGC（gc.callbacks）
+    打鍵や敵の出現があるフレームは確保して当然なので、窓の中の中央値で定常状態の
+    フレームを判定し、Surfaceを作るか確保が残るようになっていたら退行として警告する。
+    """
+
+    def __init__(self, warmup: int = ALLOC_WARMUP, window: int = ALLOC_WINDOW):
+        self.warmup = warmup
+        # 直近の窓の (surfaces, blocks, collections)
+        self.samples = np.zeros((window, 3), dtype=np.int64)
+        self.totals = np.zeros(3, dtype=np.int64)
+        self.frames = 0            # ウォームアップを除いて数えたフレーム
+        self.seen = 0
+        self.regressions = 0       # 中央値で確保していた窓
+        self.known: weakref.WeakSet = weakref.WeakSet()  # 前のフレームまでに見たSurface
+        self.surfaces = 0
+        self.collections = 0
+        self.start_blocks = 0
+        self.active = False
+
+    def start(self):
+        if self.on_gc not in gc.callbacks:
+            gc.callbacks.append(self.on_gc)
+
+    def close(self):
+        if self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+
+    def on_gc(self, phase: str, info: dict):
+        if self.active and phase == 'start':
+            self.collections += 1
+
+    def on_call(self, frame, event: str, arg):
+        if event != 'c_call':
+            return
+        receiver = getattr(arg, '__self__', None)
+        if arg.__name__ in SURFACE_FACTORIES and (receiver is pygame.transform or
+                                                  isinstance(receiver, (pygame.font.Font, pygame.Surface))):
+            self.surfaces += 1
+        if isinstance(receiver, pygame.Surface) and receiver not in self.known:
+            self.known.add(receiver)
+            self.surfaces += 1
+
+    def begin_frame(self):
+        self.seen += 1
+        self.surfaces = self.collections = 0
+        self.active = True
+        self.start_blocks = sys.getallocatedblocks()
+        sys.setprofile(self.on_call)
+
+    def end_frame(self):
+        if not self.active:
+            return
+        sys.setprofile(None)
+        blocks = sys.getallocatedblocks() - self.start_blocks
+        self.active = False
+        if self.seen <= self.warmup:
+            return
+        index = self.frames % len(self.samples)
+        self.samples[index] = (self.surfaces, blocks, self.collections)
+        self.totals += self.samples[index]
+        self.frames += 1
+        if index == len(self.samples) - 1:
+            surfaces, blocks, _ = np.median(self.samples, axis=0)
+            if surfaces > 0 or blocks > 0:
+                self.regressions += 1
+                print(f"[alloc] steady-state frames allocate: {surfaces:.0f} surfaces, {blocks:+.0f} blocks "
+                      f"(median of the last {len(self.samples)} frames)", file=sys.stderr)
+
+    @property
+    def regressed(self) -> bool:
+        return self.regressions > 0
+
+    def report(self) -> List[str]:
+        if not self.frames:
+            return ["[alloc] no gameplay frames measured"]
+        recent = self.samples[:min(self.frames, len(self.samples))]
+        surfaces, blocks, collections = self.totals
+        allocating = int((recent[:, 0] > 0).sum())
+        return [
+            f"[alloc] {self.frames} gameplay frames after {self.warmup} warm-up frames",
+            f"  total  surfaces {surfaces}  blocks {blocks:+d}  gc collections {collections}",
+            f"  last {len(recent)}  frames creating surfaces {allocating}  "
+            f"p50 surfaces {np.median(recent[:, 0]):.0f}  blocks {np.median(recent[:, 1]):+.0f}  "
+            f"max surfaces {recent[:, 0].max()}  blocks {recent[:, 1].max():+d}",
+            f"  {'REGRESSION' if self.regressed else 'ok'}: "
+            f"{self.regressions} window(s) where a typical frame allocated",
+        ]
@@ -0,0 +1,146 @@
+from array import array
+from dataclasses import dataclass
+
+
+class EventWindow:
+    """直近window_ticksのイベントを保持する固定長リングバッファ
+
+    イベントは (ティック, 値) で、窓内の件数と値の合計を逐次更新する。
+    古いイベントは追加時にまとめて捨てるので1イベントあたり償却O(1)、
+    容量を超えた分は最も古いものから上書きする。
+    """
+
+    def __init__(self, window_ticks: int, capacity: int):
+        self.window_ticks = window_ticks
+        self.capacity = capacity
+        self.ticks = array('q', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+        self.total = 0.0
+
+    def clear(self):
+        self.start = self.count = 0
+        self.total = 0.0
+
+    def _pop(self):
+        self.total -= self.values[self.start]
+        self.start = (self.start + 1) % self.capacity
+        self.count -= 1
+
+    def expire(self, now: int):
+        """窓の外に出たイベントを捨てる"""
+        limit = now - self.window_ticks
+        while self.count and self.ticks[self.start] <= limit:
+            self._pop()
+
+    def add(self, tick: int, value: float = 1.0):
+        self.expire(tick)
+        if self.count == self.capacity:
+            self._pop()
+        end = (self.start + self.count) % self.capacity
+        self.ticks[end] = tick
+        self.values[end] = value
+        self.count += 1
+        self.total += value
+
+
+@dataclass
+class MetricsSnapshot:
+    """HUD・リザルト画面に表示する値"""
+    kpm: float = 0.0        # 1分あたりの打鍵数
+    cpm: float = 0.0        # 1分あたりの正しく入力できた文字数
+    wpm: float = 0.0        # cpm / 5
+    accuracy: float = 1.0   # 正しい打鍵 / 全打鍵
+    ttk: float = 0.0        # 狙ってから倒すまでの平均秒数
+    burst: float = 0.0      # 短い窓で測った最高KPM
+    breach_rate: float = 0.0  # 1分あたりに敵に突破された回数
+
+
+class TypingMetrics:
+    """打鍵ごとにO(1)で更新するタイピング統計
+
+    時刻はシミュレーションのティックで数えるので、リプレイでも同じ値になる。
+    直近window秒のローリング値（HUD用）と、セッション全体の累計（リザルト用）を持つ。
+    """
+
+    CHARS_PER_WORD = 5
+
+    def __init__(self, ticks_per_second: int, window: float = 30.0, burst_window: float = 2.0,
+                 ttk_samples: int = 32, capacity: int = 2048):
+        self.ticks_per_second = ticks_per_second
+        self.keys = EventWindow(int(window * ticks_per_second), capacity)  # 値は正解なら1
+        self.chars = EventWindow(int(window * ticks_per_second), capacity)
+        self.burst_keys = EventWindow(int(burst_window * ticks_per_second), capacity)
+        self.kills = EventWindow(int(window * ticks_per_second), ttk_samples)  # 値は撃破までのティック
+        self.breaches = EventWindow(int(window * ticks_per_second), capacity)
+        self.reset(0)
+
+    def reset(self, tick: int = 0):
+        for window in (self.keys, self.chars, self.burst_keys, self.kills, self.breaches):
+            window.clear()
+        self.start_tick = tick
+        self.total_keys = 0
+        self.correct_keys = 0
+        self.total_chars = 0
+        self.total_kills = 0
+        self.total_kill_ticks = 0
+        self.total_breaches = 0
+        self.best_burst = 0.0
+
+    def record_key(self, tick: int, correct: bool):
+        self.total_keys += 1
+        self.correct_keys += correct
+        self.keys.add(tick, 1.0 if correct else 0.0)
+        self.burst_keys.add(tick)
+        # 窓の長さに満たないうちは外挿しない（出だしの1打で値が跳ねないように）
+        burst = self.burst_keys.count * 60 * self.ticks_per_second / self.burst_keys.window_ticks
+        if burst > self.best_burst:
+            self.best_burst = burst
+
+    def record_char(self, tick: int):
+        self.total_chars += 1
+        self.chars.add(tick)
+
+    def record_kill(self, tick: int, ticks_to_kill: int):
+        self.total_kills += 1
+        self.total_kill_ticks += ticks_to_kill
+        self.kills.add(tick, ticks_to_kill)
+
+    def record_breach(self, tick: int):
+        self.total_breaches += 1
+        self.breaches.add(tick)
+
+    def _minutes(self, now: int, window_ticks: int) -> float:
+        elapsed = min(now - self.start_tick, window_ticks)
+        return max(elapsed, self.ticks_per_second) / self.ticks_per_second / 60
+
+    def rolling(self, now: int) -> MetricsSnapshot:
+        """直近の窓での値（HUD用）"""
+        for window in (self.keys, self.chars, self.kills, self.breaches):
+            window.expire(now)
+        minutes = self._minutes(now, self.keys.window_ticks)
+        cpm = self.chars.count / minutes
+        return MetricsSnapshot(
+            kpm=self.keys.count / minutes,
+            cpm=cpm,
+            wpm=cpm / self.CHARS_PER_WORD,
+            accuracy=self.keys.total / self.keys.count if self.keys.count else 1.0,
+            ttk=self.kills.total / self.kills.count / self.ticks_per_second if self.kills.count else 0.0,
+            burst=self.best_burst,
+            breach_rate=self.breaches.count / minutes,
+        )
+
+    def summary(self, now: int) -> MetricsSnapshot:
+        """セッション全体の値（リザルト画面用）"""
+        minutes = self._minutes(now, now - self.start_tick)
+        cpm = self.total_chars / minutes
+        return MetricsSnapshot(
+            kpm=self.total_keys / minutes,
+            cpm=cpm,
+            wpm=cpm / self.CHARS_PER_WORD,
+            accuracy=self.correct_keys / self.total_keys if self.total_keys else 1.0,
+            ttk=self.total_kill_ticks / self.total_kills / self.ticks_per_second if self.total_kills else 0.0,
+            burst=self.best_burst,
+            breach_rate=self.total_breaches / minutes,
+        )
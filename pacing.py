@@ -0,0 +1,146 @@
+"""フレームの待ち方（ペーシング）とフレーム時間のばらつきの計測
+
+    sleep     clock.tick(FPS)。OSのスリープ精度（数ms）でぶれる
+    busy      clock.tick_busy_loop(FPS)。最後はビジーループで待つので正確だがCPUを使う
+    vsync     set_modeでvsyncを要求し、flipで垂直同期を待つ
+    adaptive  処理が予算に収まらなくなったら目標を 60→30→20fps に下げ、余裕が戻れば上げる
+    uncapped  待たない（ベンチマーク用）
+
+シミュレーションは1ティック=1/FPS秒の固定刻みのままなので、実際に経った時間から
+1フレームで進めるティック数を step_count で決める。誤差は次のフレームに持ち越し、
+四捨五入で決めるので、60Hz付近で多少ぶれても毎フレーム1ティックずつ進む。
+"""
+
+import sys
+from enum import Enum
+from time import perf_counter
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import pygame
+
+ADAPTIVE_RATES = (60, 30, 20)  # 60fpsの整数分の1だけにして、毎フレーム同じティック数で進める
+ADAPTIVE_WINDOW = 30           # 目標を見直す間隔（フレーム）
+DOWNGRADE_LOAD = 0.9           # 処理時間がこの割合の予算を超えたら目標を下げる
+UPGRADE_LOAD = 0.6             # 1つ上の目標の予算に対してこの割合未満なら上げる
+MAX_CATCHUP = 4                # 1フレームで進めるティック数の上限（ウィンドウ移動などの長い停止は捨てる）
+
+
+class PacingMode(Enum):
+    SLEEP = 'sleep'
+    BUSY = 'busy'
+    VSYNC = 'vsync'
+    ADAPTIVE = 'adaptive'
+    UNCAPPED = 'uncapped'
+
+
+class FramePacer:
+    """フレームの待ちと、実際のフレーム間隔の統計"""
+
+    def __init__(self, mode: PacingMode, fps: int, history: int = 600):
+        self.mode = mode
+        self.fps = fps
+        self.target = fps
+        self.vsync = mode == PacingMode.VSYNC
+        self.intervals = np.zeros(history)  # 直近のフレーム間隔（秒）
+        self.frames = 0
+        self.works: List[float] = []        # adaptive用: 直近の待ち以外の処理時間
+        self.frame_start = self.last = perf_counter()
+        self.accumulator = 0.0
+        # 全体のばらつき（Welford法）
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.worst = 0.0
+
+    def set_mode(self, size: Tuple[int, int], flags: int = 0) -> pygame.Surface:
+        """画面を作る。vsyncが使えなければ busy にフォールバックする"""
+        if self.vsync:
+            try:
+                # pygame 2 では vsync は SCALED か OPENGL と一緒でないと効かない
+                return pygame.display.set_mode(size, flags | pygame.SCALED, vsync=1)
+            except pygame.error as e:
+                print(f"VSync unavailable ({e}), falling back to busy-loop pacing")
+                self.mode = PacingMode.BUSY
+                self.vsync = False
+        return pygame.display.set_mode(size, flags)
+
+    def start(self):
+        """ループの開始時に呼ぶ（初期化にかかった時間を数えない）"""
+        self.frame_start = self.last = perf_counter()
+        self.accumulator = 0.0
+
+    def step_count(self) -> int:
+        """前回のフレームから経った時間ぶん、シミュレーションを何ティック進めるか"""
+        now = perf_counter()
+        self.accumulator += (now - self.frame_start) * self.fps
+        self.frame_start = now
+        steps = min(int(self.accumulator + 0.5), MAX_CATCHUP)
+        self.accumulator = max(-0.5, min(self.accumulator - steps, 0.5))
+        return steps
+
+    def tick_deadline(self, step: int, steps: int) -> float:
+        """このフレームで進めるsteps個のティックのうちstep番目が受け持つ時刻の終わり"""
+        return self.frame_start - (steps - 1 - step) / self.fps
+
+    def wait(self, clock: pygame.time.Clock, poll: Optional[Callable[[], None]] = None):
+        """フレームの終わりの待ち。pollを渡すとビジーループ中もイベントを取り込む"""
+        work = perf_counter() - self.frame_start
+        if self.mode == PacingMode.SLEEP:
+            clock.tick(self.target)
+        elif self.mode in (PacingMode.BUSY, PacingMode.ADAPTIVE):
+            if poll:
+                # どうせ回して待つので、その間にイベントを拾って打鍵の時刻を正確にする
+                deadline = self.last + 1 / self.target
+                while perf_counter() < deadline:
+                    poll()
+                clock.tick()
+            else:
+                clock.tick_busy_loop(self.target)
+        else:
+            # vsyncはflipの中で待っている。uncappedは待たない
+            clock.tick()
+        if self.mode == PacingMode.ADAPTIVE:
+            self.adapt(work)
+
+        now = perf_counter()
+        interval = now - self.last
+        self.last = now
+        self.intervals[self.frames % len(self.intervals)] = interval
+        self.frames += 1
+        self.count += 1
+        delta = interval - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (interval - self.mean)
+        self.worst = max(self.worst, interval)
+
+    def adapt(self, work: float):
+        self.works.append(work)
+        if len(self.works) < ADAPTIVE_WINDOW:
+            return
+        # 外れ値1つで下げないように、窓の中の9割の点で判断する
+        load = float(np.percentile(self.works, 90))
+        self.works.clear()
+        index = ADAPTIVE_RATES.index(self.target)
+        if load > DOWNGRADE_LOAD / self.target and index + 1 < len(ADAPTIVE_RATES):
+            self.target = ADAPTIVE_RATES[index + 1]
+        elif index > 0 and load < UPGRADE_LOAD / ADAPTIVE_RATES[index - 1]:
+            self.target = ADAPTIVE_RATES[index - 1]
+
+    def report(self) -> List[str]:
+        """達成したフレーム時間のばらつき"""
+        if self.count < 2:
+            return [f"[pacing] {self.mode.value}: not enough frames"]
+        recent = self.intervals[:min(self.frames, len(self.intervals))] * 1000
+        budget = 1000 / self.target
+        std = (self.m2 / (self.count - 1)) ** 0.5 * 1000
+        return [
+            f"[pacing] {self.mode.value}: {self.count} frames, target {self.target} fps",
+            f"  frame time  mean {self.mean * 1000:.2f}ms  stddev {std:.3f}ms  "
+            f"variance {std * std:.3f}ms^2  worst {self.worst * 1000:.2f}ms",
+            f"  last {len(recent)}  p50 {np.percentile(recent, 50):.2f}ms  p99 {np.percentile(recent, 99):.2f}ms  "
+            f"late (>1.5x budget) {int((recent > budget * 1.5).sum())}",
+        ]
+
+    def print_report(self):
+        print('\n'.join(self.report()), file=sys.stderr)
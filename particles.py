@@ -0,0 +1,237 @@
+"""撃破・打鍵・突破のときに飛び散る粒（パーティクル）
+
+粒ごとにPythonのオブジェクトを作ると数百個でフレームの予算を使い切るので、
+位置・速度・寿命は容量固定のNumPy配列に持ち、生きている粒を先頭に詰めておく。
+1ティックの更新は配列の演算でまとめて行い、描画は前もって焼いたスプライトを
+Surface.blits で並べる（加算合成なので重なったところが明るくなる）。
+
+出す粒の数は品質（ParticleQuality）に比例させる。auto ではフレームの処理時間の
+余裕を見て、予算に収まらなくなったら品質を下げ、余裕が戻れば上げる。
+
+粒は見た目だけでシミュレーションには影響しないので、乱数はリプレイの
+ストリームとは別に持つ。
+"""
+
+import math
+import sys
+from itertools import islice
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pygame
+
+MAX_PARTICLES = 2048   # 同時に出せる粒の数（超えたぶんは出さない）
+FADE_STEPS = 8         # 寿命に合わせて暗く小さくするスプライトの段階
+DRAG = 0.94            # 1ティックごとに速度に掛ける減衰
+QUALITY_WINDOW = 30    # 品質を見直す間隔（フレーム）
+DOWNGRADE_LOAD = 0.8   # 処理時間がこの割合の予算を超えたら品質を下げる
+UPGRADE_LOAD = 0.5     # この割合未満なら品質を上げる
+
+Color = Tuple[int, int, int]
+
+
+class ParticleQuality(Enum):
+    OFF = 'off'
+    LOW = 'low'
+    MEDIUM = 'medium'
+    HIGH = 'high'
+
+
+# 品質ごとに出す粒の数の倍率（低い順）
+QUALITY_SCALES: Dict[ParticleQuality, float] = {
+    ParticleQuality.OFF: 0.0,
+    ParticleQuality.LOW: 0.25,
+    ParticleQuality.MEDIUM: 0.5,
+    ParticleQuality.HIGH: 1.0,
+}
+QUALITY_TIERS = list(QUALITY_SCALES)
+
+
+@dataclass(frozen=True)
+class Effect:
+    """1回に飛ばす粒の出し方（長さは論理座標、時間はティック）"""
+    count: int                 # HIGHで出す粒の数
+    speed: float               # 初速の上限（px/ティック）
+    life: int                  # 寿命の上限
+    radius: int                # 出たときの半径
+    gravity: float = 0.0       # 下向きの加速度（px/ティック^2）
+    angle: float = 0.0         # 飛ぶ向きの中心（ラジアン。下向きが正）
+    spread: float = 2 * math.pi
+
+
+HIT = Effect(6, 3.0, 12, 2)
+KILL = Effect(48, 6.0, 40, 3, gravity=0.15)
+BREACH = Effect(40, 7.0, 36, 4, gravity=0.25, angle=-math.pi / 2, spread=math.pi * 0.8)
+
+
+class ParticleSystem:
+    """容量固定の配列に持った粒の更新と描画"""
+
+    def __init__(self, scale: float = 1.0, seed: int = 0, quality: ParticleQuality = ParticleQuality.HIGH,
+                 adaptive: bool = False, capacity: int = MAX_PARTICLES):
+        self.scale = scale
+        self.rng = np.random.default_rng(seed)
+        self.quality = quality
+        self.adaptive = adaptive
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)
+        self.gravity = np.zeros(capacity, dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.int32)
+        self.max_life = np.ones(capacity, dtype=np.int32)
+        self.kind = np.zeros(capacity, dtype=np.int32)
+        self.count = 0              # 生きている粒（配列の先頭から）
+        # draw の途中の値の置き場と、blits に渡す [スプライト, [x, y], None, 合成] の列（毎フレーム使い回す）
+        self.sprite_index = np.zeros(capacity, dtype=np.int32)
+        self.fade = np.zeros(capacity, dtype=np.int32)
+        self.corner_offsets = np.zeros(capacity, dtype=np.int32)
+        self.scaled = np.zeros((capacity, 2), dtype=np.float32)
+        self.corners = np.zeros((capacity, 2), dtype=np.int32)
+        self.batch: List[list] = []
+        # (色, 半径) → 種類。種類ごとにFADE_STEPS枚のスプライトを並べる
+        self.kinds: Dict[Tuple[Color, int], int] = {}
+        self.sprites: List[pygame.Surface] = []
+        self.offsets = np.zeros(0, dtype=np.int32)  # スプライトの中心から左上までの距離
+        self.works = np.zeros(QUALITY_WINDOW)
+        self.frames = 0
+        self.emitted = 0
+        self.dropped = 0            # 容量が足りずに出さなかった粒
+        self.changes = 0            # autoで品質を変えた回数
+
+    @property
+    def capacity(self) -> int:
+        return len(self.life)
+
+    def sprite_kind(self, color: Color, radius: int) -> int:
+        kind = self.kinds.get((color, radius))
+        if kind is None:
+            kind = self.kinds[(color, radius)] = len(self.kinds)
+            offsets = []
+            for step in range(FADE_STEPS):
+                # 寿命が残り少ないほど暗く小さくする（加算合成なので暗い＝薄い）
+                brightness = (step + 1) / FADE_STEPS
+                size = max(1, round(radius * self.scale * (0.5 + 0.5 * brightness)))
+                sprite = pygame.Surface((size * 2 + 1, size * 2 + 1))
+                shade = tuple(round(channel * brightness) for channel in color)
+                pygame.draw.circle(sprite, shade, (size, size), size)
+                self.sprites.append(sprite)
+                offsets.append(size)
+            self.offsets = np.concatenate([self.offsets, np.array(offsets, dtype=np.int32)])
+        return kind
+
+    def prepare(self, kinds: Iterable[Tuple[Color, Effect]]):
+        """使う色と出し方のスプライトを先に焼いておく"""
+        for color, effect in kinds:
+            self.sprite_kind(color, effect.radius)
+
+    def emit(self, x: float, y: float, effect: Effect, color: Color):
+        """(x, y) から effect の粒を出す"""
+        wanted = round(effect.count * QUALITY_SCALES[self.quality])
+        n = min(wanted, self.capacity - self.count)
+        self.dropped += wanted - n
+        if n <= 0:
+            return
+        new = slice(self.count, self.count + n)
+        rng = self.rng
+        angle = rng.uniform(effect.angle - effect.spread / 2, effect.angle + effect.spread / 2, n)
+        speed = rng.uniform(effect.speed * 0.3, effect.speed, n)
+        self.pos[new] = (x, y)
+        self.vel[new, 0] = np.cos(angle) * speed
+        self.vel[new, 1] = np.sin(angle) * speed
+        life = rng.integers(effect.life // 2, effect.life, n, endpoint=True)
+        self.life[new] = life
+        self.max_life[new] = life
+        self.gravity[new] = effect.gravity
+        self.kind[new] = self.sprite_kind(color, effect.radius)
+        self.count += n
+        self.emitted += n
+
+    def update(self):
+        """1ティック進める"""
+        n = self.count
+        if not n:
+            return
+        vel = self.vel[:n]
+        vel[:, 1] += self.gravity[:n]
+        vel *= DRAG
+        self.pos[:n] += vel
+        life = self.life[:n]
+        life -= 1
+        if life.min() > 0:
+            return
+        # 寿命の尽きた粒を抜いて、生きている粒を先頭に詰め直す
+        alive = np.flatnonzero(life > 0)
+        m = len(alive)
+        for array in (self.pos, self.vel, self.gravity, self.life, self.max_life, self.kind):
+            array[:m] = array[alive]
+        self.count = m
+
+    def draw(self, surface: pygame.Surface):
+        n = self.count
+        if not n:
+            return
+        # 配列の演算は用意した配列に書き込んで、フレームごとに一時配列を作らない
+        step = self.fade[:n]
+        np.multiply(self.life[:n], FADE_STEPS, out=step)
+        np.floor_divide(step, self.max_life[:n], out=step)
+        np.minimum(step, FADE_STEPS - 1, out=step)
+        index = self.sprite_index[:n]
+        np.multiply(self.kind[:n], FADE_STEPS, out=index)
+        index += step
+        offsets = self.corner_offsets[:n]
+        np.take(self.offsets, index, out=offsets)
+        scaled = self.scaled[:n]
+        np.multiply(self.pos[:n], self.scale, out=scaled)
+        corners = self.corners[:n]
+        np.copyto(corners, scaled, casting='unsafe')
+        corners[:, 0] -= offsets
+        corners[:, 1] -= offsets
+        batch = self.batch
+        while len(batch) < n:
+            batch.append([None, [0, 0], None, pygame.BLEND_RGB_ADD])  # blitsでは合成の指定は1つずつ渡す
+        sprites = self.sprites
+        for i in range(n):
+            item = batch[i]
+            item[0] = sprites[index.item(i)]
+            dest = item[1]
+            dest[0] = corners.item(i, 0)
+            dest[1] = corners.item(i, 1)
+        surface.blits(islice(batch, n), False)
+
+    def clear(self):
+        self.count = 0
+
+    def observe(self, work: float, budget: float):
+        """フレームの処理時間（待ちを除く秒）を渡す。autoならQUALITY_WINDOWごとに品質を見直す"""
+        if not self.adaptive:
+            return
+        self.works[self.frames % len(self.works)] = work
+        self.frames += 1
+        if self.frames % len(self.works):
+            return
+        # 外れ値1つで下げないように、窓の中の9割の点で判断する
+        load = float(np.percentile(self.works, 90)) / budget
+        index = QUALITY_TIERS.index(self.quality)
+        if load > DOWNGRADE_LOAD and index > 1:
+            # 自動ではOFFまでは下げない（撃破の手応えがなくなるので）
+            self.quality = QUALITY_TIERS[index - 1]
+            self.changes += 1
+        elif load < UPGRADE_LOAD and index + 1 < len(QUALITY_TIERS):
+            self.quality = QUALITY_TIERS[index + 1]
+            self.changes += 1
+
+    def nbytes(self) -> int:
+        arrays = (self.pos, self.vel, self.gravity, self.life, self.max_life, self.kind)
+        return sum(array.nbytes for array in arrays)
+
+    def sprite_bytes(self) -> int:
+        return sum(sprite.get_pitch() * sprite.get_height() for sprite in self.sprites)
+
+    def report(self) -> List[str]:
+        mode = "auto" if self.adaptive else "fixed"
+        return [f"[particles] quality {self.quality.value} ({mode}, {self.changes} changes), "
+                f"{self.emitted} emitted, {self.dropped} dropped at capacity {self.capacity}"]
+
+    def print_report(self):
+        print('\n'.join(self.report()), file=sys.stderr)
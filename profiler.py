@@ -0,0 +1,143 @@
+import pygame
+import numpy as np
+from enum import IntEnum
+from time import perf_counter
+from typing import List, Optional
+
+
+class Phase(IntEnum):
+    """1フレームの区間。markした時点までの時間がその区間に加算される"""
+    EVENTS = 0
+    UPDATE = 1
+    SPAWN = 2
+    ENEMY_UPDATE = 3
+    STAGE = 4
+    BACKGROUND = 5
+    ENEMIES = 6
+    TEXTBOXES = 7
+    TEXT = 8
+    PARTICLES = 9   # 粒の更新と描画
+    HUD = 10
+    STAGE_INFO = 11
+    DRAW = 12       # ゲーム画面以外の描画
+    OVERLAY = 13    # このオーバーレイ自身の描画
+    FLIP = 14
+    IDLE = 15       # clock.tick での待ち時間
+
+
+PHASE_COLORS = [
+    (120, 120, 255), (255, 200, 80), (255, 150, 60), (255, 110, 40),
+    (220, 80, 30), (80, 200, 120), (60, 170, 220), (150, 110, 230),
+    (230, 90, 200), (255, 130, 170), (240, 240, 120), (200, 200, 200),
+    (120, 220, 220), (110, 110, 110), (255, 70, 70), (60, 60, 60),
+]
+
+FRAME_BUDGET_MS = 1000 / 60
+HISTOGRAM_BINS = 34  # 1msごと、最後のビンは33ms以上
+REDRAW_INTERVAL = 15  # オーバーレイを描き直す間隔（フレーム）。それ以外は前回の画像を貼るだけ
+PANEL_WIDTH = 400
+ZERO_FRAME = (0.0,) * len(Phase)
+
+
+class FrameProfiler:
+    """区間ごとのフレーム時間の計測とオーバーレイ表示
+
+    ラップタイマー方式で、markのたびにperf_counterを1回読んで前回のmarkからの
+    時間を区間に足す。非表示のときはフレームの最初で計測自体を止めるので、
+    markは属性を1つ見て戻るだけになる。
+    """
+
+    def __init__(self, history: int = 240):
+        self.visible = False
+        self.recording = False  # 表示していなくても計測する（ヒッチのログに区間ごとの時間を出すとき）
+        self.enabled = False
+        self.history = np.zeros((history, len(Phase)))  # 直近historyフレームの区間ごとの秒数
+        self.frames = 0
+        self.frame: List[float] = [0.0] * len(Phase)
+        self.last = 0.0
+        self.font: Optional[pygame.font.Font] = None
+        self.panel: Optional[pygame.Surface] = None
+
+    def toggle(self):
+        self.visible = not self.visible
+        if self.visible:
+            self.history[:] = 0.0
+            self.frames = 0
+            self.panel = None
+
+    def begin_frame(self):
+        # 表示の切り替えはフレームの境目でだけ反映する（途中からの計測を混ぜない）
+        self.enabled = self.visible or self.recording
+        if self.enabled:
+            self.frame[:] = ZERO_FRAME
+            self.last = perf_counter()
+
+    def mark(self, phase: Phase):
+        if self.enabled:
+            now = perf_counter()
+            self.frame[phase] += now - self.last
+            self.last = now
+
+    def end_frame(self):
+        if self.enabled:
+            self.history[self.frames % len(self.history)] = self.frame
+            self.frames += 1
+
+    def recorded(self) -> np.ndarray:
+        return self.history[:min(self.frames, len(self.history))]
+
+    def draw(self, screen: pygame.Surface):
+        """オーバーレイを画面右上に貼る（内容はREDRAW_INTERVALごとに作り直す）"""
+        if not (self.enabled and self.visible) or not self.frames:
+            return
+        if self.panel is None or self.frames % REDRAW_INTERVAL == 0:
+            self.panel = self.render_panel()
+        screen.blit(self.panel, (screen.get_width() - PANEL_WIDTH - 10, 90))
+
+    def render_panel(self) -> pygame.Surface:
+        """区間ごとの平均・最悪フレームの内訳・フレーム時間のヒストグラム"""
+        if self.font is None:
+            self.font = pygame.font.Font(None, 20)
+        samples = self.recorded() * 1000  # ms
+        totals = samples.sum(axis=1)
+        worst = samples[int(np.argmax(totals))]
+        average = samples.mean(axis=0)
+
+        width, line = PANEL_WIDTH, 16
+        panel = pygame.Surface((width, 60 + line * len(Phase) + 70), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 210))
+        left = 8
+        y = 6
+
+        over = int((totals > FRAME_BUDGET_MS).sum())
+        header = (f"avg {totals.mean():.2f}ms  p99 {np.percentile(totals, 99):.2f}ms  "
+                  f"worst {totals.max():.2f}ms  over {over}/{len(totals)}")
+        panel.blit(self.font.render(header, True, (255, 255, 255)), (left, y))
+        y += line + 4
+        panel.blit(self.font.render("phase            avg      worst", True, (180, 180, 180)), (left, y))
+        y += line
+
+        # 区間ごとの平均と、最悪フレームでの内訳（バーは最悪フレームの値）
+        scale = (width - 190 - 2 * left) / max(worst.max(), 1e-6)
+        for phase in Phase:
+            color = PHASE_COLORS[phase]
+            name = phase.name.lower()
+            panel.blit(self.font.render(f"{name:<14} {average[phase]:6.2f} {worst[phase]:8.2f}", True, color),
+                       (left, y))
+            pygame.draw.rect(panel, color, (left + 190, y + 3, int(worst[phase] * scale), line - 6))
+            y += line
+
+        # フレーム時間のヒストグラム（赤い線が16.6msの予算）
+        y += 8
+        counts, _ = np.histogram(np.minimum(totals, HISTOGRAM_BINS - 1), bins=HISTOGRAM_BINS,
+                                 range=(0, HISTOGRAM_BINS))
+        bar_width = (width - 2 * left) // HISTOGRAM_BINS
+        height = 50
+        peak = max(int(counts.max()), 1)
+        for i, count in enumerate(counts):
+            bar = int(count * height / peak)
+            color = (255, 80, 80) if i >= FRAME_BUDGET_MS else (80, 220, 120)
+            pygame.draw.rect(panel, color, (left + i * bar_width, y + height - bar, bar_width - 1, bar))
+        budget_x = left + int(FRAME_BUDGET_MS * bar_width)
+        pygame.draw.line(panel, (255, 0, 0), (budget_x, y), (budget_x, y + height), 1)
+        return panel
@@ -0,0 +1,126 @@
+"""ゲームループのプロファイル取得（cProfileのダンプと折りたたみスタック）
+
+cProfileは呼び出し元→呼び出し先の1段ずつしか記録しないので、フレームグラフ用の
+スタックは別スレッドでメインスレッドのスタックを一定間隔でサンプリングして作る。
+どちらもフレーム単位でオン・オフできるので、起動時のアセット生成などを除いて
+ゲームプレイ中のフレームだけを取れる。
+
+    python main.py --profile 30                       # 実際に遊んだ30秒間
+    python main.py --profile 30 --gameplay-only       # GAME画面のフレームだけ
+    python main.py --profile 60 --headless --bot-kpm 250
+
+出力は <prefix>.prof（pstats / snakeviz 用）と <prefix>.folded
+（flamegraph.pl や speedscope にそのまま渡せる「a;b;c 回数」形式）。
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import CodeType
+from typing import Dict, Optional
+
+DEFAULT_PREFIX = Path("profile")
+SAMPLE_INTERVAL = 0.001  # スタックサンプリングの間隔（秒）
+
+
+class StackSampler(threading.Thread):
+    """対象スレッドのスタックを一定間隔で集計する"""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.active = False
+        self.counts: Counter = Counter()
+        self.labels: Dict[CodeType, str] = {}
+        self.stopped = threading.Event()
+
+    def label(self, code: CodeType) -> str:
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if not self.active:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self.label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class ProfileCapture:
+    """フレームごとにcProfileとスタックサンプラーを切り替える
+
+    captured_time が duration に達したら done になる（gameplay_only なら
+    ゲームプレイ中のフレームの時間だけを数える）。
+    """
+
+    def __init__(self, duration: float, prefix: Path = DEFAULT_PREFIX, gameplay_only: bool = False):
+        self.duration = duration
+        self.prefix = Path(prefix)
+        self.gameplay_only = gameplay_only
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident())
+        self.captured_time = 0.0
+        self.captured_frames = 0
+        self.frame_start: Optional[float] = None
+        # 1ms間隔のサンプリングにメインスレッドが応じられるようにGILの切り替えを細かくする
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.switch_interval, SAMPLE_INTERVAL / 2))
+        self.sampler.start()
+
+    @property
+    def done(self) -> bool:
+        return self.captured_time >= self.duration
+
+    def begin_frame(self, gameplay: bool):
+        if self.done or (self.gameplay_only and not gameplay):
+            return
+        self.frame_start = time.perf_counter()
+        self.sampler.active = True
+        self.profile.enable()
+
+    def end_frame(self):
+        if self.frame_start is None:
+            return
+        self.profile.disable()
+        self.sampler.active = False
+        self.captured_time += time.perf_counter() - self.frame_start
+        self.captured_frames += 1
+        self.frame_start = None
+
+    def finish(self):
+        """計測を止めて .prof と .folded を書き出す"""
+        self.end_frame()
+        self.sampler.stop()
+        sys.setswitchinterval(self.switch_interval)
+        self.prefix.parent.mkdir(parents=True, exist_ok=True)
+
+        prof_path = self.prefix.with_suffix('.prof')
+        self.profile.dump_stats(prof_path)
+        folded_path = self.prefix.with_suffix('.folded')
+        with open(folded_path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.sampler.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+        print(f"Profiled {self.captured_frames} frames ({self.captured_time:.1f}s, "
+              f"{sum(self.sampler.counts.values())} stack samples)", file=sys.stderr)
+        print(f"  cProfile dump:     {prof_path}", file=sys.stderr)
+        print(f"  collapsed stacks:  {folded_path}", file=sys.stderr)
+        stats = pstats.Stats(self.profile, stream=sys.stderr)
+        stats.sort_stats('cumulative').print_stats(15)
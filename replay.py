@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""セッションのリプレイ記録と再生
+
+セッションのシード、ステージ遷移、受け付けたキー入力をシミュレーションの
+ティック番号付きで記録する。ティックは差分をvarintで詰めたバイナリログに
+なるので、長いセッションでも数KBに収まる。
+
+    python replay.py replays/20261019-120000.tgr            # ヘッドレスで最大速度
+    python replay.py replays/20261019-120000.tgr --render   # 画面に描画
+    python replay.py replays/20261019-120000.tgr --render --speed 4
+
+ログのレイアウト:
+    ヘッダー   magic, version, シード(u64), 日本語モード(u8), コーパスのCRC32(u32)
+    イベント列 varint(前のイベントからのティック差分), 種別(u8), 内容
+        KEY    varint(文字コード)
+        STAGE  varint(新しいステージ番号)
+        END    varint(スコア), zigzag varint(HP)
+        FOCUS  varint(文字数), 文字ごとに varint(文字コード), varint(重み)
+
+FOCUS は単語選択で重点的に出す苦手な文字の設定。苦手な文字の統計は
+記録した環境にしか無いので、選択に使った重みそのものを残しておく。
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import struct
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+MAGIC = b'TGRP'
+VERSION = 2
+HEADER = struct.Struct('<4sHQBI')
+
+EVENT_KEY = 1
+EVENT_STAGE = 2
+EVENT_END = 3
+EVENT_FOCUS = 4
+
+REPLAY_DIR = Path(__file__).parent / "replays"
+MAX_REPLAYS = 50  # 共有端末でも溜まり続けないよう古いものから消す
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+@dataclass
+class Replay:
+    seed: int
+    japanese_mode: bool
+    corpus_crc: int
+    keys: List[Tuple[int, str]] = field(default_factory=list)  # (ティック, 文字)
+    stages: List[Tuple[int, int]] = field(default_factory=list)  # (ティック, ステージ番号)
+    focus: List[Tuple[int, Dict[str, int]]] = field(default_factory=list)  # (ティック, {文字: 重み})
+    end_tick: int = 0
+    score: int = 0
+    hp: int = 0
+
+
+class ReplayRecorder:
+    """セッション中のイベントを差分エンコードで追記していく"""
+
+    def __init__(self, seed: int, japanese_mode: bool, corpus_crc: int):
+        self.data = bytearray(HEADER.pack(MAGIC, VERSION, seed, int(japanese_mode), corpus_crc))
+        self.last_tick = 0
+        self.finished = False
+
+    def _event(self, tick: int, kind: int):
+        _write_varint(self.data, tick - self.last_tick)
+        self.data.append(kind)
+        self.last_tick = tick
+
+    def key(self, tick: int, char: str):
+        self._event(tick, EVENT_KEY)
+        _write_varint(self.data, ord(char))
+
+    def stage(self, tick: int, stage_index: int):
+        self._event(tick, EVENT_STAGE)
+        _write_varint(self.data, stage_index)
+
+    def focus(self, tick: int, weights: Dict[str, int]):
+        self._event(tick, EVENT_FOCUS)
+        _write_varint(self.data, len(weights))
+        for char, weight in weights.items():
+            _write_varint(self.data, ord(char))
+            _write_varint(self.data, weight)
+
+    def finish(self, tick: int, score: int, hp: int) -> bytes:
+        if not self.finished:
+            self._event(tick, EVENT_END)
+            _write_varint(self.data, score)
+            _write_varint(self.data, _zigzag(hp))
+            self.finished = True
+        return bytes(self.data)
+
+    def save(self, directory: Path = REPLAY_DIR) -> Optional[Path]:
+        """リプレイを保存（失敗してもゲームは止めない）"""
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.tgr"
+            path.write_bytes(bytes(self.data))
+            for old in sorted(directory.glob('*.tgr'))[:-MAX_REPLAYS]:
+                old.unlink()
+            return path
+        except OSError as e:
+            print(f"Failed to save replay: {e}")
+            return None
+
+
+def parse_replay(data: bytes) -> Replay:
+    magic, version, seed, japanese_mode, corpus_crc = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a replay file or unsupported version")
+
+    replay = Replay(seed, bool(japanese_mode), corpus_crc)
+    pos = HEADER.size
+    tick = 0
+    while pos < len(data):
+        delta, pos = _read_varint(data, pos)
+        tick += delta
+        kind = data[pos]
+        pos += 1
+        if kind == EVENT_KEY:
+            code, pos = _read_varint(data, pos)
+            replay.keys.append((tick, chr(code)))
+        elif kind == EVENT_STAGE:
+            stage_index, pos = _read_varint(data, pos)
+            replay.stages.append((tick, stage_index))
+        elif kind == EVENT_END:
+            replay.score, pos = _read_varint(data, pos)
+            hp, pos = _read_varint(data, pos)
+            replay.hp = _unzigzag(hp)
+            replay.end_tick = tick
+        elif kind == EVENT_FOCUS:
+            count, pos = _read_varint(data, pos)
+            weights = {}
+            for _ in range(count):
+                code, pos = _read_varint(data, pos)
+                weights[chr(code)], pos = _read_varint(data, pos)
+            replay.focus.append((tick, weights))
+        else:
+            raise ValueError(f"Unknown replay event {kind} at byte {pos - 1}")
+    return replay
+
+
+def load_replay(path: Path) -> Replay:
+    return parse_replay(Path(path).read_bytes())
+
+
+def run_replay(replay: Replay, render: bool = False, speed: float = 0.0, verbose: bool = False) -> bool:
+    """リプレイを再実行して最終スコア・HPが記録と一致するか確認する
+
+    speed=0 はウェイトなしの最大速度。render=False なら描画もしない。
+    """
+    if not render:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import pygame
+    from main import FPS, GameState, TypingGame
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        game = TypingGame(record_replays=False, save_sessions=False, adaptive_words=False,
+                          download_font=False)
+        game.japanese_mode = replay.japanese_mode
+        if game.corpus_crc() != replay.corpus_crc:
+            print("Warning: word corpus differs from the recording; replay may diverge", file=sys.stderr)
+        game.state = GameState.GAME
+        game.reset_game(seed=replay.seed)
+
+        started = time.perf_counter()
+        key_index = 0
+        focus_index = 0
+        stage_log = []
+        last_stage = game.stage_manager.current_stage
+        while game.tick < replay.end_tick and game.state == GameState.GAME:
+            pygame.event.pump()
+            while focus_index < len(replay.focus) and replay.focus[focus_index][0] <= game.tick:
+                game.apply_focus(replay.focus[focus_index][1])
+                focus_index += 1
+            while key_index < len(replay.keys) and replay.keys[key_index][0] <= game.tick:
+                game.handle_typing_input(replay.keys[key_index][1])
+                key_index += 1
+            game.update()
+            if game.stage_manager.current_stage != last_stage:
+                last_stage = game.stage_manager.current_stage
+                stage_log.append((game.tick - 1, last_stage))
+            if render:
+                game.draw()
+                if speed > 0:
+                    game.clock.tick(FPS * speed)
+        elapsed = time.perf_counter() - started
+
+    matched = (game.score, game.player_hp) == (replay.score, replay.hp) and stage_log == replay.stages
+    print(f"Replayed {game.tick} ticks in {elapsed:.2f}s "
+          f"({game.tick / max(elapsed, 1e-9):.0f} ticks/s)")
+    print(f"  recorded: score={replay.score} hp={replay.hp} stages={len(replay.stages)}")
+    print(f"  replayed: score={game.score} hp={game.player_hp} stages={len(stage_log)}")
+    print("  OK: replay matches the recording" if matched else "  MISMATCH: replay diverged")
+    return matched
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-run a recorded typing session")
+    parser.add_argument('replay', type=Path, help="replay file (.tgr)")
+    parser.add_argument('--render', action='store_true', help="draw the session in a window")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="playback speed when rendering (0 = as fast as possible)")
+    parser.add_argument('--verbose', action='store_true', help="show the game's debug output")
+    args = parser.parse_args(argv)
+
+    try:
+        replay = load_replay(args.replay)
+    except (OSError, ValueError) as e:
+        print(f"Failed to load replay {args.replay}: {e}", file=sys.stderr)
+        return 1
+    speed = args.speed if args.render else 0.0
+    return 0 if run_replay(replay, args.render, speed, args.verbose) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+import hashlib
+import random
+from typing import Dict
+
+
+class RngStreams:
+    """1つのシードからサブシステムごとの独立した乱数ストリームを派生させる
+
+    ストリームごとに別のシードを持つので、敵の出現で乱数を多く消費しても
+    単語選択や背景生成の結果は変わらない。派生シードはハッシュで作るため、
+    Pythonのhash()と違って実行ごと・環境ごとに変わらない。
+    """
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.randoms: Dict[str, random.Random] = {}
+
+    def derive(self, name: str) -> int:
+        """ストリーム名に対応する64bitシード"""
+        digest = hashlib.blake2b(f"{self.seed}:{name}".encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    def random(self, name: str) -> random.Random:
+        if name not in self.randoms:
+            self.randoms[name] = random.Random(self.derive(name))
+        return self.randoms[name]
@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
 
+from typing import Optional
+
+
 class RomajiConverter:
     def __init__(self):
         # ひらがなから可能なローマ字入力パターンのテーブル（複数の入力方法に対応）
@@ -137,14 +140,15 @@ class RomajiConverter:
         patterns = self.get_possible_romaji_patterns(hiragana_char)
         return input_romaji in patterns
     
-    def get_next_possible_chars(self, input_romaji: str, hiragana_char: str) -> list:
-        """次に入力可能な文字のリストを返す"""
-        matching_patterns = self.get_matching_patterns(input_romaji, hiragana_char)
-        next_chars = set()
-        for pattern in matching_patterns:
-            if len(input_romaji) < len(pattern):
-                next_chars.add(pattern[len(input_romaji)])
-        return list(next_chars)
+    def get_next_possible_chars(self, input_romaji: str, hiragana_char: str, out: Optional[list] = None) -> list:
+        """次に入力可能な文字のリストを返す（outを渡せば新しいリストを作らずに詰め直す）"""
+        next_chars = [] if out is None else out
+        next_chars.clear()
+        position = len(input_romaji)
+        for pattern in self.get_matching_patterns(input_romaji, hiragana_char):
+            if position < len(pattern) and pattern[position] not in next_chars:
+                next_chars.append(pattern[position])
+        return next_chars
 
 class TypingInputHandler:
     def __init__(self):
@@ -152,12 +156,31 @@ class TypingInputHandler:
         self.current_romaji_input = ""
         self.target_text = ""
         self.current_char_index = 0
+        # process_input と get_progress_info の戻り値は毎回作らずにこの辞書を書き換えて返す
+        # （呼び出し側はすぐに読むだけで、次の呼び出しまで持たない）。process_input の
+        # expected_next も同じリストを詰め直す（get_progress_info のほうはラベルが値の
+        # 変化を見るので、変わったときに作り直す）
+        self.result = {
+            'success': False,
+            'char_completed': False,
+            'word_completed': False,
+            'expected_next': []
+        }
+        self.progress = {
+            'typed_chars': 0,
+            'total_chars': 0,
+            'current_romaji': "",
+            'current_target_char': "",
+            'expected_next': []
+        }
+        self.progress_stale = True
         
-    def set_target_text(self, text: str):
-        """ターゲットテキストを設定"""
+    def set_target_text(self, text: str, position: int = 0):
+        """ターゲットテキストを設定（positionから打ち始める。ボスの文章を途中から打ち直すとき）"""
         self.target_text = text
-        self.current_char_index = 0
+        self.current_char_index = position
         self.current_romaji_input = ""
+        self.progress_stale = True
         
     def get_current_target_char(self) -> str:
         """現在入力すべき文字を取得"""
@@ -175,48 +198,41 @@ class TypingInputHandler:
             'expected_next': list  # 次に期待される文字のリスト
         }
         """
-        result = {
-            'success': False,
-            'char_completed': False,
-            'word_completed': False,
-            'expected_next': []
-        }
+        result = self.result
+        result['success'] = False
+        result['char_completed'] = False
+        result['word_completed'] = False
+        expected_next = result['expected_next']
+        expected_next.clear()
         
         if self.current_char_index >= len(self.target_text):
             return result
+        self.progress_stale = True
         
         target_char = self.get_current_target_char()
         test_input = self.current_romaji_input + char
         
-        print(f"Processing: '{char}' for target '{target_char}', current input: '{self.current_romaji_input}' -> '{test_input}'")
-        
         # 複数パターンでの部分一致チェック
         if self.converter.is_partial_match_any_pattern(test_input, target_char):
             self.current_romaji_input = test_input
             result['success'] = True
-            print(f"Partial match found for '{test_input}' with '{target_char}'")
             
             # 文字完成チェック
             if self.converter.is_complete_match(test_input, target_char):
                 result['char_completed'] = True
                 self.current_char_index += 1
                 self.current_romaji_input = ""
-                print(f"Character '{target_char}' completed with '{test_input}'")
                 
                 # 単語完成チェック
                 if self.current_char_index >= len(self.target_text):
                     result['word_completed'] = True
-                    print(f"Word completed!")
-        else:
-            print(f"No match found for '{test_input}' with '{target_char}'")
         
         # 次に期待される文字のリストを設定
         if not result['word_completed']:
             current_target_char = self.get_current_target_char()
             if current_target_char:
-                result['expected_next'] = self.converter.get_next_possible_chars(
-                    self.current_romaji_input, current_target_char
-                )
+                self.converter.get_next_possible_chars(self.current_romaji_input, current_target_char,
+                                                       expected_next)
         
         return result
     
@@ -241,15 +257,19 @@ class TypingInputHandler:
     def reset_current_char_input(self):
         """現在の文字の入力のみをリセット（単語の進行は保持）"""
         self.current_romaji_input = ""
+        self.progress_stale = True
     
     def get_progress_info(self) -> dict:
-        """入力進行状況の詳細情報を取得"""
-        return {
-            'typed_chars': self.current_char_index,
-            'total_chars': len(self.target_text),
-            'current_romaji': self.current_romaji_input,
-            'current_target_char': self.get_current_target_char(),
-            'expected_next': self.converter.get_next_possible_chars(
-                self.current_romaji_input, self.get_current_target_char()
-            ) if self.get_current_target_char() else []
-        }
\ No newline at end of file
+        """入力進行状況の詳細情報を取得（描画で毎フレーム呼ばれるので、入力が変わったときだけ作り直す）"""
+        progress = self.progress
+        if self.progress_stale:
+            target_char = self.get_current_target_char()
+            progress['typed_chars'] = self.current_char_index
+            progress['total_chars'] = len(self.target_text)
+            progress['current_romaji'] = self.current_romaji_input
+            progress['current_target_char'] = target_char
+            progress['expected_next'] = self.converter.get_next_possible_chars(
+                self.current_romaji_input, target_char
+            ) if target_char else []
+            self.progress_stale = False
+        return progress
\ No newline at end of file
@@ -1,10 +1,166 @@
 import pygame
 import numpy as np
-from typing import Dict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from synth import (
+    ExpDecay, LinearFade, Mix, Noise, Osc, Patch, Repeat, Segment,
+    render_sound,
+)
+
+
+@dataclass(frozen=True)
+class VoiceCategory:
+    """予約チャンネルを持つ効果音カテゴリ"""
+    channels: int  # このカテゴリ専用に予約するチャンネル数
+
+
+@dataclass(frozen=True)
+class SoundSpec:
+    """効果音ごとの再生ルール"""
+    category: str
+    priority: int  # 大きいほど重要（ボイススティール時に残る）
+    min_interval_ms: int = 0  # 同じ音の最短再生間隔（レート制限）
+    pitches: Tuple[float, ...] = (1.0,)  # 事前計算するピッチ違い
+    volumes: Tuple[float, ...] = (1.0,)  # 事前計算する音量違い
+
+
+# カテゴリごとに専用チャンネルを予約し、BGMや重要な効果音が打鍵音に奪われないようにする
+VOICE_CATEGORIES: Dict[str, VoiceCategory] = {
+    'music': VoiceCategory(1),
+    'cue': VoiceCategory(3),    # 撃破・被弾
+    'alert': VoiceCategory(2),  # ミス
+    'keys': VoiceCategory(4),   # 打鍵音
+}
+
+SOUND_SPECS: Dict[str, SoundSpec] = {
+    'bgm': SoundSpec('music', priority=100),
+    'defeat': SoundSpec('cue', priority=30, min_interval_ms=40, pitches=(1.0, 1.06, 0.95)),
+    'damage': SoundSpec('cue', priority=40, min_interval_ms=80),
+    'error': SoundSpec('alert', priority=20, min_interval_ms=60),
+    'hit': SoundSpec('keys', priority=15, min_interval_ms=20),
+    'type': SoundSpec('keys', priority=10, min_interval_ms=25,
+                      pitches=(1.0, 1.04, 0.97, 1.08, 0.94), volumes=(1.0, 0.85)),
+}
+
+
+class VoicePool:
+    """カテゴリ別の予約チャンネルで効果音を鳴らすボイスマネージャ
+
+    各カテゴリは自分のチャンネルだけを使うため、打鍵音が溢れてもBGMや
+    撃破音のチャンネルを奪うことはない。カテゴリ内で空きがなければ、
+    優先度が低く古いボイスから順に奪う。
+    """
+
+    def __init__(self, categories: Dict[str, VoiceCategory]):
+        total = sum(category.channels for category in categories.values())
+        pygame.mixer.set_num_channels(total)
+        # すべて予約してSound.play()の自動割り当てに使われないようにする
+        pygame.mixer.set_reserved(total)
+
+        self.channels: Dict[str, List[pygame.mixer.Channel]] = {}
+        index = 0
+        for name, category in categories.items():
+            self.channels[name] = [pygame.mixer.Channel(index + i) for i in range(category.channels)]
+            index += category.channels
+
+        # チャンネルごとの (優先度, 開始時刻)
+        self.voices: Dict[pygame.mixer.Channel, Tuple[int, int]] = {}
+
+    def play(self, sound: pygame.mixer.Sound, category: str, priority: int,
+             loops: int = 0) -> Optional[pygame.mixer.Channel]:
+        pool = self.channels.get(category)
+        if not pool:
+            return None
+
+        # 空いているチャンネルがあればそこで鳴らす
+        for channel in pool:
+            if not channel.get_busy():
+                return self._start(channel, sound, priority, loops)
+
+        # 全部鳴っていれば、優先度が低く古いボイスを奪う。それより優先度が低ければ鳴らさない
+        victim = min(pool, key=lambda channel: self.voices.get(channel, (0, 0)))
+        if self.voices.get(victim, (0, 0))[0] > priority:
+            return None
+        return self._start(victim, sound, priority, loops)
+
+    def _start(self, channel: pygame.mixer.Channel, sound: pygame.mixer.Sound, priority: int,
+               loops: int) -> pygame.mixer.Channel:
+        channel.play(sound, loops)
+        self.voices[channel] = (priority, pygame.time.get_ticks())
+        return channel
+
+def test_patch(pitch: float = 1.0) -> Patch:
+    return Patch(0.1, Osc(440 * pitch), volume=0.1)
+
+
+def hit_patch(pitch: float = 1.0) -> Patch:
+    return Patch(0.1, Osc(800 * pitch) * ExpDecay(10), volume=0.3)
+
+
+def defeat_patch(pitch: float = 1.0) -> Patch:
+    return Patch(0.3, Osc(1200 * pitch) * ExpDecay(5), volume=0.4)
+
+
+def damage_patch(pitch: float = 1.0) -> Patch:
+    return Patch(0.5, Osc(200 * pitch) * LinearFade(0.5), volume=0.2)
+
+
+def type_patch(pitch: float = 1.0) -> Patch:
+    return Patch(0.05, Osc(600 * pitch) * ExpDecay(20), volume=0.1)
+
+
+def error_patch(pitch: float = 1.0) -> Patch:
+    return Patch(0.2, Osc(150 * pitch) * LinearFade(0.2), volume=0.3)
+
+
+def bgm_patch(pitch: float = 1.0, seed: Optional[int] = None) -> Patch:
+    """ゾンビバトル風のダークなBGM（12秒ループ、seedでドラムのノイズが決まる）"""
+    duration = 12.0
+    section = duration / 4  # 各コードを3秒ずつ演奏
+
+    # ダークなマイナーキーのメロディ（A minor scale）
+    # Am - F - C - G progression
+    chord_freqs = [
+        [220.0, 261.63, 329.63],  # Am chord
+        [174.61, 220.0, 261.63],  # F chord
+        [130.81, 164.81, 196.0],  # C chord
+        [196.0, 246.94, 293.66]   # G chord
+    ]
+
+    parts = []
+    for i, chord in enumerate(chord_freqs):
+        # 重厚なコード音（ゆっくりとした変調）
+        swell = 0.5 + 0.5 * Osc(1 / 3, phase=0.25)
+        pad = Mix([Osc(freq * pitch) for freq in chord]) * swell * 0.1
+        # 重いベースライン（オクターブ下）
+        wobble = 0.8 + 0.2 * Osc(8 / (2 * np.pi))
+        bass = Osc(chord[0] / 2 * pitch) * ExpDecay(0.5) * wobble * 0.15
+        parts.append(Segment(i * section, (i + 1) * section, pad + bass))
+
+    # ドラム的なリズム（ノイズベース、16ビートの強拍のみ）
+    beat = duration / 16
+    drums = Repeat(Noise(0.3, seed) * ExpDecay(20), period=beat * 4, length=beat * 0.2)
+    parts.append(drums * 0.2)
+
+    return Patch(duration, Mix(parts), volume=0.25)
+
+
+# パッチはピッチから作る。ノイズを含むもの（SEEDED_PATCHES）にはシードも渡す
+SOUND_PATCHES: Dict[str, Callable[..., Patch]] = {
+    'hit': hit_patch,
+    'defeat': defeat_patch,
+    'damage': damage_patch,
+    'type': type_patch,
+    'error': error_patch,
+    'bgm': bgm_patch,
+}
+SEEDED_PATCHES = frozenset({'bgm'})
+
 
 class SoundManager:
-    def __init__(self):
+    def __init__(self, seed: Optional[int] = None):
         self.enabled = False
+        self.seed = seed  # 手続き生成する音（BGMのノイズなど）のシード
         
         # 複数の設定を試す
         audio_configs = [
@@ -58,32 +214,20 @@ class SoundManager:
                 print("Game will continue without sound effects")
         
         self.sounds: Dict[str, pygame.mixer.Sound] = {}
+        # ピッチ・音量違いのバリエーション（ラウンドロビンで選択）
+        self.variants: Dict[str, List[pygame.mixer.Sound]] = {}
+        self.variant_gains: Dict[str, List[float]] = {}
+        self.next_variant: Dict[str, int] = {}
+        self.last_played: Dict[str, int] = {}
+        self.voice_pool: Optional[VoicePool] = None
         if self.enabled:
             self.generate_sounds()
+            self.voice_pool = VoicePool(VOICE_CATEGORIES)
         
     def create_test_sound(self):
         """テスト用の簡単なサウンドを作成"""
         try:
-            sample_rate = pygame.mixer.get_init()[0] if pygame.mixer.get_init() else 22050
-            duration = 0.1
-            t = np.linspace(0, duration, int(sample_rate * duration), False)
-            wave = np.sin(440 * 2 * np.pi * t) * 0.1
-            
-            # サンプルフォーマットを確認
-            if pygame.mixer.get_init()[1] < 0:  # signed
-                wave = (wave * 32767).astype(np.int16)
-            else:  # unsigned
-                wave = ((wave + 1) * 32767).astype(np.uint16)
-            
-            # チャンネル数に応じて調整
-            channels = pygame.mixer.get_init()[2] if pygame.mixer.get_init() else 2
-            if channels == 2:
-                stereo_wave = np.array([wave, wave]).T
-                stereo_wave = np.ascontiguousarray(stereo_wave)  # C-contiguous配列にする
-                return pygame.sndarray.make_sound(stereo_wave)
-            else:
-                wave = np.ascontiguousarray(wave)  # C-contiguous配列にする
-                return pygame.sndarray.make_sound(wave)
+            return render_sound(test_patch())
         except Exception as e:
             print(f"Test sound creation failed: {e}")
             return None
@@ -94,163 +238,66 @@ class SoundManager:
             mixer_info = pygame.mixer.get_init()
             print(f"Mixer initialized: frequency={mixer_info[0]}, size={mixer_info[1]}, channels={mixer_info[2]}")
             
-            self.sounds['hit'] = self.generate_hit_sound()
-            self.sounds['defeat'] = self.generate_defeat_sound()
-            self.sounds['damage'] = self.generate_damage_sound()
-            self.sounds['type'] = self.generate_type_sound()
-            self.sounds['error'] = self.generate_error_sound()
-            self.sounds['bgm'] = self.generate_bgm()
+            for name, patch in SOUND_PATCHES.items():
+                self.generate_variants(name, patch)
             print(f"Generated {len(self.sounds)} sounds successfully")
         except Exception as e:
             print(f"Sound generation failed: {e}")
             print("Continuing without sound effects")
             self.enabled = False
         
-    def _create_sound_wave(self, duration: float, frequency: float, envelope_func=None, volume: float = 0.5) -> pygame.mixer.Sound:
-        """サウンド作成のヘルパー関数"""
-        mixer_info = pygame.mixer.get_init()
-        if not mixer_info:
-            return None
-        
-        sample_rate, bit_depth, channels = mixer_info
-        t = np.linspace(0, duration, int(sample_rate * duration), False)
-        
-        # 基本波形を生成
-        wave = np.sin(frequency * 2 * np.pi * t)
-        
-        # エンベロープを適用
-        if envelope_func:
-            wave = wave * envelope_func(t)
-        
-        # 音量調整
-        wave = wave * volume
-        
-        # ビット深度に応じて変換
-        if bit_depth == 8:
-            wave = ((wave + 1) * 127.5).astype(np.uint8)
-        elif bit_depth == -8:
-            wave = (wave * 127).astype(np.int8)
-        elif bit_depth == 16:
-            wave = ((wave + 1) * 32767.5).astype(np.uint16)
-        elif bit_depth == -16:
-            wave = (wave * 32767).astype(np.int16)
-        else:
-            wave = (wave * 32767).astype(np.int16)
-        
-        # チャンネル数に応じて調整
-        if channels == 1:
-            wave = np.ascontiguousarray(wave)
-            return pygame.sndarray.make_sound(wave)
-        else:  # stereo
-            stereo_wave = np.array([wave, wave]).T
-            stereo_wave = np.ascontiguousarray(stereo_wave)
-            return pygame.sndarray.make_sound(stereo_wave)
-    
-    def generate_hit_sound(self) -> pygame.mixer.Sound:
-        return self._create_sound_wave(0.1, 800, lambda t: np.exp(-t * 10), 0.3)
-    
-    def generate_defeat_sound(self) -> pygame.mixer.Sound:
-        return self._create_sound_wave(0.3, 1200, lambda t: np.exp(-t * 5), 0.4)
-    
-    def generate_damage_sound(self) -> pygame.mixer.Sound:
-        return self._create_sound_wave(0.5, 200, lambda t: (1 - t / 0.5), 0.2)
-    
-    def generate_type_sound(self) -> pygame.mixer.Sound:
-        return self._create_sound_wave(0.05, 600, lambda t: np.exp(-t * 20), 0.1)
-    
-    def generate_error_sound(self) -> pygame.mixer.Sound:
-        return self._create_sound_wave(0.2, 150, lambda t: (1 - t / 0.2), 0.3)
-    
-    def generate_bgm(self) -> pygame.mixer.Sound:
-        """ゾンビバトル風のダークなBGMを生成"""
-        mixer_info = pygame.mixer.get_init()
-        if not mixer_info:
-            return None
-        
-        duration = 12.0  # 12秒のループ（より長く）
-        sample_rate, bit_depth, channels = mixer_info
-        t = np.linspace(0, duration, int(sample_rate * duration), False)
-        
-        # ダークなマイナーキーのメロディ（A minor scale）
-        # Am - F - C - G progression
-        chord_freqs = [
-            [220.0, 261.63, 329.63],  # Am chord
-            [174.61, 220.0, 261.63],  # F chord  
-            [130.81, 164.81, 196.0],  # C chord
-            [196.0, 246.94, 293.66]   # G chord
-        ]
-        
-        melody = np.zeros_like(t)
-        bass = np.zeros_like(t)
-        
-        # 各コードを3秒ずつ演奏
-        for i, chord in enumerate(chord_freqs):
-            start_time = i * duration / 4
-            end_time = (i + 1) * duration / 4
-            mask = (t >= start_time) & (t < end_time)
-            chord_t = t[mask] - start_time
-            
-            # 重厚なコード音
-            for j, freq in enumerate(chord):
-                envelope = 0.5 + 0.5 * np.cos(chord_t * 2 * np.pi / 3)  # ゆっくりとした変調
-                melody[mask] += np.sin(freq * 2 * np.pi * chord_t) * envelope * 0.1
-            
-            # 重いベースライン
-            bass_freq = chord[0] / 2  # オクターブ下
-            bass_envelope = np.exp(-chord_t * 0.5) * (0.8 + 0.2 * np.sin(chord_t * 8))
-            bass[mask] += np.sin(bass_freq * 2 * np.pi * chord_t) * bass_envelope * 0.15
-        
-        # ドラム的なリズム（ノイズベース）
-        drum_pattern = np.zeros_like(t)
-        beat_interval = duration / 16  # 16ビート
-        for beat in range(16):
-            beat_start = beat * beat_interval
-            beat_end = beat_start + beat_interval * 0.2
-            mask = (t >= beat_start) & (t < beat_end)
-            if beat % 4 == 0:  # 強拍
-                noise = np.random.normal(0, 0.3, np.sum(mask))
-                drum_pattern[mask] = noise * np.exp(-(t[mask] - beat_start) * 20)
-        
-        # 合成
-        bgm = melody + bass + drum_pattern * 0.2
-        bgm = bgm * 0.25  # 音量調整
-        
-        # ビット深度に応じて変換
-        if bit_depth == 8:
-            bgm = ((bgm + 1) * 127.5).astype(np.uint8)
-        elif bit_depth == -8:
-            bgm = (bgm * 127).astype(np.int8)
-        elif bit_depth == 16:
-            bgm = ((bgm + 1) * 32767.5).astype(np.uint16)
-        elif bit_depth == -16:
-            bgm = (bgm * 32767).astype(np.int16)
-        else:
-            bgm = (bgm * 32767).astype(np.int16)
-        
-        # チャンネル数に応じて調整
-        if channels == 1:
-            bgm = np.ascontiguousarray(bgm)
-            return pygame.sndarray.make_sound(bgm)
-        else:  # stereo
-            stereo_bgm = np.array([bgm, bgm]).T
-            stereo_bgm = np.ascontiguousarray(stereo_bgm)
-            return pygame.sndarray.make_sound(stereo_bgm)
-    
+    def generate_variants(self, name: str, patch: Callable[..., Patch]):
+        """SoundSpecに従ってピッチ・音量違いを事前生成"""
+        spec = SOUND_SPECS[name]
+        variants = []
+        gains = []
+        for pitch in spec.pitches:
+            base = render_sound(patch(pitch, self.seed) if name in SEEDED_PATCHES else patch(pitch))
+            for i, volume in enumerate(spec.volumes):
+                # 音量違いは同じPCMをコピーして作る（再レンダリングしない）
+                sound = base if i == 0 else pygame.mixer.Sound(buffer=base.get_raw())
+                sound.set_volume(volume)
+                variants.append(sound)
+                gains.append(volume)
+        self.sounds[name] = variants[0]
+        self.variants[name] = variants
+        self.variant_gains[name] = gains
+        self.next_variant[name] = 0
+
     def play_sound(self, sound_name: str):
         if self.enabled and sound_name in self.sounds:
             try:
-                if sound_name == 'bgm':
-                    # BGMはループ再生
-                    self.sounds[sound_name].play(-1)  # -1 で無限ループ
+                spec = SOUND_SPECS.get(sound_name)
+                if spec is None or self.voice_pool is None:
+                    self.sounds[sound_name].play(-1 if sound_name == 'bgm' else 0)
+                    return
+
+                # 同じ音の連打はレート制限で間引く
+                now = pygame.time.get_ticks()
+                last = self.last_played.get(sound_name)
+                if last is not None and now - last < spec.min_interval_ms:
+                    return
+                self.last_played[sound_name] = now
+
+                variants = self.variants.get(sound_name)
+                if variants:
+                    index = self.next_variant[sound_name]
+                    sound = variants[index]
+                    self.next_variant[sound_name] = (index + 1) % len(variants)
                 else:
-                    self.sounds[sound_name].play()
+                    sound = self.sounds[sound_name]
+
+                # BGMはループ再生
+                loops = -1 if sound_name == 'bgm' else 0
+                self.voice_pool.play(sound, spec.category, spec.priority, loops)
             except Exception as e:
                 print(f"Failed to play sound {sound_name}: {e}")
     
     def stop_sound(self, sound_name: str):
         """特定のサウンドを停止"""
         if self.enabled and sound_name in self.sounds:
-            self.sounds[sound_name].stop()
+            for sound in self.variants.get(sound_name, [self.sounds[sound_name]]):
+                sound.stop()
     
     def stop_all_sounds(self):
         """すべてのサウンドを停止"""
@@ -259,10 +306,16 @@ class SoundManager:
     
     def set_volume(self, volume: float):
         if self.enabled:
-            for sound in self.sounds.values():
-                sound.set_volume(volume)
+            for sound_name in self.sounds:
+                self.set_sound_volume(sound_name, volume)
     
     def set_sound_volume(self, sound_name: str, volume: float):
         """特定のサウンドの音量を設定"""
         if self.enabled and sound_name in self.sounds:
-            self.sounds[sound_name].set_volume(volume)
\ No newline at end of file
+            variants = self.variants.get(sound_name)
+            if variants:
+                # バリエーションごとの音量差は保ったまま全体を調整
+                for sound, gain in zip(variants, self.variant_gains[sound_name]):
+                    sound.set_volume(volume * gain)
+            else:
+                self.sounds[sound_name].set_volume(volume)
@@ -1,8 +1,11 @@
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from enum import Enum
 import random
 
+# 単語の難易度（易しい順）。難易度調整はこの並びで隣の難易度へずらす
+DIFFICULTY_LEVELS = ("easy", "medium", "hard")
+
 class StageType(Enum):
     NORMAL = "normal"
     BOSS = "boss"
@@ -17,13 +20,28 @@ class StageConfig:
     difficulty_level: str
     enemy_types_weights: Dict[str, float]
     duration: int  # in seconds, 0 for infinite
-    boss_text: str = ""
+    boss_text: str = ""  # ボスの文章の名前（words/bosses.json5）
+    # 難易度調整で動かせる範囲（省略時は基本値の前後から決める）
+    spawn_delay_bounds: Tuple[int, int] = (0, 0)  # (最短, 最長) フレーム
+    max_enemies_bounds: Tuple[int, int] = (0, 0)  # (最少, 最多)
+    difficulty_levels: Tuple[str, ...] = ()       # 使ってよい単語の難易度（易しい順）
+    
+    def __post_init__(self):
+        if self.spawn_delay_bounds == (0, 0):
+            self.spawn_delay_bounds = (max(30, int(self.enemy_spawn_delay * 0.6)), int(self.enemy_spawn_delay * 1.5))
+        if self.max_enemies_bounds == (0, 0):
+            self.max_enemies_bounds = (max(1, self.max_enemies - 1), self.max_enemies + 2)
+        if not self.difficulty_levels:
+            index = DIFFICULTY_LEVELS.index(self.difficulty_level)
+            self.difficulty_levels = DIFFICULTY_LEVELS[max(0, index - 1):index + 2]
 
 class StageManager:
     def __init__(self):
         self.current_stage = 0
         self.stage_time = 0
         self.stages = self.create_stages()
+        self.boss_spawned = False
+        self.boss_defeated = False
     
     def create_stages(self) -> List[StageConfig]:
         return [
@@ -113,16 +131,25 @@ class StageManager:
     def next_stage(self):
         self.current_stage += 1
         self.stage_time = 0
+        self.boss_spawned = False
+        self.boss_defeated = False
+    
+    def needs_boss(self) -> bool:
+        """ボスステージでまだボスを出していない"""
+        return self.get_current_stage().stage_type == StageType.BOSS and not self.boss_spawned
+    
+    def defeat_boss(self):
+        self.boss_defeated = True
     
     def update(self, dt: float):
         self.stage_time += dt
     
-    def is_stage_complete(self, enemies_count: int) -> bool:
+    def is_stage_complete(self) -> bool:
         current = self.get_current_stage()
         
         if current.stage_type == StageType.BOSS:
-            # Boss stages complete when no enemies left
-            return enemies_count == 0
+            # ボスを倒したら終わり（ボスが出る前に敵がいないだけでは終わらない）
+            return self.boss_defeated
         else:
             # Normal stages complete when time is up
             return current.duration > 0 and self.stage_time >= current.duration
@@ -140,11 +167,11 @@ JAPANESE_WORDS = {
         "あか", "あお", "みどり", "しろ", "くろ", "おおきい", "ちいさい", "あつい", "つめたい", "たのしい"
     ],
     "medium": [
-        "コンピューター", "キーボード", "マウス", "タイピング", "ゲーム", "ゾンビ", "こうげき", "まもる", "ぶき", "たたかい",
-        "がっこう", "しごと", "でんしゃ", "じどうしゃ", "りょこう", "おんがく", "えいが", "ほん", "しんぶん", "テレビ"
+        "パソコン", "キーボード", "マウス", "タイピング", "ゲーム", "ゾンビ", "こうげき", "まもる", "ぶき", "たたかい",
+        "こうえん", "しごと", "でんわ", "ちかてつ", "たび", "おんがく", "えいが", "ほん", "しんぶん", "テレビ"
     ],
     "hard": [
-        "プログラミング", "かいはつ", "アルゴリズム", "インターフェース", "アーキテクチャ", "さいてきか", "デバッグ", "じっそう",
-        "データベース", "ネットワーク", "セキュリティ", "クラウド", "じんこうちのう", "きかいがくしゅう", "ブロックチェーン"
+        "プログラミング", "かいはつ", "アルゴリズム", "へんすう", "こうぞうたい", "さいてきか", "さいきかんすう", "かそうか",
+        "データベース", "つうしん", "あんごうか", "クラウド", "じんこうちのう", "きかいほんやく", "しぜんげんご"
     ]
 }
\ No newline at end of file
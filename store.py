@@ -0,0 +1,245 @@
+"""セッション・ハイスコアのSQLiteストア
+
+書き込みはキューに積むだけで、バックグラウンドスレッドがまとめて1トランザクションで
+書き出す。ハイスコア表や履歴もそのスレッドが書き込みのたびに引き直し、ゲームループは
+出来上がったスナップショットを読むだけなので、ディスクを待つことはない。
+
+データベースはWALモードで開くので、同じファイルを別プロセス（共有端末の
+集計スクリプトなど）が読んでいても書き込みは止まらない。
+"""
+
+import queue
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+DATA_DIR = Path(__file__).parent / "data"
+DB_PATH = DATA_DIR / "sessions.sqlite3"
+
+SCHEMA_VERSION = 1
+BATCH_SIZE = 64           # 1トランザクションで書くセッション数の上限
+BATCH_WAIT = 0.5          # 最初のレコードが来てから続きを待つ秒数
+TABLE_ROWS = 5            # ハイスコア表・履歴の行数
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    japanese INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    hp INTEGER NOT NULL,
+    stage INTEGER NOT NULL,
+    ticks INTEGER NOT NULL,
+    keys INTEGER NOT NULL,
+    correct_keys INTEGER NOT NULL,
+    chars INTEGER NOT NULL,
+    kills INTEGER NOT NULL,
+    kill_ticks INTEGER NOT NULL,
+    best_burst REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_by_score ON sessions (japanese, score DESC);
+CREATE INDEX IF NOT EXISTS sessions_by_time ON sessions (japanese, ended_at DESC);
+
+CREATE TABLE IF NOT EXISTS stage_results (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    stage INTEGER NOT NULL,
+    cleared INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    ticks INTEGER NOT NULL,
+    keys INTEGER NOT NULL,
+    correct_keys INTEGER NOT NULL,
+    kills INTEGER NOT NULL,
+    PRIMARY KEY (session_id, stage)
+) WITHOUT ROWID;
+
+-- 全セッションの打鍵数などの累計（セッション表を集計し直さずに済むように）
+CREATE TABLE IF NOT EXISTS totals (
+    japanese INTEGER PRIMARY KEY,
+    sessions INTEGER NOT NULL,
+    ticks INTEGER NOT NULL,
+    keys INTEGER NOT NULL,
+    correct_keys INTEGER NOT NULL,
+    chars INTEGER NOT NULL,
+    kills INTEGER NOT NULL
+);
+"""
+
+
+@dataclass
+class StageResult:
+    stage: int
+    cleared: bool
+    score: int
+    ticks: int
+    keys: int
+    correct_keys: int
+    kills: int
+
+
+@dataclass
+class SessionRecord:
+    started_at: float
+    ended_at: float
+    japanese: bool
+    seed: int
+    score: int
+    hp: int
+    stage: int
+    ticks: int
+    keys: int
+    correct_keys: int
+    chars: int
+    kills: int
+    kill_ticks: int
+    best_burst: float
+    stages: List[StageResult] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class ScoreRow:
+    score: int
+    stage: int
+    ended_at: float
+    accuracy: float
+
+
+@dataclass(frozen=True)
+class StoreSnapshot:
+    """画面に出す集計結果（書き込みスレッドが作って差し替える）"""
+    high_scores: Tuple[ScoreRow, ...] = ()
+    history: Tuple[ScoreRow, ...] = ()
+    sessions: int = 0
+    keys: int = 0
+    accuracy: float = 1.0
+    last_started_at: float = 0.0     # 直近に保存したセッションの開始時刻（どのセッションの順位かの照合用）
+    last_rank: Optional[int] = None  # その順位（1始まり）
+
+
+_STOP = object()
+
+
+class SessionStore:
+    """セッションを非同期にSQLiteへ保存し、集計結果をスナップショットで返す"""
+
+    def __init__(self, path: Path = DB_PATH):
+        self.path = path
+        self.enabled = True
+        self.queue: "queue.Queue[object]" = queue.Queue()
+        self.snapshots: Dict[bool, StoreSnapshot] = {True: StoreSnapshot(), False: StoreSnapshot()}
+        self.thread = threading.Thread(target=self._run, name="session-store", daemon=True)
+        self.thread.start()
+
+    def snapshot(self, japanese: bool) -> StoreSnapshot:
+        return self.snapshots[japanese]
+
+    def save(self, record: SessionRecord):
+        """セッションを保存キューに積む（すぐ戻る）"""
+        if self.enabled:
+            self.queue.put(record)
+
+    def close(self, timeout: float = 5.0):
+        """残りを書き出してスレッドを止める"""
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # WALならコミットごとのfsyncは不要
+        conn.execute("PRAGMA foreign_keys=ON")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise sqlite3.DatabaseError(f"unsupported schema version {version}")
+        conn.executescript(SCHEMA)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._connect()
+            self._refresh(conn)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Session store disabled: {e}")
+            self.enabled = False
+            return
+
+        while True:
+            batch = [self.queue.get()]
+            # 続けて来るレコードを少し待ってまとめる
+            while batch[-1] is not _STOP and len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get(timeout=BATCH_WAIT))
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not _STOP]
+            if records:
+                try:
+                    self._write(conn, records)
+                    # まだ後続が溜まっているなら集計は最後にまとめて1回だけ
+                    if self.queue.empty() or batch[-1] is _STOP:
+                        self._refresh(conn, records[-1])
+                except sqlite3.Error as e:
+                    print(f"Failed to save {len(records)} sessions: {e}")
+            if batch[-1] is _STOP:
+                break
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, records: List[SessionRecord]):
+        with conn:
+            for record in records:
+                cursor = conn.execute(
+                    "INSERT INTO sessions (started_at, ended_at, japanese, seed, score, hp, stage, ticks,"
+                    " keys, correct_keys, chars, kills, kill_ticks, best_burst)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (record.started_at, record.ended_at, int(record.japanese), record.seed, record.score,
+                     record.hp, record.stage, record.ticks, record.keys, record.correct_keys, record.chars,
+                     record.kills, record.kill_ticks, record.best_burst))
+                conn.executemany(
+                    "INSERT INTO stage_results (session_id, stage, cleared, score, ticks, keys, correct_keys, kills)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid, stage.stage, int(stage.cleared), stage.score, stage.ticks,
+                      stage.keys, stage.correct_keys, stage.kills) for stage in record.stages])
+            conn.executemany(
+                "INSERT INTO totals (japanese, sessions, ticks, keys, correct_keys, chars, kills)"
+                " VALUES (?, 1, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (japanese) DO UPDATE SET sessions = sessions + 1,"
+                " ticks = ticks + excluded.ticks, keys = keys + excluded.keys,"
+                " correct_keys = correct_keys + excluded.correct_keys,"
+                " chars = chars + excluded.chars, kills = kills + excluded.kills",
+                [(int(record.japanese), record.ticks, record.keys, record.correct_keys, record.chars,
+                  record.kills) for record in records])
+
+    def _rows(self, conn: sqlite3.Connection, japanese: bool, order: str) -> Tuple[ScoreRow, ...]:
+        rows = conn.execute(
+            "SELECT score, stage, ended_at, keys, correct_keys FROM sessions"
+            f" WHERE japanese = ? ORDER BY {order} LIMIT ?", (int(japanese), TABLE_ROWS))
+        return tuple(ScoreRow(score, stage, ended_at, correct / keys if keys else 1.0)
+                     for score, stage, ended_at, keys, correct in rows)
+
+    def _refresh(self, conn: sqlite3.Connection, last: Optional[SessionRecord] = None):
+        """両モードのスナップショットを引き直して差し替える（どのクエリもインデックスで引ける）"""
+        snapshots = {}
+        for japanese in (True, False):
+            totals = conn.execute("SELECT sessions, keys, correct_keys FROM totals WHERE japanese = ?",
+                                  (int(japanese),)).fetchone() or (0, 0, 0)
+            started_at, rank = 0.0, None
+            if last is not None and last.japanese == japanese:
+                started_at = last.started_at
+                rank = conn.execute("SELECT COUNT(*) FROM sessions WHERE japanese = ? AND score > ?",
+                                    (int(japanese), last.score)).fetchone()[0] + 1
+            snapshots[japanese] = StoreSnapshot(
+                high_scores=self._rows(conn, japanese, "score DESC"),
+                history=self._rows(conn, japanese, "ended_at DESC"),
+                sessions=totals[0],
+                keys=totals[1],
+                accuracy=totals[2] / totals[1] if totals[1] else 1.0,
+                last_started_at=started_at,
+                last_rank=rank,
+            )
+        self.snapshots = snapshots
@@ -0,0 +1,236 @@
+import pygame
+import numpy as np
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple, Union
+
+# 1ブロックあたりのサンプル数（Pythonのループはブロック単位のみ）
+BLOCK_SIZE = 8192
+WAVETABLE_SIZE = 4096
+
+
+@lru_cache(maxsize=None)
+def get_wavetable(waveform: str, size: int = WAVETABLE_SIZE) -> np.ndarray:
+    """1周期分の波形テーブルを作成してキャッシュ（末尾に補間用の1サンプルを追加）"""
+    phase = np.arange(size + 1) / size
+    if waveform == 'sine':
+        table = np.sin(2 * np.pi * phase)
+    elif waveform == 'square':
+        table = np.where(phase % 1.0 < 0.5, 1.0, -1.0)
+    elif waveform == 'saw':
+        table = 2.0 * (phase % 1.0) - 1.0
+    elif waveform == 'triangle':
+        table = 1.0 - 4.0 * np.abs((phase % 1.0) - 0.5)
+    else:
+        raise ValueError(f"Unknown waveform: {waveform}")
+    table.setflags(write=False)
+    return table
+
+
+class Node:
+    """合成グラフのノード。render(t)はローカル時刻の配列から波形を返す"""
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def __add__(self, other: Union['Node', float]) -> 'Node':
+        return Mix([self, _as_node(other)])
+
+    __radd__ = __add__
+
+    def __mul__(self, other: Union['Node', float]) -> 'Node':
+        if isinstance(other, Node):
+            return Mul(self, other)
+        return Gain(self, other)
+
+    __rmul__ = __mul__
+
+
+def _as_node(value: Union[Node, float]) -> Node:
+    return value if isinstance(value, Node) else Const(value)
+
+
+class Const(Node):
+    def __init__(self, value: float):
+        self.value = value
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        return np.full(len(t), self.value)
+
+
+class Osc(Node):
+    """波形テーブルを線形補間で読み出すオシレーター"""
+
+    def __init__(self, frequency: float, waveform: str = 'sine', phase: float = 0.0):
+        self.frequency = frequency
+        self.phase = phase  # 周期単位の初期位相
+        self.table = get_wavetable(waveform)
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        position = (t * self.frequency + self.phase) % 1.0 * WAVETABLE_SIZE
+        index = position.astype(np.intp)
+        frac = position - index
+        return self.table[index] + (self.table[index + 1] - self.table[index]) * frac
+
+
+class Noise(Node):
+    """ガウスノイズ（seedを固定すれば毎回同じ波形になる）"""
+
+    def __init__(self, deviation: float = 1.0, seed: Optional[int] = None):
+        self.deviation = deviation
+        self.rng = np.random.default_rng(seed)
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        return self.rng.normal(0.0, self.deviation, len(t))
+
+
+class ADSR(Node):
+    """アタック・ディケイ・サステイン・リリースのエンベロープ"""
+
+    def __init__(self, attack: float, decay: float, sustain: float, release: float, duration: float):
+        self.points = (
+            [0.0, attack, attack + decay, max(attack + decay, duration - release), duration],
+            [0.0, 1.0, sustain, sustain, 0.0],
+        )
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        return np.interp(t, *self.points)
+
+
+class ExpDecay(Node):
+    """exp(-rate * t) で減衰するエンベロープ"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        return np.exp(-t * self.rate)
+
+
+class LinearFade(Node):
+    """durationで1から0へ直線的に下がるエンベロープ"""
+
+    def __init__(self, duration: float):
+        self.duration = duration
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        return 1.0 - t / self.duration
+
+
+class Gain(Node):
+    def __init__(self, source: Node, gain: float):
+        self.source = source
+        self.gain = gain
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        return self.source.render(t) * self.gain
+
+
+class Mul(Node):
+    """リング変調・エンベロープ適用用の乗算"""
+
+    def __init__(self, left: Node, right: Node):
+        self.left = left
+        self.right = right
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        return self.left.render(t) * self.right.render(t)
+
+
+class Mix(Node):
+    """複数ノードの加算ミックス"""
+
+    def __init__(self, sources: Sequence[Node]):
+        self.sources: List[Node] = []
+        for source in sources:
+            # ネストしたMixは平坦化しておく
+            if isinstance(source, Mix):
+                self.sources.extend(source.sources)
+            else:
+                self.sources.append(source)
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        out = self.sources[0].render(t)
+        for source in self.sources[1:]:
+            out = out + source.render(t)
+        return out
+
+
+class Segment(Node):
+    """[start, end) の間だけ、開始時刻を0としたローカル時刻でノードを鳴らす"""
+
+    def __init__(self, start: float, end: float, source: Node):
+        self.start = start
+        self.end = end
+        self.source = source
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        out = np.zeros(len(t))
+        begin, stop = np.searchsorted(t, (self.start, self.end))
+        if begin < stop:
+            out[begin:stop] = self.source.render(t[begin:stop] - self.start)
+        return out
+
+
+class Repeat(Node):
+    """periodごとに先頭lengthだけノードを鳴らす（ドラムパターンなど）"""
+
+    def __init__(self, source: Node, period: float, length: float):
+        self.source = source
+        self.period = period
+        self.length = length
+
+    def render(self, t: np.ndarray) -> np.ndarray:
+        local = t % self.period
+        gate = local < self.length
+        out = np.zeros(len(t))
+        out[gate] = self.source.render(local[gate])
+        return out
+
+
+@dataclass
+class Patch:
+    """効果音1つ分の定義"""
+    duration: float
+    graph: Node
+    volume: float = 1.0
+
+
+def render(patch: Patch, sample_rate: int, block_size: int = BLOCK_SIZE) -> np.ndarray:
+    """パッチをブロック単位でレンダリングしてfloat波形を返す"""
+    total = int(sample_rate * patch.duration)
+    out = np.empty(total)
+    for start in range(0, total, block_size):
+        stop = min(total, start + block_size)
+        t = np.arange(start, stop) / sample_rate
+        out[start:stop] = patch.graph.render(t)
+    out *= patch.volume
+    return out
+
+
+def to_mixer_array(wave: np.ndarray, mixer_info: Tuple[int, int, int]) -> np.ndarray:
+    """float波形 [-1, 1] をミキサーのビット深度・チャンネル数に変換"""
+    _, bit_depth, channels = mixer_info
+    wave = np.clip(wave, -1.0, 1.0)
+
+    if bit_depth == 8:
+        samples = ((wave + 1) * 127.5).astype(np.uint8)
+    elif bit_depth == -8:
+        samples = (wave * 127).astype(np.int8)
+    elif bit_depth == 16:
+        samples = ((wave + 1) * 32767.5).astype(np.uint16)
+    else:
+        samples = (wave * 32767).astype(np.int16)
+
+    if channels == 1:
+        return np.ascontiguousarray(samples)
+    return np.ascontiguousarray(np.repeat(samples[:, np.newaxis], channels, axis=1))
+
+
+def render_sound(patch: Patch) -> Optional[pygame.mixer.Sound]:
+    """現在のミキサー設定でパッチをSoundに変換"""
+    mixer_info = pygame.mixer.get_init()
+    if not mixer_info:
+        return None
+    wave = render(patch, mixer_info[0])
+    return pygame.sndarray.make_sound(to_mixer_array(wave, mixer_info))
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""対戦モード（2人が同じ敵の列で競う）
+
+    python versus.py serve --port 7777                      # サーバー
+    python main.py --versus 127.0.0.1:7777 --name alice     # プレイヤーごとに
+    python versus.py selftest                               # ループバックで2人ぶんを回して確かめる
+
+サーバーは asyncio で人数ぶんの接続を待ち、揃ったらセッションのシードと StageManager の
+ステージの予定を配る。シミュレーションは決定的なので、同じシードで reset_game すれば
+敵と単語の出方は両者で同じになる。ただし対戦では、単語の抽選で画面上の敵との打ち始めの
+かぶりを避けず、敵も画面上の数によらず一定の間隔で出す（どちらも倒し方で変わってしまうため）。
+ボスステージはボスを倒すまで続くので、そこから先の出方は倒した時刻で変わる。
+予定が手元の StageManager と違えば（版の違い）始めない。
+
+クライアントは打鍵（ティック付き）と、変わった成績のフィールドだけを送る。サーバーは
+SYNC_RATE ごとに、前回配ってから変わったフィールドだけを全員に配る（差分の同期）。
+
+プロトコルは1行1メッセージのJSON。type ごとの内容:
+    hello   c→s  name
+    start   s→c  seed, japanese, player（自分の番号）, names, stages
+    key     c→s  tick, char
+    status  c→s  STATUS_FIELDS のうち変わったもの
+    state   s→c  players: {番号: 変わったフィールド}（サーバーが数えた keys を含む）
+    end     s→c  winner（番号。引き分けは null）, players（最終成績）
+    error   s→c  message
+
+pygame のループはネットワークを待たない。ソケットはすべて別スレッドの asyncio のループで
+扱い、ゲームとの受け渡しは Mailbox だけで行う。
+"""
+
+import argparse
+import asyncio
+import json
+import secrets
+import sys
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from stages import StageManager
+
+DEFAULT_PORT = 7777
+SYNC_RATE = 20             # サーバーが差分を配る回数（毎秒）
+SEND_INTERVAL = 1 / 120    # クライアントが送るメッセージをまとめて書き出す間隔（秒）
+MAX_LINE = 4096            # 1メッセージの上限（バイト）
+STATUS_FIELDS = ('score', 'hp', 'kills', 'stage', 'done')
+SPAWN_LOG = 20             # 終了時に表示する、出現した敵の単語の数（selftest で両者を比べる）
+SPAWN_CHECK = 10           # selftest で一致を確かめる最低の数
+
+
+def stage_schedule(manager: StageManager) -> List[Dict[str, object]]:
+    """StageManager の固定ステージの予定（エンドレスは計算で決まるので送らない）"""
+    return [{'id': stage.stage_id, 'name': stage.name, 'type': stage.stage_type.value,
+             'duration': stage.duration, 'boss': stage.boss_text} for stage in manager.stages]
+
+
+def encode(message: Dict[str, object]) -> bytes:
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+class Mailbox:
+    """スレッド間の一方向のメッセージキュー（入れるスレッドと取り出すスレッドが1つずつ）
+
+    deque の append と popleft は GIL の下で不可分なので、ロックを取らずに受け渡せる。
+    ゲーム側は毎フレーム drain で溜まっているぶんだけ取り出し、空なら待たずに戻る。
+    """
+
+    def __init__(self):
+        self.items: Deque[Dict[str, object]] = deque()
+
+    def put(self, message: Dict[str, object]):
+        self.items.append(message)
+
+    def drain(self) -> Iterator[Dict[str, object]]:
+        items = self.items
+        while items:
+            yield items.popleft()
+
+
+@dataclass
+class Player:
+    name: str
+    writer: asyncio.StreamWriter
+    fields: Dict[str, object] = field(default_factory=dict)  # 最新の成績
+    sent: Dict[str, object] = field(default_factory=dict)    # 最後に配った成績
+    keys: int = 0
+    last_tick: int = 0
+    done: bool = False
+
+
+class VersusServer:
+    """対戦のサーバー。port=0 なら空いているポートを使う（テスト用）"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, players: int = 2,
+                 seed: Optional[int] = None, japanese: bool = True, sync_rate: float = SYNC_RATE):
+        self.host = host
+        self.port = port
+        self.capacity = players
+        self.seed = seed
+        self.japanese = japanese
+        self.interval = 1 / sync_rate
+        self.players: List[Player] = []
+        self.started = False
+        self.finished = asyncio.Event()
+        self.winner: Optional[int] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> int:
+        """待ち受けを始めて、実際のポートを返す"""
+        self.server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_LINE)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve(self):
+        """対戦が終わるまで差分を配り続ける"""
+        if self.server is None:
+            await self.start()
+        try:
+            while not self.finished.is_set():
+                await asyncio.sleep(self.interval)
+                await self.broadcast_state()
+        finally:
+            self.server.close()
+            await self.server.wait_closed()
+            for player in self.players:
+                player.writer.close()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        player = None
+        try:
+            hello = json.loads(await reader.readline() or b'{}')
+            if hello.get('type') != 'hello':
+                return
+            if self.started:
+                writer.write(encode({'type': 'error', 'message': "the match has already started"}))
+                await writer.drain()
+                return
+            player = Player(str(hello.get('name') or f"player{len(self.players) + 1}"), writer)
+            self.players.append(player)
+            if len(self.players) == self.capacity:
+                await self.start_match()
+            async for line in reader:
+                self.receive(player, json.loads(line))
+        except (ConnectionError, ValueError) as e:
+            print(f"[versus] connection error: {e}", file=sys.stderr)
+        finally:
+            if player is None:
+                writer.close()
+            elif not player.done:
+                # 切断したプレイヤーはその時点の成績で終わったことにする
+                player.done = player.fields['done'] = True
+                await self.check_end()
+
+    async def start_match(self):
+        self.started = True
+        seed = secrets.randbits(63) if self.seed is None else self.seed
+        schedule = stage_schedule(StageManager())
+        names = [player.name for player in self.players]
+        for index, player in enumerate(self.players):
+            player.writer.write(encode({'type': 'start', 'seed': seed, 'japanese': self.japanese,
+                                        'player': index, 'names': names, 'stages': schedule}))
+        await asyncio.gather(*(player.writer.drain() for player in self.players))
+
+    def receive(self, player: Player, message: Dict[str, object]):
+        kind = message.get('type')
+        if kind == 'key':
+            player.keys += 1
+            player.last_tick = int(message.get('tick', player.last_tick))
+            player.fields['keys'] = player.keys
+        elif kind == 'status':
+            for name in STATUS_FIELDS:
+                if name in message:
+                    player.fields[name] = message[name]
+            if message.get('done') and not player.done:
+                player.done = True
+                asyncio.get_running_loop().create_task(self.check_end())
+
+    async def broadcast_state(self):
+        """前回配ってから変わったフィールドだけを全員に配る"""
+        deltas = {}
+        for index, player in enumerate(self.players):
+            delta = {name: value for name, value in player.fields.items() if player.sent.get(name) != value}
+            if delta:
+                deltas[index] = delta
+                player.sent.update(delta)
+        if deltas:
+            await self.send_all({'type': 'state', 'players': deltas})
+
+    async def send_all(self, message: Dict[str, object]):
+        data = encode(message)
+        for player in self.players:
+            if not player.writer.is_closing():
+                player.writer.write(data)
+        for player in self.players:
+            try:
+                await player.writer.drain()
+            except ConnectionError:
+                pass
+
+    async def check_end(self):
+        if self.finished.is_set() or not self.started or not all(player.done for player in self.players):
+            return
+        await self.broadcast_state()
+        scores = [player.fields.get('score', 0) for player in self.players]
+        best = max(scores)
+        self.winner = scores.index(best) if scores.count(best) == 1 else None
+        await self.send_all({'type': 'end', 'winner': self.winner,
+                             'players': {index: player.fields for index, player in enumerate(self.players)}})
+        self.finished.set()
+
+
+class VersusClient:
+    """ゲームのプロセス側。ソケットは別スレッドの asyncio のループで扱う
+
+    ゲームは send_key / report で outbox に入れ、poll で inbox を取り出すだけで、
+    ネットワークを待つことはない。poll で取り出したメッセージは apply で
+    対戦の状況（standings など）に反映してから返す。
+    """
+
+    def __init__(self, host: str, port: int, name: str):
+        self.host = host
+        self.port = port
+        self.name = name
+        self.inbox = Mailbox()    # ネットワーク → ゲーム
+        self.outbox = Mailbox()   # ゲーム → ネットワーク
+        self.reported: Dict[str, object] = {}
+        self.spawned: List[str] = []  # 出現した敵の単語（最初の SPAWN_LOG 個）
+        self.closing = False
+        self.thread = threading.Thread(target=self.run, name='versus', daemon=True)
+        # 対戦の状況（ゲームのスレッドだけが触る）
+        self.started = False
+        self.ended = False
+        self.connected = True
+        self.player = 0
+        self.names: List[str] = []
+        self.standings: Dict[int, Dict[str, object]] = {}  # 番号 → 配られた成績を重ねたもの
+        self.winner: Optional[int] = None
+        self.error = ""
+
+    def start(self):
+        self.thread.start()
+
+    def close(self, timeout: float = 1.0):
+        """送り残しを書き出してから切断する（終了時だけ。timeout 秒までしか待たない）"""
+        self.closing = True
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def poll(self) -> Iterator[Dict[str, object]]:
+        for message in self.inbox.drain():
+            self.apply(message)
+            yield message
+
+    def apply(self, message: Dict[str, object]):
+        kind = message.get('type')
+        if kind == 'start':
+            self.started = True
+            self.player = message['player']
+            self.names = message['names']
+        elif kind in ('state', 'end'):
+            for index, fields in message['players'].items():
+                self.standings.setdefault(int(index), {}).update(fields)
+            if kind == 'end':
+                self.ended = True
+                self.winner = message['winner']
+        elif kind == 'error':
+            self.error = message['message']
+        elif kind == 'closed':
+            self.connected = False
+
+    def opponents(self) -> List[Tuple[str, Dict[str, object]]]:
+        return [(self.names[index], fields) for index, fields in sorted(self.standings.items())
+                if index != self.player]
+
+    def send_key(self, tick: int, char: str):
+        self.outbox.put({'type': 'key', 'tick': tick, 'char': char})
+
+    def report(self, score: int, hp: int, kills: int, stage: int, done: bool):
+        """成績を送る。前回から変わったフィールドがなければ何もしない"""
+        reported = self.reported
+        if (reported.get('score') == score and reported.get('hp') == hp and reported.get('kills') == kills
+                and reported.get('stage') == stage and reported.get('done') == done):
+            return
+        delta = {name: value for name, value in zip(STATUS_FIELDS, (score, hp, kills, stage, done))
+                 if reported.get(name) != value}
+        reported.update(delta)
+        delta['type'] = 'status'
+        self.outbox.put(delta)
+
+    def record_spawn(self, text: str):
+        if len(self.spawned) < SPAWN_LOG:
+            self.spawned.append(text)
+
+    def summary(self) -> List[str]:
+        if not self.started:
+            return [f"[versus] no match ({self.error or 'the server did not start one'})"]
+        lines = [f"[versus] {'match over' if self.ended else 'left before the end'}, "
+                 f"winner: {self.names[self.winner] if self.winner is not None else '-' if not self.ended else 'draw'}"]
+        for index, fields in sorted(self.standings.items()):
+            you = " (you)" if index == self.player else ""
+            lines.append(f"  {self.names[index]}{you}: score {fields.get('score', 0)} hp {fields.get('hp', 0)} "
+                         f"kills {fields.get('kills', 0)} stage {fields.get('stage', 0)} keys {fields.get('keys', 0)}")
+        lines.append(f"  spawned: {' '.join(self.spawned)}")
+        return lines
+
+    def run(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port, limit=MAX_LINE)
+        except OSError as e:
+            self.inbox.put({'type': 'error', 'message': f"cannot connect to {self.host}:{self.port}: {e}"})
+            self.inbox.put({'type': 'closed'})
+            return
+        writer.write(encode({'type': 'hello', 'name': self.name}))
+        sender = asyncio.get_running_loop().create_task(self.send_loop(writer))
+        try:
+            async for line in reader:
+                self.inbox.put(json.loads(line))
+        except (ConnectionError, ValueError) as e:
+            self.inbox.put({'type': 'error', 'message': str(e)})
+        finally:
+            self.closing = True
+            await sender
+            self.inbox.put({'type': 'closed'})
+
+    async def send_loop(self, writer: asyncio.StreamWriter):
+        """outbox を SEND_INTERVAL ごとにまとめて書き出す（ゲームのスレッドから起こしてもらわない）"""
+        try:
+            while True:
+                closing = self.closing
+                data = b''.join(encode(message) for message in self.outbox.drain())
+                if data:
+                    writer.write(data)
+                    await writer.drain()
+                if closing:
+                    break
+                await asyncio.sleep(SEND_INTERVAL)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """'host:port' または 'host'（ポートは既定値）"""
+    host, _, port = address.rpartition(':')
+    if not host:
+        return port or '127.0.0.1', DEFAULT_PORT
+    return host, int(port)
+
+
+async def selftest(seconds: float) -> int:
+    """ループバックでサーバーと、速さの違う2つのヘッドレスのボットを回して確かめる
+
+    遅いほうは出現に追いつけない速さにして、成績の差（と、その中継）まで確かめる。
+    倒し方が違っても、最初に出てくる敵の単語が両者で同じであることも確かめる。
+    """
+    server = VersusServer(port=0)
+    port = await server.start()
+    serving = asyncio.get_running_loop().create_task(server.serve())
+    script = str(Path(__file__).with_name('main.py'))
+    players = [('fast', 400), ('slow', 60)]
+    processes = [await asyncio.create_subprocess_exec(
+        sys.executable, script, '--headless', '--seconds', str(seconds), '--versus', f"127.0.0.1:{port}",
+        '--name', name, '--bot-kpm', str(kpm), stderr=asyncio.subprocess.PIPE) for name, kpm in players]
+    outputs = await asyncio.gather(*(process.communicate() for process in processes))
+    await asyncio.wait_for(serving, 5)
+    ok = True
+    spawned = []
+    for (name, _), process, (_, errors) in zip(players, processes, outputs):
+        output = errors.decode('utf-8', 'replace')
+        lines = output[output.find('[versus]'):].splitlines()
+        print(f"{name}: exit {process.returncode}")
+        print('\n'.join(lines))
+        ok = ok and process.returncode == 0 and any('match over' in line for line in lines)
+        spawned.append(next((line.split(':', 1)[1].split() for line in lines
+                             if line.startswith('  spawned:')), []))
+    # 倒し方が違っても敵の列は同じ（先に倒れたほうの出現数までを比べる）
+    count = min(len(words) for words in spawned)
+    if count < SPAWN_CHECK or any(words[:count] != spawned[0][:count] for words in spawned):
+        print(f"expected the same first {SPAWN_CHECK}+ spawned words, got:")
+        for (name, _), words in zip(players, spawned):
+            print(f"  {name}: {' '.join(words)}")
+        ok = False
+    # 同じシードなら同じ敵の列なので、打鍵の速いほうが多く倒して勝つ
+    ok = ok and server.finished.is_set() and all(player.keys > 0 for player in server.players)
+    winner = server.players[server.winner].name if ok and server.winner is not None else None
+    if ok and winner != 'fast':
+        print(f"expected the faster bot to win, got {winner or 'a draw'}")
+        ok = False
+    print("OK: the faster player won the match" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Versus mode server")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help="wait for players and run one match")
+    serve.add_argument('--host', default='127.0.0.1', help="address to listen on (default: %(default)s)")
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--players', type=int, default=2)
+    serve.add_argument('--seed', type=int, help="fix the session seed")
+    serve.add_argument('--english', action='store_true', help="play in English mode")
+    test = sub.add_parser('selftest', help="run a bot match over loopback")
+    test.add_argument('--seconds', type=float, default=90)
+    args = parser.parse_args(argv)
+
+    if args.command == 'selftest':
+        return asyncio.run(selftest(args.seconds))
+
+    async def run_server() -> int:
+        server = VersusServer(args.host, args.port, args.players, args.seed, not args.english)
+        port = await server.start()
+        print(f"[versus] waiting for {args.players} players on {args.host}:{port}")
+        await server.serve()
+        names = [player.name for player in server.players]
+        print(f"[versus] match over, winner: {names[server.winner] if server.winner is not None else 'draw'}")
+        return 0
+    return asyncio.run(run_server())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
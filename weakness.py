@@ -0,0 +1,111 @@
+"""打ち間違いと文字ごとの入力時間の統計（苦手な文字の推定）
+
+ミスは「打つべきキー × 実際に打ったキー」の混同行列に、文字ごとの
+ミス回数・入力完了回数・入力にかかったティック数の合計と一緒に数える。
+どれも1打鍵ごとに配列の1要素を足すだけで、セッションをまたいで
+data/weakness.npz に保存する。
+"""
+
+import os
+import string
+import numpy as np
+from pathlib import Path
+from typing import Dict
+
+from corpus import fold_char
+
+WEAKNESS_PATH = Path(__file__).parent / "data" / "weakness.npz"
+
+# 混同行列のキー（それ以外のキーは最後の行・列にまとめる）
+KEYS = string.ascii_lowercase + "-'"
+KEY_INDEX = {key: i for i, key in enumerate(KEYS)}
+OTHER_KEY = len(KEYS)
+
+# 文字ごとの統計の対象（カタカナはひらがなに、英字は小文字に揃えて数える）
+CHARSET = ''.join(chr(code) for code in range(0x3041, 0x3097)) + 'ー' + string.ascii_lowercase
+CHAR_INDEX = {char: i for i, char in enumerate(CHARSET)}
+
+MIN_SAMPLES = 3  # これ未満しか打っていない文字は苦手とみなさない
+FOCUS_CHARS = 8  # 重点的に出す文字の数
+
+
+class WeaknessModel:
+    def __init__(self, path: Path = WEAKNESS_PATH):
+        self.path = path
+        self.confusion = np.zeros((len(KEYS) + 1, len(KEYS) + 1), dtype=np.uint32)  # [打つべき, 打った]
+        self.completions = np.zeros(len(CHARSET), dtype=np.uint32)
+        self.errors = np.zeros(len(CHARSET), dtype=np.uint32)
+        self.latency = np.zeros(len(CHARSET), dtype=np.float64)  # 入力完了までのティック数の合計
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path) as data:
+                if str(data['charset']) != CHARSET or str(data['keys']) != KEYS:
+                    print(f"Ignoring weakness stats for a different character set: {self.path}")
+                    return
+                self.confusion[:] = data['confusion']
+                self.completions[:] = data['completions']
+                self.errors[:] = data['errors']
+                self.latency[:] = data['latency']
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Failed to load weakness stats {self.path}: {e}")
+
+    def save(self):
+        """統計を保存（失敗してもゲームは止めない）"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp.npz')
+            np.savez(tmp_path, charset=CHARSET, keys=KEYS, confusion=self.confusion,
+                     completions=self.completions, errors=self.errors, latency=self.latency)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Failed to save weakness stats: {e}")
+
+    def record_miss(self, char: str, expected_key: str, typed_key: str):
+        """charを入力中に、expected_keyを打つべきところでtyped_keyを打った"""
+        expected = KEY_INDEX.get(expected_key.lower(), OTHER_KEY)
+        typed = KEY_INDEX.get(typed_key.lower(), OTHER_KEY)
+        self.confusion[expected, typed] += 1
+        slot = CHAR_INDEX.get(fold_char(char))
+        if slot is not None:
+            self.errors[slot] += 1
+
+    def record_char(self, char: str, ticks: int):
+        """charの入力が完了した（ticksはその文字にかかった時間）"""
+        slot = CHAR_INDEX.get(fold_char(char))
+        if slot is not None:
+            self.completions[slot] += 1
+            self.latency[slot] += ticks
+
+    def scores(self) -> np.ndarray:
+        """文字ごとの苦手度（ミス率と入力時間をそれぞれ全体平均で割って足したもの）"""
+        completions = self.completions.astype(np.float64)
+        errors = self.errors.astype(np.float64)
+        seen = completions >= MIN_SAMPLES
+        if not seen.any():
+            return np.zeros(len(CHARSET))
+        # ラプラス平滑化したミス率（少ない回数のミスで極端な値にならないように）
+        error_rate = (errors + 1) / (completions + errors + 2)
+        latency = self.latency / np.maximum(completions, 1)
+        mean_error = error_rate[seen].mean()
+        mean_latency = max(latency[seen].mean(), 1e-9)
+        return np.where(seen, error_rate / mean_error + latency / mean_latency, 0.0)
+
+    def focus_weights(self, count: int = FOCUS_CHARS) -> Dict[str, float]:
+        """苦手度が平均（2.0）を超える文字のうち上位count個とその重み"""
+        scores = self.scores()
+        top = np.argsort(scores)[::-1][:count]
+        return {CHARSET[i]: float(scores[i] - 2.0) for i in top if scores[i] > 2.0}
+
+    def confused_keys(self, count: int = 5) -> Dict[str, str]:
+        """よく打ち間違えるキーの組 {打つべきキー: 代わりに打ったキー}"""
+        labels = KEYS + '?'
+        flat = np.argsort(self.confusion, axis=None)[::-1][:count]
+        pairs = {}
+        for expected, typed in zip(*np.unravel_index(flat, self.confusion.shape)):
+            if self.confusion[expected, typed] and labels[expected] not in pairs:
+                pairs[labels[expected]] = labels[typed]
+        return pairs